@@ -0,0 +1,361 @@
+"""
+Benchmarks the transforms against synthetic listings, each stage in its own
+process:
+
+    PYTHONPATH=glue_jobs python glue_jobs/benchmarks/run_benchmarks.py \
+        --preset three_counties --preset metro --output benchmarks.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import pandas as pd
+import platform
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+from utils.curated_listings import curated_listings_query
+from utils.content_hash import content_hash
+from utils.listings_schema import HASH_COLUMN, REGION_COLUMN, listings_to_table
+from utils.local_client import LocalAWSClient
+from utils.staged_listings import (
+    DEDUP_KEYS,
+    STAGED_COLUMNS,
+    change_dtypes,
+    dedup_listings,
+    duplicate_listings,
+    get_listing_date,
+)
+from utils.synthetic_listings import (
+    DEFAULT_CITIES,
+    generate_cities,
+    generate_listings,
+    generate_listings_table,
+)
+
+
+@dataclass
+class Size:
+    listings: int
+    max_days_on_market: int
+    city_count: int
+    zips_per_city: int
+    history_days: int
+
+    def cities(self) -> Dict[str, List[str]]:
+        # city_count 0 means the real three counties
+        if self.city_count == 0:
+            return DEFAULT_CITIES
+
+        return generate_cities(self.city_count, self.zips_per_city)
+
+
+PRESETS: Dict[str, Size] = {
+    # Today's feed: the three counties, a month of staged history
+    "three_counties": Size(2_000, 365, 0, 0, 30),
+    "metro": Size(50_000, 365, 100, 2, 30),
+    # Roughly every active listing in Ohio, a week of catch-up
+    "statewide": Size(1_000_000, 365, 900, 2, 7),
+}
+
+
+def target_dates(size: Size) -> List[date]:
+    return [date.today() - timedelta(days=i) for i in range(size.history_days)][::-1]
+
+
+def staged_frame(size: Size) -> pd.DataFrame:
+    """
+    Raw listings as the staged job reads them, renamed to staged columns.
+    """
+
+    df = (
+        generate_listings_table(
+            count=size.listings,
+            max_days_on_market=size.max_days_on_market,
+            cities=size.cities(),
+        )
+        .select(list(STAGED_COLUMNS))
+        .rename_columns(list(STAGED_COLUMNS.values()))
+        .to_pandas()
+    )
+
+    return change_dtypes(df.assign(as_of_date=date.today().isoformat()))
+
+
+# Each stage has a setup that builds its input (not timed) and a run that
+# returns (rows in, rows out). rows/sec is always measured on rows in.
+
+
+def setup_listings_to_table(size: Size, work_dir: str) -> Any:
+    return generate_listings(
+        count=size.listings,
+        max_days_on_market=size.max_days_on_market,
+        cities=size.cities(),
+    )
+
+
+def run_listings_to_table(listings: Any) -> Tuple[int, int]:
+    return len(listings), listings_to_table(listings).num_rows
+
+
+def run_get_listing_date(df: pd.DataFrame) -> Tuple[int, int]:
+    return len(df), len(get_listing_date(df))
+
+
+def setup_get_listing_date(size: Size, work_dir: str) -> Any:
+    return staged_frame(size)
+
+
+def setup_raw_dedup(size: Size, work_dir: str) -> Any:
+    # A tenth of the listings fetched twice, as when two search regions overlap
+    raw_df = generate_listings_table(
+        count=size.listings,
+        max_days_on_market=size.max_days_on_market,
+        cities=size.cities(),
+    ).to_pandas()
+    raw_df[HASH_COLUMN] = content_hash(
+        raw_df, [c for c in raw_df.columns if c not in (REGION_COLUMN, HASH_COLUMN)]
+    )
+    raw_df = pd.concat(
+        [raw_df, raw_df.sample(frac=0.1, random_state=0)], ignore_index=True
+    )
+
+    return raw_df.assign(as_of_date=date.today())
+
+
+def run_raw_dedup(df: pd.DataFrame) -> Tuple[int, int]:
+    return len(df), len(dedup_listings(df, keys=DEDUP_KEYS))
+
+
+def setup_duplicate_listings(size: Size, work_dir: str) -> Any:
+    return get_listing_date(staged_frame(size)), target_dates(size)
+
+
+def run_duplicate_listings(inputs: Any) -> Tuple[int, int]:
+    df, as_of_dates = inputs
+    return len(df), len(duplicate_listings(df, as_of_dates=as_of_dates))
+
+
+class PartitionListClient(LocalAWSClient):
+    """
+    Serves made up partition listings so only the diffing is measured.
+    """
+
+    def __init__(self, root: str, partitions: Dict[str, List[str]]) -> None:
+        super().__init__(root=root)
+        self.partitions = partitions
+
+    def get_partitions(self, database: Any, table: str) -> List[str]:
+        return self.partitions[database]
+
+
+def setup_partition_diff(size: Size, work_dir: str) -> Any:
+    # One partition per day on the market, the newest week not staged yet
+    days = [
+        date.today() - timedelta(days=i) for i in range(size.max_days_on_market + 1)
+    ]
+
+    return PartitionListClient(
+        work_dir,
+        {
+            "raw": [str(day) for day in days],
+            "staged": [f"{day} 00:00:00" for day in days[7:]],
+        },
+    )
+
+
+def run_partition_diff(client: PartitionListClient) -> Tuple[int, int]:
+    unprocessed = client.get_unprocessed_dates(
+        source="raw", target="staged", table="listings"
+    )
+    return len(client.partitions["raw"]), len(unprocessed)
+
+
+def setup_curated_aggregation(size: Size, work_dir: str) -> Any:
+    client = LocalAWSClient(root=work_dir)
+    as_of_dates = target_dates(size)
+    staged_df = duplicate_listings(
+        get_listing_date(staged_frame(size)), as_of_dates=as_of_dates
+    )
+    client.upload_dataframe(df=staged_df, database="staged", table="listings")
+
+    return client, as_of_dates, len(staged_df)
+
+
+def run_curated_aggregation(inputs: Any) -> Tuple[int, int]:
+    client, as_of_dates, staged_rows = inputs
+    curated_df = client.read_query(
+        sql=curated_listings_query(as_of_dates), database="staged"
+    )
+    return staged_rows, len(curated_df)
+
+
+STAGES: Dict[
+    str, Tuple[Callable[[Size, str], Any], Callable[[Any], Tuple[int, int]]]
+] = {
+    "listings_to_table": (setup_listings_to_table, run_listings_to_table),
+    "raw_dedup": (setup_raw_dedup, run_raw_dedup),
+    "get_listing_date": (setup_get_listing_date, run_get_listing_date),
+    "duplicate_listings": (setup_duplicate_listings, run_duplicate_listings),
+    "partition_diff": (setup_partition_diff, run_partition_diff),
+    "curated_aggregation": (setup_curated_aggregation, run_curated_aggregation),
+}
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def measure(stage: str, size: Size) -> Dict[str, Any]:
+    setup, run = STAGES[stage]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        inputs = setup(size, work_dir)
+        setup_rss_mb = max_rss_mb()
+
+        start = time.perf_counter()
+        rows_in, rows_out = run(inputs)
+        wall_seconds = time.perf_counter() - start
+
+    return {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "wall_seconds": round(wall_seconds, 4),
+        "rows_per_second": round(rows_in / wall_seconds) if wall_seconds else None,
+        "setup_rss_mb": round(setup_rss_mb, 1),
+        "peak_rss_mb": round(max_rss_mb(), 1),
+    }
+
+
+def run_isolated(stage: str, size: Size) -> Dict[str, Any]:
+    # A fresh interpreter per stage keeps ru_maxrss from carrying over
+    context = multiprocessing.get_context("spawn")
+
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        return pool.apply(measure, (stage, size))
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """
+    Returns a line per metric that regressed by more than `tolerance`
+    (0.2 = 20%) against the matching (size, stage) in the baseline.
+    """
+
+    previous = {(result["size"], result["stage"]): result for result in baseline}
+    regressions: List[str] = []
+
+    for result in results:
+        match = previous.get((result["size"], result["stage"]))
+
+        if match is None or match["params"] != result["params"]:
+            continue
+
+        for metric in ("wall_seconds", "peak_rss_mb"):
+            if match[metric] and result[metric] > match[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result['size']}/{result['stage']} {metric}: "
+                    f"{match[metric]} -> {result[metric]}"
+                )
+
+    return regressions
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preset", action="append", choices=list(PRESETS))
+    parser.add_argument(
+        "--listings",
+        type=int,
+        help="Run a custom size instead of presets, with the options below",
+    )
+    parser.add_argument("--max-days-on-market", type=int, default=365)
+    parser.add_argument(
+        "--cities", type=int, default=0, help="0 uses the three counties"
+    )
+    parser.add_argument("--zips-per-city", type=int, default=1)
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--stage", action="append", choices=list(STAGES))
+    parser.add_argument("--output", default="benchmarks.json")
+    parser.add_argument("--baseline", help="Earlier output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    # The stage metrics reset the kernel's peak RSS, which would skew ours
+    os.environ["YTOWN_METRICS"] = "0"
+
+    if args.listings is not None:
+        sizes = {
+            "custom": Size(
+                args.listings,
+                args.max_days_on_market,
+                args.cities,
+                args.zips_per_city,
+                args.history_days,
+            )
+        }
+    else:
+        sizes = {
+            name: PRESETS[name] for name in args.preset or ["three_counties", "metro"]
+        }
+
+    results: List[Dict[str, Any]] = []
+
+    for size_name, size in sizes.items():
+        for stage in args.stage or list(STAGES):
+            result = {
+                "size": size_name,
+                "params": asdict(size),
+                "stage": stage,
+                **run_isolated(stage, size),
+            }
+            results.append(result)
+
+            print(
+                f"{size_name:>15} {stage:<20} {result['wall_seconds']:>10.3f}s "
+                f"{result['rows_per_second'] or 0:>12,} rows/s "
+                f"{result['peak_rss_mb']:>9.1f} MB"
+            )
+
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "machine": platform.machine(),
+                "cpu_count": multiprocessing.cpu_count(),
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+
+    if args.baseline is None:
+        return
+
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file)["results"], args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Bytes the dashboard queries scan, from Athena or estimated from Parquet
+footers with YTOWN_BACKEND=local:
+
+    YTOWN_METRICS=0 PYTHONPATH=glue_jobs python glue_jobs/benchmarks/scan_report.py \
+        --output scans.json
+"""
+
+import argparse
+import json
+import pyarrow.parquet as pq
+import tempfile
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from utils.base_client import BaseClient
+from utils.clients import get_client
+from utils.compaction import partition_date
+from utils.curated_listings import curated_listings_query
+from utils.local_client import LocalAWSClient
+from utils.staged_listings import (
+    STAGED_COLUMNS,
+    change_dtypes,
+    duplicate_listings,
+    get_listing_date,
+)
+from utils.synthetic_listings import generate_listings_table
+from utils.tiles import add_quadkeys
+
+
+@dataclass
+class DashboardQuery:
+    database: str
+    table: str
+    # Read for every matching row, on top of the filter columns
+    columns: List[str]
+    # Filter column -> argument holding the value it's compared to
+    filters: Dict[str, str]
+    days: int
+
+    def sql(self, values: Dict[str, str], start: date, end: date) -> str:
+        conditions = [f"as_of_date BETWEEN DATE '{start}' AND DATE '{end}'"] + [
+            f"{column} = '{values[argument]}'"
+            for column, argument in self.filters.items()
+        ]
+
+        return f"""
+            SELECT {", ".join(self.columns)}
+            FROM {self.table}
+            WHERE {" AND ".join(conditions)}
+        """
+
+
+# The Metabase questions that get opened the most
+DASHBOARD_QUERIES: Dict[str, DashboardQuery] = {
+    "city_trend": DashboardQuery(
+        "curated",
+        "listings",
+        ["as_of_date", "total_listings", "median_listing_price"],
+        {"city": "city"},
+        days=90,
+    ),
+    "zip_trend": DashboardQuery(
+        "curated",
+        "listings",
+        ["as_of_date", "median_listing_price", "median_days_on_market"],
+        {"zip_code": "zip_code"},
+        days=90,
+    ),
+    "city_listings": DashboardQuery(
+        "staged",
+        "listings",
+        ["zpid", "street_address", "price", "bedrooms", "bathrooms", "living_area"],
+        {"city": "city"},
+        days=1,
+    ),
+    "zip_prices": DashboardQuery(
+        "staged",
+        "listings",
+        ["as_of_date", "price", "living_area", "home_type"],
+        {"zip_code": "zip_code"},
+        days=30,
+    ),
+    # Nothing to skip but days, as a reference
+    "region_totals": DashboardQuery(
+        "curated", "listings", ["as_of_date", "total_listings"], {}, days=30
+    ),
+}
+
+
+def estimate_bytes_scanned(
+    client: BaseClient,
+    query: DashboardQuery,
+    values: Dict[str, str],
+    start: date,
+    end: date,
+) -> int:
+    """
+    Compressed size of the column chunks Athena would read for the query.
+    A row group is skipped when any filter value is outside its min/max.
+    """
+
+    needed = set(query.columns) | set(query.filters)
+    scanned = 0
+
+    for partition in client.list_partition_files(query.database, query.table):
+        if not start <= partition_date(partition.values["as_of_date"]) <= end:
+            continue
+
+        for path in partition.files:
+            metadata = pq.ParquetFile(path).metadata
+
+            for i in range(metadata.num_row_groups):
+                row_group = metadata.row_group(i)
+                chunks = {
+                    row_group.column(j).path_in_schema: row_group.column(j)
+                    for j in range(row_group.num_columns)
+                }
+
+                if any(
+                    not may_contain(chunks.get(column), values[argument])
+                    for column, argument in query.filters.items()
+                ):
+                    continue
+
+                scanned += sum(
+                    chunk.total_compressed_size
+                    for name, chunk in chunks.items()
+                    if name.split(".")[0] in needed
+                )
+
+    return scanned
+
+
+def may_contain(chunk: Optional[Any], value: str) -> bool:
+    if chunk is None or chunk.statistics is None:
+        return True
+
+    statistics = chunk.statistics
+
+    if not statistics.has_min_max:
+        return statistics.null_count != statistics.num_values
+
+    return statistics.min <= value <= statistics.max
+
+
+def athena_bytes_scanned(
+    client: BaseClient,
+    query: DashboardQuery,
+    values: Dict[str, str],
+    start: date,
+    end: date,
+) -> int:
+    query_execution = client.execute_query(
+        sql=query.sql(values, start, end), database=query.database
+    )
+
+    return query_execution["Statistics"]["DataScannedInBytes"]
+
+
+def report(client: BaseClient, values: Dict[str, str]) -> Dict[str, int]:
+    bytes_scanned = (
+        estimate_bytes_scanned
+        if isinstance(client, LocalAWSClient)
+        else athena_bytes_scanned
+    )
+    results: Dict[str, int] = {}
+
+    for name, query in DASHBOARD_QUERIES.items():
+        dates = client.get_partition_dates(query.database, query.table)
+
+        if not dates:
+            continue
+
+        # Relative to the newest day so an old or synthetic lake still matches
+        end = max(dates)
+        start = end - timedelta(days=query.days - 1)
+        results[name] = bytes_scanned(client, query, values, start, end)
+
+    return results
+
+
+def write_synthetic_lake(
+    client: LocalAWSClient, listings: int, history_days: int
+) -> None:
+    as_of_dates = [date.today() - timedelta(days=i) for i in range(history_days)]
+    staged_df = (
+        generate_listings_table(count=listings)
+        .select(list(STAGED_COLUMNS))
+        .rename_columns(list(STAGED_COLUMNS.values()))
+        .to_pandas()
+    )
+    staged_df = duplicate_listings(
+        add_quadkeys(
+            get_listing_date(
+                change_dtypes(staged_df.assign(as_of_date=date.today().isoformat()))
+            )
+        ),
+        as_of_dates=sorted(as_of_dates),
+    )
+
+    client.upload_dataframe(df=staged_df, database="staged", table="listings")
+    client.upload_dataframe(
+        df=client.read_query(
+            sql=curated_listings_query(sorted(as_of_dates)), database="staged"
+        ),
+        database="curated",
+        table="listings",
+    )
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--city", default="Youngstown")
+    parser.add_argument("--zip-code", default="44512")
+    parser.add_argument(
+        "--synthetic-listings",
+        type=int,
+        help="Compare layouts on a local lake of this many synthetic listings",
+    )
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    values = {"city": args.city, "zip_code": args.zip_code}
+    results: Dict[str, Dict[str, int]] = {}
+
+    if args.synthetic_listings is None:
+        results["current"] = report(get_client(), values)
+    else:
+        for name, use_layouts in (("arrival_order", False), ("layouts", True)):
+            with tempfile.TemporaryDirectory() as root:
+                client = LocalAWSClient(root=root)
+
+                if not use_layouts:
+                    client.layouts.clear()
+
+                write_synthetic_lake(client, args.synthetic_listings, args.history_days)
+                results[name] = report(client, values)
+
+    runs = list(results)
+    print(f"{'query':<15}" + "".join(f"{run:>18}" for run in runs))
+
+    for query in DASHBOARD_QUERIES:
+        print(
+            f"{query:<15}"
+            + "".join(f"{results[run].get(query, 0):>18,}" for run in runs)
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"values": values, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import pandas as pd
+import pyarrow as pa
+from typing import Dict, List
+from utils.base_client import BaseClient, PartitionFiles
+from utils.clients import add_table_arguments, get_table_client
+from utils.compaction import (
+    TARGET_FILE_BYTES,
+    concat_tables_by_name,
+    group_by_month,
+    needs_compaction,
+    partition_date,
+    split_table,
+)
+from utils.iceberg import optimize_query, vacuum_query
+from utils.metrics import instrument
+from utils.staged_listings import STAGED_TYPES
+
+
+MONTHLY_TABLE = "listings_monthly"
+
+
+MONTHLY_TYPES: Dict[str, str] = {
+    **STAGED_TYPES,
+    "listing_date": "date",
+    "as_of_date": "timestamp",
+}
+
+
+def compact_table(
+    aws_client: BaseClient, database: str, table: str, target_file_bytes: int
+) -> None:
+    for partition in aws_client.list_partition_files(database=database, table=table):
+        if not needs_compaction(partition, target_file_bytes):
+            continue
+
+        layout = aws_client.get_layout(database=database, table=table)
+        data = layout.sort_table(aws_client.read_files(list(partition.files)))
+
+        aws_client.replace_partition(
+            database=database,
+            table=table,
+            values=partition.values,
+            tables=split_table(data, partition.size, target_file_bytes),
+        )
+
+
+def read_month(aws_client: BaseClient, partitions: List[PartitionFiles]) -> pa.Table:
+    # as_of_date only exists in the daily paths, so it's added as a column
+    days: List[pa.Table] = []
+
+    for partition in partitions:
+        if not partition.files:
+            continue
+
+        day = aws_client.read_files(list(partition.files))
+        as_of_date = pd.Timestamp(partition_date(partition.values["as_of_date"]))
+        days.append(
+            day.append_column(
+                pa.field("as_of_date", pa.timestamp("ms")),
+                pa.array([as_of_date] * day.num_rows, type=pa.timestamp("ms")),
+            )
+        )
+
+    return concat_tables_by_name(days)
+
+
+def get_monthly_days(aws_client: BaseClient) -> Dict[str, int]:
+    if not aws_client.get_partitions(database="staged", table=MONTHLY_TABLE):
+        return {}
+
+    days_df = aws_client.read_query(
+        sql=f"""
+            SELECT as_of_month, COUNT(DISTINCT as_of_date) AS days
+            FROM {MONTHLY_TABLE}
+            GROUP BY as_of_month
+        """,
+        database="staged",
+        result_mode="csv",
+    )
+
+    return dict(zip(days_df["as_of_month"].astype(str), days_df["days"]))
+
+
+def migrate_to_monthly(aws_client: BaseClient, target_file_bytes: int) -> None:
+    """
+    Rebuilds staged listings_monthly, one partition per month, rewriting only
+    the months whose days changed.
+    """
+
+    months = group_by_month(
+        aws_client.list_partition_files(database="staged", table="listings")
+    )
+    monthly_days = get_monthly_days(aws_client)
+
+    for month, partitions in sorted(months.items()):
+        if monthly_days.get(month) == len(partitions):
+            continue
+
+        layout = aws_client.get_layout(database="staged", table=MONTHLY_TABLE)
+        data = layout.sort_table(read_month(aws_client, partitions))
+
+        aws_client.replace_partition(
+            database="staged",
+            table=MONTHLY_TABLE,
+            values={"as_of_month": month},
+            tables=split_table(
+                data,
+                sum(partition.size for partition in partitions),
+                target_file_bytes,
+            ),
+            columns_types=MONTHLY_TYPES,
+        )
+
+
+def get_args() -> argparse.Namespace:
+    # Glue passes its own arguments alongside ours, so unknown ones are ignored
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tables",
+        default="staged.listings,curated.listings",
+        help="Comma separated database.table pairs to compact",
+    )
+    parser.add_argument(
+        "--target-file-mb", type=int, default=TARGET_FILE_BYTES // (1024 * 1024)
+    )
+    parser.add_argument(
+        "--staged-layout", choices=["daily", "monthly"], default="daily"
+    )
+    add_table_arguments(parser)
+    args, _ = parser.parse_known_args()
+
+    return args
+
+
+@instrument("job")
+def main():
+    args = get_args()
+
+    if args.table_format == "iceberg" and args.staged_layout == "monthly":
+        raise ValueError("The monthly staged layout only applies to Hive tables")
+
+    aws_client = get_table_client(args)
+    target_file_bytes = args.target_file_mb * 1024 * 1024
+
+    for database_table in args.tables.split(","):
+        database, table = database_table.strip().split(".")
+
+        # Iceberg rewrites small files itself, as a new snapshot
+        if (database, table) in aws_client.iceberg_tables:
+            aws_client.execute_query(sql=optimize_query(table), database=database)
+            aws_client.execute_query(sql=vacuum_query(table), database=database)
+        else:
+            compact_table(aws_client, database, table, target_file_bytes)
+
+    if args.staged_layout == "monthly":
+        migrate_to_monthly(aws_client, target_file_bytes)
+
+
+main()
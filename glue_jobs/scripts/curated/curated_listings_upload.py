@@ -1,57 +1,218 @@
-from utils.aws_client import AWSClient
+import argparse
+import pandas as pd
+from datetime import date
+from itertools import groupby
+from typing import List, Set
+from utils.base_client import BaseClient
+from utils.clients import add_model_argument, add_table_arguments, get_table_client
+from utils.curated_listings import curated_listings_query, curated_tiles_query
+from utils.listings_history import (
+    HISTORY_TABLE,
+    expanded_history_query,
+    history_bounds_query,
+)
+from utils.metrics import instrument
+from utils.rollup import (
+    ROLLUP_DTYPES,
+    ROLLUP_PARTITIONS,
+    ROLLUP_TABLE,
+    period_days,
+    rollup_days_query,
+    rollup_query,
+)
+from utils.sketches import SKETCH_DTYPES, SKETCH_TABLE, sketches_query
+from utils.tiles import TILE_DTYPES, TILE_TABLE
 
 
+def get_history_dates(aws_client: BaseClient) -> Set[date]:
+    # The intervals model has no daily partitions, so every day the history
+    # covers is a candidate
+    if not aws_client.get_partitions(database="staged", table=HISTORY_TABLE):
+        return set()
+
+    bounds = aws_client.read_query(
+        sql=history_bounds_query(), database="staged", result_mode="csv"
+    ).iloc[0]
+
+    if pd.isna(bounds["first_day"]):
+        return set()
+
+    return set(pd.date_range(start=bounds["first_day"], end=bounds["last_day"]).date)
+
+
+def get_available_dates(aws_client: BaseClient, model: str) -> Set[date]:
+    if model == "intervals":
+        return get_history_dates(aws_client)
+
+    return aws_client.get_partition_dates(database="staged", table="listings")
+
+
+def get_rollup_dates(aws_client: BaseClient) -> Set[date]:
+    if not aws_client.get_partitions(database="curated", table=ROLLUP_TABLE):
+        return set()
+
+    rollup_days = aws_client.read_query(
+        sql=rollup_days_query(), database="curated", result_mode="csv"
+    )
+
+    return set(pd.to_datetime(rollup_days["period_start"]).dt.date)
+
+
+def staged_source(model: str, as_of_dates: List[date]) -> str:
+    if model == "intervals":
+        return f"({expanded_history_query(as_of_dates)})"
+
+    return "listings"
+
+
+def month_batches(as_of_dates: List[date]) -> List[List[date]]:
+    # A table missing many days (e.g. the first run after it was added) is
+    # filled in a month at a time, so no query is bigger than a month's
+    return [
+        list(days)
+        for _, days in groupby(as_of_dates, key=lambda day: day.replace(day=1))
+    ]
+
+
+def write_rollup(
+    aws_client: BaseClient,
+    model: str,
+    as_of_dates: List[date],
+    available_dates: Set[date],
+) -> None:
+    """
+    Recomputes listings_rollup for every day, week and month the given days
+    fall in, see utils.rollup.
+    """
+
+    scan_dates = period_days(as_of_dates, available_dates)
+    rollup_df = aws_client.read_query(
+        sql=rollup_query(
+            as_of_dates, scan_dates, source=staged_source(model, scan_dates)
+        ),
+        database="staged",
+    )
+
+    if rollup_df.empty:
+        return
+
+    aws_client.upload_dataframe(
+        df=rollup_df.assign(
+            period_start=pd.to_datetime(rollup_df["period_start"]).dt.date
+        ),
+        database="curated",
+        table=ROLLUP_TABLE,
+        dtype=ROLLUP_DTYPES,
+        partition_cols=ROLLUP_PARTITIONS,
+    )
+
+
+def write_sketches(
+    aws_client: BaseClient, as_of_dates: List[date], source: str
+) -> None:
+    """
+    Mergeable sketches of the new days' curated cells, see utils.sketches.
+    """
+
+    sketches_df = aws_client.read_query(
+        sql=sketches_query(as_of_dates, source=source), database="staged"
+    )
+
+    if sketches_df.empty:
+        return
+
+    aws_client.upload_dataframe(
+        df=sketches_df, database="curated", table=SKETCH_TABLE, dtype=SKETCH_DTYPES
+    )
+
+
+def write_tiles(aws_client: BaseClient, as_of_dates: List[date], source: str) -> None:
+    """
+    The new days per map cell, see utils.tiles.
+    """
+
+    tiles_df = aws_client.read_query(
+        sql=curated_tiles_query(as_of_dates, source=source), database="staged"
+    )
+
+    if tiles_df.empty:
+        return
+
+    aws_client.upload_dataframe(
+        df=tiles_df, database="curated", table=TILE_TABLE, dtype=TILE_DTYPES
+    )
+
+
+def get_args() -> argparse.Namespace:
+    # Glue passes its own arguments alongside ours, so unknown ones are ignored
+    parser = argparse.ArgumentParser()
+    add_model_argument(parser)
+    add_table_arguments(parser)
+    args, _ = parser.parse_known_args()
+
+    return args
+
+
+@instrument("job")
 def main():
-    aws_client = AWSClient()
+    args = get_args()
 
-    staged_partitions = aws_client.get_partitions(database="staged", table="listings")
-    curated_partitions = aws_client.get_partitions(database="curated", table="listings")
+    aws_client = get_table_client(args)
+
+    available_dates = get_available_dates(aws_client, args.model)
+
+    # The rollup, sketches and tiles are filled in for every day they don't
+    # have yet, not just the days curated listings is missing, so days the
+    # fused pipeline curated or a failed run left out still get their rows
+    for as_of_dates in month_batches(
+        sorted(available_dates - get_rollup_dates(aws_client))
+    ):
+        write_rollup(aws_client, args.model, as_of_dates, available_dates)
+
+    for as_of_dates in month_batches(
+        sorted(
+            available_dates
+            - aws_client.get_partition_dates(database="curated", table=SKETCH_TABLE)
+        )
+    ):
+        write_sketches(
+            aws_client, as_of_dates, source=staged_source(args.model, as_of_dates)
+        )
+
+    for as_of_dates in month_batches(
+        sorted(
+            available_dates
+            - aws_client.get_partition_dates(database="curated", table=TILE_TABLE)
+        )
+    ):
+        write_tiles(
+            aws_client, as_of_dates, source=staged_source(args.model, as_of_dates)
+        )
 
     # Get Unprocessed Partitions
     # If a partition has already been processed, we don't want to overwrite history
-    # TODO: Fix weird as_of_date truncation in staged layer
-    unprocessed_staged_partitions = [
-        partition[:11]
-        for partition in staged_partitions
-        if partition not in curated_partitions
-    ]
+    unprocessed_staged_partitions = sorted(
+        available_dates
+        - aws_client.get_partition_dates(database="curated", table="listings")
+    )
+
+    if not unprocessed_staged_partitions:
+        return
+
+    source = staged_source(args.model, unprocessed_staged_partitions)
 
     staged_df = aws_client.read_query(
-        sql=f"""
-            SELECT
-                as_of_date,
-                city,
-                zip_code,
-                COUNT(*) AS total_listings,
-                APPROX_PERCENTILE(price, 0.5) AS median_listing_price,
-                APPROX_PERCENTILE(DATE_DIFF('day', listing_date, as_of_date), 0.5) AS median_days_on_market,
-                APPROX_PERCENTILE(price / living_area, 0.5) AS median_price_per_square_ft,
-                APPROX_PERCENTILE(lot_area_value / 43560, 0.5) AS avg_lot_size
-            FROM listings
-            WHERE as_of_date IN ({','.join([f"DATE('{partition}')" for partition in unprocessed_staged_partitions])})
-            GROUP BY
-                as_of_date,
-                city,
-                zip_code
-        """,
+        sql=curated_listings_query(unprocessed_staged_partitions, source=source),
         database="staged",
     )
 
-    # Get Unprocessed Curated Partitions
-    # Similar to above, we don't overwrite any partitions that
-    # have already been processed
-    all_dates = list(set([str(x) for x in staged_df["as_of_date"].dt.date]))
-    unprocessed_staged_partitions = [
-        partition for partition in all_dates if partition not in staged_partitions
-    ]
+    if staged_df.empty:
+        return
 
-    for partition in unprocessed_staged_partitions:
-        _tmp_df = staged_df[staged_df["as_of_date"] == partition]
-        aws_client.upload_dataframe(
-            df=_tmp_df,
-            database="curated",
-            table="listings",
-        )
+    # The query above only covers unprocessed partitions,
+    # so every day in the result is written in one dataset operation
+    # (or one MERGE commit for Iceberg)
+    aws_client.write_listings(df=staged_df, database="curated")
 
 
 main()
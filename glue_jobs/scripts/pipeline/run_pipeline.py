@@ -0,0 +1,147 @@
+import argparse
+import logging
+import pandas as pd
+import pyarrow as pa
+from datetime import date
+from typing import List
+from utils.base_client import BaseClient
+from utils.clients import add_table_arguments, get_table_client
+from utils.curated_listings import curated_listings_query
+from utils.listings_fetcher import iter_responses
+from utils.listings_schema import LISTING_SCHEMA, athena_types, listings_to_table
+from utils.metrics import instrument, stage
+from utils.page_cache import PageCache
+from utils.regions import DEFAULT_REGIONS, get_regions
+from utils.staged_listings import raw_listings_query, raw_to_staged, stage_listings
+
+
+logging.basicConfig(level=logging.INFO)
+
+
+def get_args() -> argparse.Namespace:
+    # Glue passes its own arguments alongside ours, so unknown ones are ignored
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["fetch", "replay"], default="fetch")
+    parser.add_argument("--response-cache", default=None)
+    # Comma separated ids from utils.regions.REGIONS
+    parser.add_argument("--regions", default=DEFAULT_REGIONS)
+    parser.add_argument("--run-date", type=date.fromisoformat, default=date.today())
+    add_table_arguments(parser)
+    args, _ = parser.parse_known_args()
+
+    return args
+
+
+def run_raw(aws_client: BaseClient, args: argparse.Namespace) -> pd.DataFrame:
+    cache = (
+        PageCache(
+            location=args.response_cache,
+            run_date=args.run_date,
+            boto3_session=aws_client.session,
+        )
+        if args.response_cache
+        else None
+    )
+
+    responses = iter_responses(
+        api_key=None if args.mode == "replay" else aws_client.get_secret("RapidAPIKey"),
+        mode=args.mode,
+        regions=get_regions(args.regions),
+        cache=cache,
+    )
+
+    listing_tables: List[pa.Table] = [
+        listings_to_table(listing_results["props"], region_id=region_id)
+        for region_id, listing_results in responses
+    ]
+
+    if not listing_tables:
+        raise ValueError("No listing results to upload")
+
+    raw_df = pa.concat_tables(listing_tables).to_pandas()
+    raw_df["as_of_date"] = args.run_date
+
+    aws_client.upload_dataframe(
+        df=raw_df,
+        database="raw",
+        table="listings",
+        dtype={**athena_types(LISTING_SCHEMA), "as_of_date": "date"},
+    )
+
+    return raw_df
+
+
+def run_staged(
+    aws_client: BaseClient, raw_df: pd.DataFrame, run_date: date
+) -> pd.DataFrame:
+    staged_dates = aws_client.get_partition_dates(database="staged", table="listings")
+    unprocessed_raw_partitions = aws_client.get_unprocessed_dates(
+        source="raw", target="staged", table="listings"
+    )
+
+    if not unprocessed_raw_partitions:
+        return raw_df.iloc[0:0]
+
+    # This run's snapshot is already in memory, only raw days an earlier run
+    # left unprocessed are read back through Athena. A rerun of a day that's
+    # already staged leaves it alone like the staged job does
+    raw_frames = (
+        [raw_to_staged(raw_df)] if run_date in unprocessed_raw_partitions else []
+    )
+    earlier_raw_dates = [day for day in unprocessed_raw_partitions if day != run_date]
+
+    if earlier_raw_dates:
+        raw_frames.append(
+            aws_client.read_query(
+                sql=raw_listings_query(earlier_raw_dates), database="raw"
+            )
+        )
+
+    staged_df = stage_listings(
+        pd.concat(raw_frames, ignore_index=True), staged_dates=staged_dates
+    )
+
+    if not staged_df.empty:
+        aws_client.write_listings(df=staged_df, database="staged")
+
+    return staged_df
+
+
+def run_curated(aws_client: BaseClient) -> None:
+    unprocessed_staged_partitions = aws_client.get_unprocessed_dates(
+        source="staged", target="curated", table="listings"
+    )
+
+    if not unprocessed_staged_partitions:
+        return
+
+    # Aggregated by Athena like the curated job does, so both write the same
+    # APPROX_PERCENTILE medians. Staged was just written and the result is a
+    # row per city and zip code, so there's little to read back
+    curated_df = aws_client.read_query(
+        sql=curated_listings_query(unprocessed_staged_partitions), database="staged"
+    )
+
+    if not curated_df.empty:
+        aws_client.write_listings(df=curated_df, database="curated")
+
+
+@instrument("job")
+def main():
+    args = get_args()
+
+    aws_client = get_table_client(args)
+
+    # Every layer is still written to its table, but staged is built from the
+    # raw frame in memory instead of reading raw back through Athena
+    with stage("raw"):
+        raw_df = run_raw(aws_client, args)
+
+    with stage("staged"):
+        run_staged(aws_client, raw_df, run_date=args.run_date)
+
+    with stage("curated"):
+        run_curated(aws_client)
+
+
+main()
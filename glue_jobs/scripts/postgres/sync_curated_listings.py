@@ -0,0 +1,66 @@
+import argparse
+import logging
+import os
+import psycopg
+from utils.clients import add_table_arguments, get_table_client
+from utils.metrics import instrument, stage
+from utils.postgres_sync import (
+    DEFAULT_DSN,
+    create_tables,
+    curated_days_query,
+    get_synced_days,
+    upsert_curated,
+)
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dsn", default=os.environ.get("POSTGRES_DSN", DEFAULT_DSN))
+    # Days are read and committed in batches, each one records its days
+    parser.add_argument("--batch-days", type=int, default=31)
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Send every curated day again, e.g. after curated days were recomputed",
+    )
+    add_table_arguments(parser)
+    args, _ = parser.parse_known_args()
+
+    return args
+
+
+@instrument("job")
+def main():
+    args = get_args()
+
+    aws_client = get_table_client(args)
+
+    # Autocommit, so each batch's transaction commits on its own
+    with psycopg.connect(args.dsn, autocommit=True) as connection:
+        create_tables(connection)
+        synced_days = set() if args.full else get_synced_days(connection)
+
+        unsynced_dates = sorted(
+            aws_client.get_partition_dates(database="curated", table="listings")
+            - synced_days
+        )
+        logger.info(
+            "synced_days=%s unsynced_days=%s", len(synced_days), len(unsynced_dates)
+        )
+
+        for i in range(0, len(unsynced_dates), args.batch_days):
+            batch = unsynced_dates[i : i + args.batch_days]
+
+            with stage("sync", FirstDay=str(batch[0]), LastDay=str(batch[-1])):
+                # Not the CSV result, which reads empty strings back as nulls
+                curated_df = aws_client.read_query(
+                    sql=curated_days_query(batch), database="curated"
+                )
+                upsert_curated(connection, curated_df, as_of_dates=batch)
+
+
+main()
@@ -1,123 +1,99 @@
-import pandas as pd
-import requests
-import time
+import argparse
+import logging
+import pyarrow as pa
 from datetime import date
-from typing import List, Optional, TypedDict
-from utils.aws_client import AWSClient
-
-
-class ListingSubType(TypedDict):
-    is_FSBA: bool
-
-
-class OpenHouseInfo(TypedDict):
-    open_house_start: int
-    open_house_end: int
-
-
-class OpenHouseInfo(TypedDict):
-    open_house_showing: List[OpenHouseInfo]
-
-
-class Listing(TypedDict):
-    bathrooms: int
-    state: str
-    isFeatured: bool
-    isPremierBuilder: bool
-    lotAreaUnit: str
-    isPreforeclosureAuction: bool
-    longitude: float
-    isNonOwnerOccupied: bool
-    lotAreaValue: int
-    taxAssessedValue: int
-    country: str
-    livingArea: int
-    homeStatus: str
-    daysOnZillow: int
-    latitude: float
-    isUnmappable: bool
-    bedrooms: int
-    streetAddress: str
-    homeStatusForHDP: str
-    isZillowOwned: bool
-    shouldHighlight: bool
-    zpid: int
-    listing_sub_type: ListingSubType
-    rentZestimate: int
-    zestimate: int
-    city: str
-    price: int
-    homeType: str
-    currency: str
-    zipcode: str
-    priceForHDP: int
-    open_house_info: OpenHouseInfo
-    isRentalWithBasePrice: bool
-    openHouse: str
-    priceChange: int
-    datePriceChanged: int
-    priceReduction: str
-
-
-class ListingsResponse:
-    props: List[Listing]
-    resultsPerPage: int
-    totalPages: int
-    totalResultCount: int
-    currentPage: int
-
-
-URL = "https://www.zillow.com/mahoning-county-oh/?searchQueryState=%7B%22pagination%22%3A%7B%7D%2C%22mapBounds%22%3A%7B%22north%22%3A41.86092787686419%2C%22south%22%3A40.216172776295814%2C%22east%22%3A-79.45971688671875%2C%22west%22%3A-82.14587411328125%7D%2C%22regionSelection%22%3A%5B%7B%22regionId%22%3A2399%2C%22regionType%22%3A4%7D%2C%7B%22regionId%22%3A2905%2C%22regionType%22%3A4%7D%2C%7B%22regionId%22%3A2583%2C%22regionType%22%3A4%7D%5D%2C%22isMapVisible%22%3Atrue%2C%22filterState%22%3A%7B%22sort%22%3A%7B%22value%22%3A%22globalrelevanceex%22%7D%2C%22ah%22%3A%7B%22value%22%3Atrue%7D%7D%2C%22isListVisible%22%3Atrue%2C%22mapZoom%22%3A9%7D"
-
-
-def get_listing_results(
-    api_key: str, listing_url: str, page_num: Optional[int] = 1
-) -> ListingsResponse:
-    url = "https://zillow-com1.p.rapidapi.com/searchByUrl"
-    headers = {
-        "x-rapidapi-key": api_key,
-        "x-rapidapi-host": "zillow-com1.p.rapidapi.com",
-    }
-    params = {"url": listing_url, "page": page_num}
-
-    response = requests.get(url=url, headers=headers, params=params)
-    return response.json()
+from typing import List
+from utils.clients import add_table_arguments, get_table_client
+from utils.listings_fetcher import iter_responses
+from utils.listings_schema import LISTING_SCHEMA, athena_types, listings_to_table
+from utils.metrics import instrument
+from utils.page_cache import PageCache
+from utils.regions import DEFAULT_REGIONS, get_regions
 
 
-def main():
-    aws_client = AWSClient()
+logging.basicConfig(level=logging.INFO)
 
-    api_key = aws_client.get_secret("RapidAPIKey")
 
-    # All results will be concatenated into a single list
-    # Something like a map state in AWS Step Functions would be nice here but that would
-    # violate my one request per second rate limit on my free tier for the API
-    listing_dfs: List[pd.DataFrame] = []
+def get_args() -> argparse.Namespace:
+    # Glue passes its own arguments alongside ours, so unknown ones are ignored
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["fetch", "replay"], default="fetch")
+    parser.add_argument("--write-mode", choices=["batch", "stream"], default="stream")
+    parser.add_argument("--response-cache", default=None)
+    # Comma separated ids from utils.regions.REGIONS
+    parser.add_argument("--regions", default=DEFAULT_REGIONS)
+    parser.add_argument("--run-date", type=date.fromisoformat, default=date.today())
+    add_table_arguments(parser, table_format=False)
+    args, _ = parser.parse_known_args()
 
-    # Initial Loop
-    listing_results = get_listing_results(api_key=api_key, listing_url=URL)
-    listing_dfs.append(pd.json_normalize(listing_results["props"]))
+    return args
 
-    total_pages = listing_results["totalPages"]
 
-    # Subsequent Loops Assuming Pagination is Needed
-    for page in range(2, total_pages):
-        listing_results = get_listing_results(
-            api_key=api_key, listing_url=URL, page_num=page
-        )
-        listing_dfs.append(pd.json_normalize(listing_results["props"]))
+@instrument("job")
+def main():
+    args = get_args()
+
+    aws_client = get_table_client(args)
 
-        time.sleep(45)
+    # Every page's response is saved as it arrives so a failed run can pick up
+    # where it left off, and a replay can rebuild the partition without the API
+    cache = (
+        PageCache(
+            location=args.response_cache,
+            run_date=args.run_date,
+            boto3_session=aws_client.session,
+        )
+        if args.response_cache
+        else None
+    )
 
-    listing_df = pd.concat(listing_dfs)
+    responses = iter_responses(
+        api_key=None if args.mode == "replay" else aws_client.get_secret("RapidAPIKey"),
+        mode=args.mode,
+        regions=get_regions(args.regions),
+        cache=cache,
+    )
 
     # Yeah, yeah. Raw layer means no transformations. But you know what?
     # I want a partition column that uses a date. Will anyone care? Will
     # anyone actually read my code? Or will I just keep yeeting side
     # projects into the abyss? Is that how you spell abyss!?!?!?!?
-    listing_df["as_of_date"] = date.today()
+    if args.write_mode == "stream":
+        # Each page is converted to the declared schema as it arrives and the
+        # pages are written in parts of up to 100k rows (the raw layout's
+        # target_file_rows), so memory stays bounded by one part
+        partition = aws_client.stream_partition(
+            database="raw", table="listings", as_of_date=args.run_date
+        )
+
+        for region_id, listing_results in responses:
+            partition.append(
+                listings_to_table(listing_results["props"], region_id=region_id)
+            )
+
+        partition.commit()
+        return
 
-    aws_client.upload_dataframe(df=listing_df, database="raw", table="listings")
+    # All results will be concatenated into a single list
+    # Something like a map state in AWS Step Functions would be nice here but that would
+    # violate my one request per second rate limit on my free tier for the API
+    listing_tables: List[pa.Table] = [
+        listings_to_table(listing_results["props"], region_id=region_id)
+        for region_id, listing_results in responses
+    ]
+
+    if not listing_tables:
+        raise ValueError("No listing results to upload")
+
+    listing_df = pa.concat_tables(listing_tables).to_pandas()
+    listing_df["as_of_date"] = args.run_date
+
+    aws_client.upload_dataframe(
+        df=listing_df,
+        database="raw",
+        table="listings",
+        dtype={**athena_types(LISTING_SCHEMA), "as_of_date": "date"},
+    )
 
 
 main()
@@ -1,128 +1,216 @@
+import argparse
 import pandas as pd
-from datetime import date, datetime
-from typing import List
-from utils.aws_client import AWSClient
-
-
-def change_dtypes(df: pd.DataFrame) -> pd.DataFrame:
-    _tmp_df = df.copy()
-
-    _tmp_df["as_of_date"] = pd.to_datetime(df["as_of_date"], format="%Y-%m-%d").dt.date
-    return _tmp_df
+from datetime import date
+from typing import List, Set
+from utils.base_client import BaseClient
+from utils.clients import add_model_argument, add_table_arguments, get_table_client
+from utils.listings_history import (
+    HISTORY_DTYPES,
+    HISTORY_TABLE,
+    build_history,
+    closed_since_query,
+    current_history_query,
+    empty_history,
+    history_columns,
+    history_view_query,
+    last_snapshot_query,
+    unwritten_states,
+)
+from utils.metrics import instrument
+from utils.staged_listings import (
+    MAX_PARTITIONS_PER_INSERT,
+    STAGED_TYPES,
+    get_target_dates,
+    insert_staged_listings_query,
+    min_listing_date_query,
+    raw_listings_query,
+    stage_listings,
+)
+
+
+def run_pandas_engine(
+    aws_client: BaseClient, raw_dates: List[date], staged_dates: Set[date]
+) -> None:
+    staged_df = aws_client.read_query(
+        sql=raw_listings_query(raw_dates),
+        database="raw",
+    )
 
+    staged_df = stage_listings(staged_df, staged_dates=staged_dates)
 
-def get_listing_date(df: pd.DataFrame) -> pd.DataFrame:
-    _tmp_df = df.copy()
+    if staged_df.empty:
+        return
 
-    _tmp_df["current_date"] = datetime.now()
-    _tmp_df["time_delta"] = pd.to_timedelta(_tmp_df["days_on_zillow"], unit="d")
-    _tmp_df["listing_date"] = _tmp_df["current_date"] - _tmp_df["time_delta"]
-    _tmp_df["listing_date"] = _tmp_df["listing_date"].dt.date
+    # Every missing day is written in one dataset operation, or with Iceberg
+    # in one MERGE commit
+    aws_client.write_listings(df=staged_df, database="staged")
 
-    return _tmp_df.drop(columns=["current_date", "time_delta"])
 
+def run_athena_engine(
+    aws_client: BaseClient, raw_dates: List[date], staged_dates: Set[date]
+) -> None:
+    # Same transform as above, but Athena does the work and writes the staged
+    # partitions itself. Python only picks the target days and checks the result.
+    min_listing_date = aws_client.read_query(
+        sql=min_listing_date_query(raw_dates),
+        database="raw",
+        result_mode="csv",
+    )["min_listing_date"].iloc[0]
 
-def duplicate_listings(df: pd.DataFrame) -> pd.DataFrame:
-    min_date = df["listing_date"].min()
-    days = pd.date_range(start=min_date, end=date.today())
+    if pd.isna(min_listing_date):
+        return
 
-    dfs: List[pd.DataFrame] = []
+    unprocessed_staged_partitions = get_target_dates(
+        pd.Timestamp(min_listing_date).date(), processed_dates=staged_dates
+    )
 
-    for day in days:
-        _tmp_df = df.copy()
-        _tmp_df["as_of_date"] = day
-        _tmp_df = _tmp_df[_tmp_df["listing_date"] <= _tmp_df["as_of_date"]]
-        dfs.append(_tmp_df)
+    # The INSERT names every staged column, including ones added since the
+    # table was created
+    aws_client.add_columns(
+        database="staged",
+        table="listings",
+        columns_types={**STAGED_TYPES, "quadkey": "string"},
+    )
 
-    return pd.concat(dfs)
+    for i in range(0, len(unprocessed_staged_partitions), MAX_PARTITIONS_PER_INSERT):
+        aws_client.execute_query(
+            sql=insert_staged_listings_query(
+                raw_dates=raw_dates,
+                as_of_dates=unprocessed_staged_partitions[
+                    i : i + MAX_PARTITIONS_PER_INSERT
+                ],
+            ),
+            database="staged",
+        )
 
+    aws_client.invalidate_partitions(database="staged", table="listings")
+    missing_dates = set(unprocessed_staged_partitions) - aws_client.get_partition_dates(
+        database="staged", table="listings"
+    )
 
-def main():
-    aws_client = AWSClient()
+    if missing_dates:
+        raise RuntimeError(
+            f"Athena did not write staged partitions for {sorted(missing_dates)}"
+        )
 
-    raw_partitions = aws_client.get_partitions(database="raw", table="listings")
-    staged_partitions = aws_client.get_partitions(database="staged", table="listings")
 
-    # Get Unprocessed Partitions
-    # If a partition has already been processed, we don't want to overwrite history
-    unprocessed_raw_partitions = [
-        partition for partition in raw_partitions if partition not in staged_partitions
+def run_intervals_model(aws_client: BaseClient) -> None:
+    # Each distinct state of a listing is stored once with the days it was
+    # valid for, instead of a full copy of the listing for every day
+    if aws_client.get_partitions(database="staged", table=HISTORY_TABLE):
+        aws_client.add_columns(
+            database="staged", table=HISTORY_TABLE, columns_types=HISTORY_DTYPES
+        )
+        last_snapshot_date = aws_client.read_query(
+            sql=last_snapshot_query(),
+            database="staged",
+            result_mode="csv",
+        )["last_snapshot_date"].iloc[0]
+        previous_date = pd.Timestamp(last_snapshot_date).date()
+        current_df = aws_client.read_query(
+            sql=current_history_query(), database="staged"
+        )
+    else:
+        previous_date = None
+        current_df = empty_history()
+
+    # Snapshots up to the latest one in the history are already applied
+    raw_dates = [
+        raw_date
+        for raw_date in sorted(
+            aws_client.get_partition_dates(database="raw", table="listings")
+        )
+        if previous_date is None or raw_date > previous_date
     ]
 
-    staged_df = aws_client.read_query(
-        sql=f"""
-            SELECT DISTINCT
-                isshowcaselisting AS is_show_case_listing,
-                longitude,
-                timeonzillow AS time_on_zillow,
-                daysonzillow AS days_on_zillow,
-                streetaddress AS street_address,
-                taxassessedvalue AS tax_assessed_value,
-                isunmappable AS is_unmappable,
-                priceforhdp AS price_for_hdp,
-                bathrooms,
-                state,
-                isfeatured AS is_featured,
-                ispremierbuilder AS is_premier_builder,
-                ispreforeclosureauction AS is_pre_foreclosure_auction,
-                lotareavalue AS lot_area_value,
-                isnonowneroccupied AS is_non_owner_occupied,
-                homestatus AS home_status,
-                latitude,
-                zipcode AS zip_code,
-                bedrooms,
-                homestatusforhdp AS home_status_for_hdp,
-                hometype AS home_type,
-                iszillowowned AS is_zillow_owned,
-                shouldhighlight AS should_highlight,
-                price,
-                zpid,
-                openhouse AS open_house,
-                city,
-                country,
-                currency,
-                livingarea AS living_area,
-                listing_sub_type_is_fsba,
-                listing_sub_type_is_openhouse,
-                isrentalwithbaseprice AS is_rental_with_base_price,
-                listing_sub_type_is_forauction AS listing_sub_type_is_for_auction,
-                pricechange AS price_change,
-                datepricechanged AS date_price_changed,
-                pricereduction AS price_reduction,
-                listing_sub_type_is_bankowned,
-                newconstructiontype AS new_construction_type,
-                listing_sub_type_is_newhome,
-                unit,
-                zestimate,
-                rentzestimate,
-                DATE(as_of_date) AS as_of_date
-            FROM listings
-            WHERE as_of_date IN ({','.join([f"DATE('{partition}')" for partition in unprocessed_raw_partitions])})
-        """,
-        database="raw",
-    )
+    if not raw_dates:
+        return
 
-    staged_df = (
-        staged_df.pipe(change_dtypes).pipe(get_listing_date).pipe(duplicate_listings)
+    raw_df = aws_client.read_query(sql=raw_listings_query(raw_dates), database="raw")
+
+    current_df, closed_df = build_history(
+        raw_df=raw_df,
+        current=current_df,
+        snapshot_dates=raw_dates,
+        previous_date=previous_date,
     )
 
-    # Get Unprocessed Staged Partitions
-    # Similar to above, we don't overwrite any partitions that
-    # have already been processed
-    all_dates = list(set([str(x) for x in staged_df["as_of_date"].dt.date]))
-    unprocessed_staged_partitions = [
-        partition for partition in all_dates if partition not in staged_partitions
-    ]
+    columns = history_columns() + ["is_current"]
+
+    # Closed states are appended before the current ones are replaced, so a
+    # failure in between never loses a state that was open. The retry then
+    # starts from the same current states and closes them again, so states
+    # the failed run already appended are left out
+    if not closed_df.empty and previous_date is not None:
+        closed_df = unwritten_states(
+            closed_df,
+            aws_client.read_query(
+                sql=closed_since_query(previous_date),
+                database="staged",
+                result_mode="csv",
+            ),
+        )
 
-    # Duplicate individual listings from listing date to current
-    # This simplifies any down stream time series analysis
-    for partition in unprocessed_staged_partitions:
-        _tmp_df = staged_df[staged_df["as_of_date"] == partition]
+    if not closed_df.empty:
         aws_client.upload_dataframe(
-            df=_tmp_df,
+            df=closed_df[columns],
             database="staged",
-            table="listings",
+            table=HISTORY_TABLE,
+            dtype=HISTORY_DTYPES,
+            mode="append",
+            partition_cols=["is_current"],
         )
 
+    aws_client.upload_dataframe(
+        df=current_df[columns],
+        database="staged",
+        table=HISTORY_TABLE,
+        dtype=HISTORY_DTYPES,
+        partition_cols=["is_current"],
+    )
+
+    aws_client.execute_query(sql=history_view_query(), database="staged")
+
+
+def get_args() -> argparse.Namespace:
+    # Glue passes its own arguments alongside ours, so unknown ones are ignored
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=["pandas", "athena"], default="pandas")
+    add_model_argument(parser)
+    add_table_arguments(parser)
+    args, _ = parser.parse_known_args()
+
+    return args
+
+
+@instrument("job")
+def main():
+    args = get_args()
+
+    aws_client = get_table_client(args)
+
+    if args.model == "intervals":
+        if args.engine == "athena":
+            raise ValueError("The intervals model only runs on the pandas engine")
+
+        run_intervals_model(aws_client)
+        return
+
+    staged_dates = aws_client.get_partition_dates(database="staged", table="listings")
+
+    # Get Unprocessed Partitions
+    # If a partition has already been processed, we don't want to overwrite history
+    unprocessed_raw_partitions = aws_client.get_unprocessed_dates(
+        source="raw", target="staged", table="listings"
+    )
+
+    if not unprocessed_raw_partitions:
+        return
+
+    if args.engine == "athena":
+        run_athena_engine(aws_client, unprocessed_raw_partitions, staged_dates)
+    else:
+        run_pandas_engine(aws_client, unprocessed_raw_partitions, staged_dates)
+
 
 main()
@@ -4,5 +4,10 @@ setup(
     name="utils",
     version="0.1",
     packages=["utils"],
-    install_requires=["awswrangler"],
+    install_requires=["aiohttp", "awswrangler", "pyarrow"],
+    extras_require={
+        "local": ["duckdb"],
+        "postgres": ["psycopg[binary]"],
+        "profile": ["pyinstrument"],
+    },
 )
@@ -0,0 +1,180 @@
+import awswrangler as wr
+import io
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import sys
+from awswrangler.s3._write_dataset import _get_subgroup_prefix
+from typing import Dict, List
+
+
+# The jobs import utils from glue_jobs/, the same as PYTHONPATH=glue_jobs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+from utils.aws_client import AWSClient  # noqa: E402
+from utils.base_client import BaseClient  # noqa: E402
+
+
+class EntityNotFoundException(Exception):
+    pass
+
+
+class FakeGlue:
+    """
+    The Glue calls AWSClient makes, over a dict of partition values ->
+    location and one table's column types.
+    """
+
+    class exceptions:
+        EntityNotFoundException = EntityNotFoundException
+
+    def __init__(self, partition_keys: List[str]) -> None:
+        self.partition_keys = partition_keys
+        self.partitions: Dict[tuple, str] = {}
+        self.columns: Dict[str, str] = {}
+
+    def get_table(self, DatabaseName: str, Name: str) -> dict:
+        return {
+            "Table": {
+                "Name": Name,
+                "StorageDescriptor": {
+                    "Columns": [
+                        {"Name": name, "Type": column_type}
+                        for name, column_type in self.columns.items()
+                    ]
+                },
+                "PartitionKeys": [{"Name": k} for k in self.partition_keys],
+            }
+        }
+
+    def update_table(self, DatabaseName: str, TableInput: dict) -> None:
+        self.columns = {
+            column["Name"]: column["Type"]
+            for column in TableInput["StorageDescriptor"]["Columns"]
+        }
+
+    def get_partition(self, DatabaseName, TableName, PartitionValues) -> dict:
+        if tuple(PartitionValues) not in self.partitions:
+            raise EntityNotFoundException()
+
+        return {
+            "Partition": {
+                "Values": list(PartitionValues),
+                "StorageDescriptor": {
+                    "Location": self.partitions[tuple(PartitionValues)]
+                },
+            }
+        }
+
+    def update_partition(self, DatabaseName, TableName, PartitionValueList, **kwargs):
+        location = kwargs["PartitionInput"]["StorageDescriptor"]["Location"]
+        self.partitions[tuple(PartitionValueList)] = location
+
+
+@pytest.fixture
+def fake_aws(monkeypatch):
+    """
+    An AWSClient whose S3 is a dict of path -> Parquet bytes. to_parquet
+    behaves like awswrangler: overwrite_partitions replaces the key=value
+    folders and existing catalog partitions keep their location.
+    """
+
+    objects: Dict[str, bytes] = {}
+    glue = FakeGlue(["as_of_date"])
+
+    def list_objects(path, **kwargs):
+        return sorted(key for key in objects if key.startswith(path))
+
+    def delete_objects(path, **kwargs):
+        for key in list_objects(path) if isinstance(path, str) else path:
+            objects.pop(key, None)
+
+    def copy_objects(paths, source_path, target_path, **kwargs):
+        for key in paths:
+            objects[target_path + key[len(source_path) :]] = objects[key]
+
+    def upload(local_file, path, **kwargs):
+        objects[path] = local_file.read()
+
+    def register_columns(columns_types):
+        # awswrangler adds new columns but refuses to change a column's type
+        for column, column_type in columns_types.items():
+            if glue.columns.setdefault(column, column_type) != column_type:
+                raise wr.exceptions.InvalidArgumentValue(
+                    f"Data type change detected on column {column}"
+                )
+
+    def to_parquet(df, path, mode, partition_cols, dtype=None, **kwargs):
+        register_columns(
+            wr.catalog.extract_athena_types(
+                df=df, partition_cols=partition_cols, dtype=dtype
+            )[0]
+        )
+        paths = []
+
+        for keys, group in df.groupby(partition_cols):
+            prefix = _get_subgroup_prefix(keys, partition_cols, f"{path}/")
+
+            if mode == "overwrite_partitions":
+                delete_objects(prefix)
+
+            buffer = io.BytesIO()
+            pq.write_table(
+                pa.Table.from_pandas(
+                    group.drop(columns=partition_cols), preserve_index=False
+                ),
+                buffer,
+            )
+            objects[f"{prefix}part-{len(objects)}.parquet"] = buffer.getvalue()
+            glue.partitions.setdefault(tuple(str(key) for key in keys), prefix)
+            paths.append(prefix)
+
+        return {"paths": paths, "partitions_values": {}}
+
+    monkeypatch.setattr(wr.s3, "list_objects", list_objects)
+    monkeypatch.setattr(wr.s3, "delete_objects", delete_objects)
+    monkeypatch.setattr(wr.s3, "copy_objects", copy_objects)
+    monkeypatch.setattr(wr.s3, "upload", upload)
+    monkeypatch.setattr(wr.s3, "to_parquet", to_parquet)
+    monkeypatch.setattr(wr.s3, "size_objects", lambda path, **kwargs: {})
+    monkeypatch.setattr(
+        wr.catalog,
+        "create_parquet_table",
+        lambda columns_types, **kwargs: register_columns(columns_types),
+    )
+    monkeypatch.setattr(
+        wr.catalog,
+        "add_parquet_partitions",
+        lambda partitions_values, **kwargs: glue.partitions.update(
+            (tuple(values), location) for location, values in partitions_values.items()
+        ),
+    )
+    monkeypatch.setattr(
+        wr.catalog,
+        "get_partitions",
+        lambda **kwargs: {
+            location: list(values) for values, location in glue.partitions.items()
+        },
+    )
+
+    aws_client = AWSClient.__new__(AWSClient)
+    BaseClient.__init__(aws_client)
+    aws_client.session = None
+    aws_client.account_id = "123"
+    aws_client.clients = {"glue": glue}
+
+    def read_partition(values: List[str]) -> pd.DataFrame:
+        location = glue.partitions[tuple(values)]
+
+        return pd.concat(
+            pq.read_table(io.BytesIO(objects[key])).to_pandas()
+            for key in list_objects(location)
+        )
+
+    aws_client.objects = objects
+    aws_client.read_partition = read_partition
+
+    return aws_client
@@ -0,0 +1,126 @@
+import pandas as pd
+import pyarrow as pa
+from awswrangler.s3._write_dataset import _get_subgroup_prefix
+from datetime import date
+from typing import List
+from utils.base_client import PartitionFiles
+from utils.compaction import (
+    frame_partition_paths,
+    group_by_month,
+    needs_compaction,
+    split_table,
+)
+from utils.local_client import LocalAWSClient
+
+
+def listings(prices: List[int], as_of_date: date) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"zpid": range(len(prices)), "price": prices, "as_of_date": as_of_date}
+    )
+
+
+def test_split_table():
+    table = pa.table({"zpid": range(10)})
+
+    pieces = split_table(table, source_bytes=300, target_file_bytes=100)
+    assert [piece.num_rows for piece in pieces] == [4, 4, 2]
+    assert pa.concat_tables(pieces).equals(table)
+
+    assert len(split_table(table, source_bytes=50, target_file_bytes=100)) == 1
+    assert [piece.num_rows for piece in split_table(table.slice(0, 0), 300, 100)] == [0]
+
+
+def test_needs_compaction():
+    def partition(*sizes):
+        return PartitionFiles(
+            values={"as_of_date": "2026-10-12"},
+            location="s3://bucket/listings/as_of_date=2026-10-12",
+            files={f"part-{i}.parquet": size for i, size in enumerate(sizes)},
+        )
+
+    assert needs_compaction(partition(10, 10, 10), target_file_bytes=100)
+    assert not needs_compaction(partition(10), target_file_bytes=100)
+    assert not needs_compaction(partition(90, 90), target_file_bytes=100)
+
+
+def test_group_by_month():
+    partitions = [
+        PartitionFiles({"as_of_date": value}, "", {})
+        for value in ["2026-09-30 00:00:00", "2026-10-01 00:00:00", "2026-10-12"]
+    ]
+
+    assert {
+        month: [partition.values["as_of_date"][:10] for partition in group]
+        for month, group in group_by_month(partitions).items()
+    } == {"2026-09": ["2026-09-30"], "2026-10": ["2026-10-01", "2026-10-12"]}
+
+
+def test_partition_paths_match_awswrangler():
+    df = pd.DataFrame(
+        {
+            "grain": ["day", "day", "week"],
+            "period_start": [date(2026, 10, 5), date(2026, 10, 6), date(2026, 10, 5)],
+            "as_of_date": pd.to_datetime(["2026-10-05", "2026-10-06", "2026-10-06"]),
+        }
+    )
+
+    for partition_cols in (["grain", "period_start"], ["as_of_date"]):
+        expected = {
+            _get_subgroup_prefix(keys, partition_cols, "")[:-1]
+            for keys, _ in df.groupby(partition_cols)
+        }
+        assert frame_partition_paths(df, partition_cols) == expected
+
+
+def test_rewrite_after_compaction_aws(fake_aws):
+    aws_client = fake_aws
+    day = date(2026, 10, 12)
+
+    aws_client.upload_dataframe(
+        df=listings([1, 2], day), database="curated", table="listings_rollup"
+    )
+    aws_client.replace_partition(
+        database="curated",
+        table="listings_rollup",
+        values={"as_of_date": str(day)},
+        tables=[pa.table({"zpid": [0, 1], "price": [1, 2]})],
+    )
+    assert "/versions/" in aws_client.clients["glue"].partitions[(str(day),)]
+
+    aws_client.upload_dataframe(
+        df=listings([3, 4, 5], day), database="curated", table="listings_rollup"
+    )
+
+    assert aws_client.read_partition([str(day)])["price"].tolist() == [3, 4, 5]
+
+    aws_client.upload_dataframe(
+        df=listings([6], day),
+        database="curated",
+        table="listings_rollup",
+        mode="append",
+    )
+
+    assert sorted(aws_client.read_partition([str(day)])["price"]) == [3, 4, 5, 6]
+
+
+def test_rewrite_after_compaction_local(tmp_path):
+    client = LocalAWSClient(root=str(tmp_path))
+    day = date(2026, 10, 12)
+
+    client.upload_dataframe(
+        df=listings([1, 2], day), database="curated", table="listings_rollup"
+    )
+    client.replace_partition(
+        database="curated",
+        table="listings_rollup",
+        values={"as_of_date": str(day)},
+        tables=[pa.table({"zpid": [0, 1], "price": [1, 2]})],
+    )
+    client.upload_dataframe(
+        df=listings([3, 4, 5], day), database="curated", table="listings_rollup"
+    )
+
+    prices = client.read_query(
+        sql="SELECT price FROM listings_rollup ORDER BY price", database="curated"
+    )["price"].tolist()
+    assert prices == [3, 4, 5]
@@ -0,0 +1,40 @@
+from utils.content_hash import content_hash
+from utils.listings_schema import HASH_COLUMN, REGION_COLUMN, listings_to_table
+from utils.synthetic_listings import generate_listings
+
+
+def test_arrow_and_pandas_hashes_agree():
+    listings = generate_listings(50, seed=3)
+    listings[0]["price"] = None
+    listings[1]["isFeatured"] = None
+    listings[2]["streetAddress"] = None
+    listings[3]["open_house_info"] = {
+        "open_house_showing": [
+            {"open_house_start": 1, "open_house_end": 2},
+            {"open_house_start": 3, "open_house_end": None},
+        ]
+    }
+    listings[4]["open_house_info"] = {"open_house_showing": []}
+
+    table = listings_to_table(listings, region_id="r1")
+    columns = [
+        column
+        for column in table.column_names
+        if column not in (REGION_COLUMN, HASH_COLUMN)
+    ]
+    df = table.to_pandas()
+
+    # listings_to_table hashes with arrow_content_hash
+    assert table.column(HASH_COLUMN).to_pylist() == content_hash(df, columns).tolist()
+
+
+def test_hash_changes_with_values():
+    df = listings_to_table(generate_listings(2, seed=1)).to_pandas()
+    columns = ["price", "isfeatured", "city"]
+
+    changed = df.copy()
+    changed.loc[0, "price"] += 1
+
+    hashes, changed_hashes = content_hash(df, columns), content_hash(changed, columns)
+    assert hashes[0] != changed_hashes[0]
+    assert hashes[1] == changed_hashes[1]
@@ -0,0 +1,56 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from awswrangler.s3._write import _get_write_table_args
+from datetime import date
+from utils.layouts import LAYOUTS, STAGED_LAYOUT
+from utils.local_client import LocalAWSClient
+
+
+def test_row_group_size_survives_every_file():
+    options = STAGED_LAYOUT.wrangler_options()
+
+    # awswrangler pops the write args once per file it writes
+    for _ in range(3):
+        assert _get_write_table_args(options) == {"row_group_size": 16_384}
+
+    assert "write_table_args" not in dict(options)
+
+
+def test_wrangler_options_open_a_writer():
+    table = pa.table({"city": ["a"] * 40_000, "zpid": list(range(40_000))})
+    options = STAGED_LAYOUT.wrangler_options()
+    buffer = io.BytesIO()
+
+    write_table_args = _get_write_table_args(options)
+    writer = pq.ParquetWriter(buffer, table.schema, compression="zstd", **options)
+    writer.write_table(table, **write_table_args)
+    writer.close()
+
+    metadata = pq.ParquetFile(io.BytesIO(buffer.getvalue())).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [
+        16_384,
+        16_384,
+        7_232,
+    ]
+
+
+def test_files_hold_many_row_groups():
+    for layout in LAYOUTS.values():
+        if layout.target_file_rows:
+            assert layout.target_file_rows >= 16 * layout.row_group_rows
+
+
+def test_local_upload_with_file_size_only(tmp_path):
+    client = LocalAWSClient(root=str(tmp_path))
+    df = pd.DataFrame({"zpid": [3, 1, 2], "as_of_date": date(2026, 10, 12)})
+
+    # The raw layout sets a file size but leaves row groups at the default
+    assert LAYOUTS[("raw", "listings")].target_file_rows
+    client.upload_dataframe(df=df, database="raw", table="listings")
+
+    zpids = client.read_query(
+        sql="SELECT zpid FROM listings ORDER BY zpid", database="raw"
+    )["zpid"].tolist()
+    assert zpids == [1, 2, 3]
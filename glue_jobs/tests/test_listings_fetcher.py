@@ -0,0 +1,152 @@
+import aiohttp
+import asyncio
+import json
+import pytest
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from utils.listings_fetcher import ListingsFetcher, TokenBucket, iter_async
+from utils.regions import get_regions
+
+
+async def slow_pages(count: int, delay: float, closed: list):
+    try:
+        for page in range(count):
+            await asyncio.sleep(delay)
+            yield "region", {"props": [{"zpid": page}]}
+    finally:
+        closed.append(True)
+
+
+def test_pages_are_fetched_while_the_caller_works():
+    closed = []
+    started_at = time.perf_counter()
+
+    for _ in iter_async(slow_pages(5, delay=0.1, closed=closed)):
+        # Parsing and writing a page
+        time.sleep(0.1)
+
+    # One after the other would take a second
+    assert time.perf_counter() - started_at < 0.8
+    assert closed == [True]
+
+
+def test_fetch_errors_reach_the_caller():
+    async def failing():
+        yield "region", {"props": []}
+        raise RuntimeError("API down")
+
+    pages = iter_async(failing())
+    assert next(pages)[0] == "region"
+
+    with pytest.raises(RuntimeError, match="API down"):
+        next(pages)
+
+
+def test_stopping_early_cancels_the_fetch():
+    closed = []
+    pages = iter_async(slow_pages(1000, delay=0.01, closed=closed), prefetch=2)
+
+    next(pages)
+    pages.close()
+
+    assert closed == [True]
+
+
+def test_token_bucket_spends_the_burst_then_waits():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started_at = time.perf_counter()
+
+    for _ in range(6):
+        bucket.acquire()
+
+    # Two right away, then one every 50 ms
+    assert 0.18 < time.perf_counter() - started_at < 0.4
+
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_backoff_is_capped_unless_the_server_says_when():
+    fetcher = ListingsFetcher(api_key="key", backoff_base=1, backoff_cap=4)
+
+    assert all(0 <= fetcher._backoff(10) <= 4 for _ in range(100))
+    assert fetcher._backoff(10, retry_after="7") == 7
+    assert fetcher._backoff(0, retry_after="soon") <= 1
+
+
+@pytest.fixture
+def flaky_api():
+    """
+    Answers with the queued status codes, then 200 with one page.
+    """
+
+    statuses: List[int] = []
+    requests: List[float] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            requests.append(time.perf_counter())
+            status = statuses.pop(0) if statuses else 200
+            body = json.dumps({"props": [], "totalPages": 1}).encode("utf-8")
+
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f"http://127.0.0.1:{server.server_port}/searchByUrl", statuses, requests
+
+    server.shutdown()
+
+
+def fetch_first_page(url: str, max_retries: int) -> dict:
+    async def fetch() -> dict:
+        async with ListingsFetcher(
+            api_key="key",
+            requests_per_second=1000,
+            max_retries=max_retries,
+            backoff_base=0.01,
+            url=url,
+        ) as fetcher:
+            return await fetcher.get_listing_results(get_regions("summit")[0])
+
+    return asyncio.run(fetch())
+
+
+def test_retries_throttled_and_failed_requests(flaky_api):
+    url, statuses, requests = flaky_api
+    statuses.extend([429, 503, 502])
+
+    assert fetch_first_page(url, max_retries=3) == {"props": [], "totalPages": 1}
+    assert len(requests) == 4
+
+
+def test_gives_up_after_max_retries(flaky_api):
+    url, statuses, requests = flaky_api
+    statuses.extend([503] * 5)
+
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        fetch_first_page(url, max_retries=2)
+
+    assert error.value.status == 503
+    assert len(requests) == 3
+
+
+def test_client_errors_are_not_retried(flaky_api):
+    url, statuses, requests = flaky_api
+    statuses.append(403)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        fetch_first_page(url, max_retries=3)
+
+    assert len(requests) == 1
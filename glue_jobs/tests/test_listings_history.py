@@ -0,0 +1,90 @@
+import pandas as pd
+from datetime import date
+from utils.listings_history import apply_snapshot, unwritten_states
+
+
+def snapshot(rows):
+    return pd.DataFrame(rows, columns=["zpid", "content_hash", "listing_date"])
+
+
+def current(rows):
+    return pd.DataFrame(
+        rows, columns=["zpid", "content_hash", "listing_date", "valid_from"]
+    ).assign(valid_to=date(2026, 10, 10), is_current="true")
+
+
+def by_zpid(df):
+    return df.set_index("zpid").sort_index()
+
+
+def test_apply_snapshot():
+    previous = current(
+        [
+            # Unchanged, changed and gone by the next snapshot
+            (1, 10, date(2026, 9, 1), date(2026, 9, 1)),
+            (2, 20, date(2026, 9, 1), date(2026, 9, 1)),
+            (3, 30, date(2026, 9, 1), date(2026, 9, 1)),
+        ]
+    )
+    next_current, closed = apply_snapshot(
+        previous,
+        snapshot(
+            [
+                (1, 10, date(2026, 9, 1)),
+                (2, 21, date(2026, 9, 1)),
+                # New, listed before and after the last snapshot
+                (4, 40, date(2026, 9, 20)),
+                (5, 50, date(2026, 10, 12)),
+            ]
+        ),
+        snapshot_date=date(2026, 10, 13),
+        previous_date=date(2026, 10, 10),
+    )
+
+    assert by_zpid(next_current)["valid_from"].to_dict() == {
+        1: date(2026, 9, 1),
+        2: date(2026, 10, 11),
+        4: date(2026, 10, 11),
+        5: date(2026, 10, 12),
+    }
+    assert (next_current["valid_to"] == date(2026, 10, 13)).all()
+    assert (next_current["is_current"] == "true").all()
+
+    # Closed states keep the valid_to of the snapshot they were last seen in
+    assert by_zpid(closed)["content_hash"].to_dict() == {2: 20, 3: 30}
+    assert (closed["valid_to"] == date(2026, 10, 10)).all()
+    assert (closed["is_current"] == "false").all()
+
+
+def test_first_snapshot_starts_on_listing_dates():
+    next_current, closed = apply_snapshot(
+        current([]),
+        snapshot([(1, 10, date(2026, 9, 1)), (2, 20, date(2026, 10, 14))]),
+        snapshot_date=date(2026, 10, 13),
+        previous_date=None,
+    )
+
+    # Never after the snapshot itself
+    assert by_zpid(next_current)["valid_from"].to_dict() == {
+        1: date(2026, 9, 1),
+        2: date(2026, 10, 13),
+    }
+    assert closed.empty
+
+
+def test_unwritten_states():
+    closed = pd.DataFrame(
+        {
+            "zpid": [1, 2, 3],
+            "valid_from": [date(2026, 9, 1), date(2026, 9, 2), date(2026, 9, 3)],
+        }
+    )
+    # As Athena returns them
+    written = pd.DataFrame(
+        {
+            "zpid": pd.Series([1, 3], dtype="Int64"),
+            "valid_from": pd.to_datetime(["2026-09-01", "2026-09-04"]),
+        }
+    )
+
+    assert unwritten_states(closed, written)["zpid"].tolist() == [2, 3]
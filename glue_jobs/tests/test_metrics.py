@@ -0,0 +1,47 @@
+import json
+import pytest
+from utils import metrics
+from utils.metrics import instrument, record, stage
+
+
+@pytest.fixture
+def emitted(monkeypatch, capsys):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+
+    def lines():
+        return {
+            line["Stage"]: line
+            for line in map(json.loads, capsys.readouterr().out.splitlines())
+        }
+
+    return lines
+
+
+def test_nested_stages_count_bytes_once(emitted):
+    with stage("job"):
+        with stage("mid"):
+            with stage("inner"):
+                record(bytes_written=100, bytes_scanned=10)
+
+            record(bytes_written=1)
+
+    lines = emitted()
+    assert lines["inner"]["BytesWritten"] == 100
+    assert lines["mid"]["BytesWritten"] == 101
+    assert lines["job"]["BytesWritten"] == 101
+    assert lines["job"]["BytesScanned"] == 10
+
+
+def test_instrumented_calls_add_up(emitted):
+    @instrument("write")
+    def write(size):
+        record(bytes_written=size)
+
+    with stage("job"):
+        with stage("curated"):
+            write(5)
+            write(7)
+
+    lines = emitted()
+    assert lines["curated"]["BytesWritten"] == 12
+    assert lines["job"]["BytesWritten"] == 12
@@ -0,0 +1,33 @@
+import os
+from datetime import date
+from utils.page_cache import PageCache
+
+
+def test_pages_round_trip(tmp_path):
+    cache = PageCache(str(tmp_path), date(2026, 10, 12)).for_region("summit")
+
+    assert cache.pages() == []
+    assert cache.get(1) is None
+
+    pages = {2: {"props": [{"zpid": 2}], "totalPages": 10}, 10: {"props": []}}
+    for page, response in pages.items():
+        cache.put(page, response)
+
+    assert cache.pages() == [2, 10]
+    assert cache.get(2) == pages[2]
+    assert list(cache.iter_responses()) == list(pages.values())
+    assert sorted(os.listdir(cache.prefix)) == [
+        "page=0002.ndjson.gz",
+        "page=0010.ndjson.gz",
+    ]
+    assert cache.prefix.endswith("run_date=2026-10-12/region_id=summit")
+
+
+def test_regions_and_runs_are_kept_apart(tmp_path):
+    cache = PageCache(str(tmp_path), date(2026, 10, 12))
+    cache.for_region("summit").put(1, {"props": []})
+
+    assert cache.for_region("stark").pages() == []
+    assert (
+        PageCache(str(tmp_path), date(2026, 10, 13)).for_region("summit").pages() == []
+    )
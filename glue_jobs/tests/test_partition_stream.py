@@ -0,0 +1,115 @@
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from dataclasses import replace
+from datetime import date
+from utils.local_client import LocalAWSClient
+
+
+def page(start: int, rows: int = 40) -> pa.Table:
+    return pa.table(
+        {
+            "zpid": pa.array(range(start, start + rows), type=pa.int64()),
+            "city": ["Youngstown"] * rows,
+        }
+    )
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = LocalAWSClient(root=str(tmp_path))
+    client.layouts[("raw", "listings")] = replace(
+        client.get_layout(database="raw", table="listings"), target_file_rows=100
+    )
+
+    return client
+
+
+def partition_files(client: LocalAWSClient, day: date):
+    path = os.path.join(
+        client.get_dataset_path(database="raw", table="listings"),
+        f"as_of_date={day}",
+    )
+
+    return sorted(os.path.join(path, name) for name in os.listdir(path))
+
+
+def test_pages_are_buffered_into_parts(client):
+    day = date(2026, 10, 18)
+    stream = client.stream_partition(database="raw", table="listings", as_of_date=day)
+
+    for i in range(10):
+        stream.append(page(i * 40))
+
+    stream.commit()
+
+    files = partition_files(client, day)
+    assert [pq.read_metadata(path).num_rows for path in files] == [120, 120, 120, 40]
+    assert sorted(
+        pa.concat_tables(pq.read_table(path) for path in files)["zpid"].to_pylist()
+    ) == list(range(400))
+    assert not os.path.exists(
+        os.path.join(client.get_dataset_path("raw", "listings"), "_staging")
+    )
+
+
+def test_uncommitted_stream_leaves_the_partition_alone(client):
+    day = date(2026, 10, 18)
+    first = client.stream_partition(database="raw", table="listings", as_of_date=day)
+    first.append(page(0))
+    first.commit()
+
+    second = client.stream_partition(database="raw", table="listings", as_of_date=day)
+
+    for i in range(5):
+        second.append(page(1000 + i * 40))
+
+    files = partition_files(client, day)
+    assert sum(pq.read_metadata(path).num_rows for path in files) == 40
+
+    second.commit()
+
+    files = partition_files(client, day)
+    assert sum(pq.read_metadata(path).num_rows for path in files) == 200
+
+
+def test_commit_without_rows_raises(client):
+    stream = client.stream_partition(
+        database="raw", table="listings", as_of_date=date(2026, 10, 18)
+    )
+    stream.append(page(0, rows=0))
+
+    with pytest.raises(ValueError):
+        stream.commit()
+
+
+def test_aws_commit_switches_the_partition_in_one_step(fake_aws):
+    day = date(2026, 10, 18)
+    glue = fake_aws.clients["glue"]
+
+    for start in (0, 1000):
+        stream = fake_aws.stream_partition(
+            database="raw", table="listings", as_of_date=day
+        )
+
+        for i in range(3):
+            stream.append(page(start + i * 40))
+
+        # Nothing registered or replaced until commit
+        assert all("_staging" not in key for key in fake_aws.objects)
+        if start:
+            assert sorted(fake_aws.read_partition([str(day)])["zpid"]) == list(
+                range(40 * 3)
+            )
+
+        stream.commit()
+
+        location = glue.partitions[(str(day),)]
+        assert "/versions/as_of_date=2026-10-18/" in location
+        assert sorted(fake_aws.read_partition([str(day)])["zpid"]) == list(
+            range(start, start + 120)
+        )
+
+    # The first version's files are gone, only the live one is left
+    assert {key.rsplit("/", 1)[0] + "/" for key in fake_aws.objects} == {location}
@@ -0,0 +1,53 @@
+import pandas as pd
+from utils.postgres_sync import (
+    NULL_MARKER,
+    copy_sql,
+    synced_days_sql,
+    to_copy_frame,
+    to_csv,
+    upsert_sql,
+)
+
+
+def curated(cities, zip_codes):
+    return pd.DataFrame(
+        {
+            "as_of_date": "2026-10-12",
+            "city": pd.Series(cities, dtype="string"),
+            "zip_code": pd.Series(zip_codes, dtype="string"),
+            "total_listings": [3.0] * len(cities),
+            "median_listing_price": [150_000.4] + [None] * (len(cities) - 1),
+            "median_days_on_market": 12,
+            "median_price_per_square_ft": 98,
+            "avg_lot_size": 0.25,
+        }
+    )
+
+
+def test_empty_strings_and_nulls_stay_apart():
+    df = to_copy_frame(curated(["", None, "Youngstown"], ["44512", "44512", None]))
+
+    # Both would be one key under NULLS NOT DISTINCT if "" became null
+    assert len(df) == 3
+    assert to_csv(df).splitlines() == [
+        "2026-10-12,,44512,3,150000,12,98,0.25",
+        f"2026-10-12,{NULL_MARKER},44512,3,{NULL_MARKER},12,98,0.25",
+        f"2026-10-12,Youngstown,{NULL_MARKER},3,{NULL_MARKER},12,98,0.25",
+    ]
+    assert f"NULL '{NULL_MARKER}'" in copy_sql()
+
+
+def test_duplicate_keys_keep_the_last_row():
+    df = to_copy_frame(curated(["Youngstown", "Youngstown"], ["44512", "44512"]))
+
+    assert len(df) == 1
+    assert pd.isna(df["median_listing_price"].iloc[0])
+
+
+def test_upsert_updates_everything_but_the_key():
+    sql = upsert_sql()
+
+    assert "ON CONFLICT (as_of_date, city, zip_code)" in sql
+    assert "total_listings = EXCLUDED.total_listings" in sql
+    assert "city = EXCLUDED.city" not in sql
+    assert "ON CONFLICT (source, as_of_date)" in synced_days_sql()
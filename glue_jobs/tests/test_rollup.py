@@ -0,0 +1,66 @@
+from datetime import date
+from utils.rollup import (
+    GRAINS,
+    grouping_sets,
+    level_case,
+    period_days,
+    period_end,
+    period_start,
+    touched_periods,
+)
+
+
+def test_periods():
+    # A Thursday
+    day = date(2026, 10, 15)
+
+    assert period_start(day, "day") == period_end(day, "day") == day
+    assert period_start(day, "week") == date(2026, 10, 12)
+    assert period_end(day, "week") == date(2026, 10, 18)
+    assert period_start(day, "month") == date(2026, 10, 1)
+    assert period_end(day, "month") == date(2026, 10, 31)
+    assert period_end(date(2028, 2, 3), "month") == date(2028, 2, 29)
+
+
+def test_touched_periods():
+    assert touched_periods([date(2026, 10, 1), date(2026, 10, 2)]) == {
+        ("day", date(2026, 10, 1)),
+        ("day", date(2026, 10, 2)),
+        ("week", date(2026, 9, 28)),
+        ("month", date(2026, 10, 1)),
+    }
+
+
+def test_period_days_scan_whole_weeks_and_months():
+    available = {
+        date(2026, 9, 28),
+        date(2026, 9, 30),
+        date(2026, 10, 1),
+        date(2026, 10, 20),
+        date(2026, 11, 1),
+    }
+
+    # 9/28 for the week, 10/20 for the month, not 11/1
+    assert period_days([date(2026, 10, 1)], available) == [
+        date(2026, 9, 28),
+        date(2026, 9, 30),
+        date(2026, 10, 1),
+        date(2026, 10, 20),
+    ]
+
+
+def test_grouping_sets():
+    sets = grouping_sets().split(",\n")
+
+    assert len(sets) == len(GRAINS) * 4 * 3
+    assert "(day_start)" in sets
+    assert "(month_start, region_id, city, zip_code, bedrooms_bucket)" in sets
+
+
+def test_level_case_checks_the_most_specific_level_first():
+    assert level_case(
+        {"market": [], "region": ["region_id"], "city": ["region_id", "city"]}, "market"
+    ) == (
+        "CASE WHEN GROUPING(city) = 0 THEN 'city' "
+        "WHEN GROUPING(region_id) = 0 THEN 'region' ELSE 'market' END"
+    )
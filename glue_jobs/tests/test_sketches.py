@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from datetime import date
+from utils.local_client import LocalAWSClient
+from utils.sketches import (
+    SKETCH_DTYPES,
+    SKETCH_TABLE,
+    merged_sketches_query,
+    sketches_query,
+    value_filter,
+)
+
+
+DAYS = [date(2026, 10, 5), date(2026, 10, 6)]
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = LocalAWSClient(root=str(tmp_path))
+    staged_df = pd.DataFrame(
+        {
+            "zpid": [1, 2, 3, 1, 2, 3],
+            "city": ["Youngstown", "Youngstown", "O'Hara"] * 2,
+            "zip_code": ["44512", "44512", None] * 2,
+            "price": [100_000, 300_000, 50_000] * 2,
+            "living_area": [1_000, 1_500, 500] * 2,
+            "lot_area_value": [43_560.0, 21_780.0, None] * 2,
+            "listing_date": [date(2026, 10, 1)] * 6,
+            "as_of_date": [DAYS[0]] * 3 + [DAYS[1]] * 3,
+        }
+    )
+    client.upload_dataframe(df=staged_df, database="staged", table="listings")
+    client.upload_dataframe(
+        df=client.read_query(sql=sketches_query(DAYS), database="staged"),
+        database="curated",
+        table=SKETCH_TABLE,
+        dtype=SKETCH_DTYPES,
+    )
+
+    return client
+
+
+def test_merges_the_filtered_cells(client):
+    merged_df = client.read_query(
+        sql=merged_sketches_query(
+            ["city"], DAYS[0], DAYS[1], filters={"city": ["Youngstown"]}
+        ),
+        database="curated",
+    )
+
+    assert merged_df["city"].tolist() == ["Youngstown"]
+    assert merged_df["total_listings"].tolist() == [2]
+    assert merged_df["listing_days"].tolist() == [4]
+    assert merged_df["median_listing_price"].tolist() == [200_000]
+
+
+def test_filter_values_are_quoted(client):
+    merged_df = client.read_query(
+        sql=merged_sketches_query(
+            [], DAYS[0], DAYS[1], filters={"city": ["O'Hara"], "zip_code": [None]}
+        ),
+        database="curated",
+    )
+
+    assert merged_df["listing_days"].tolist() == [2]
+
+
+def test_rejects_unknown_columns():
+    with pytest.raises(ValueError):
+        value_filter("TRUE) OR (1 = 1", ["x"])
+
+    with pytest.raises(ValueError):
+        merged_sketches_query(["price"], DAYS[0], DAYS[1])
+
+    assert value_filter("city", []) == "(FALSE)"
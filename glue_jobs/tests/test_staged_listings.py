@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date, timedelta
+from typing import List, Optional
+from utils.staged_listings import duplicate_listings
+
+
+def per_day_listings(
+    df: pd.DataFrame, as_of_dates: Optional[List[date]] = None
+) -> pd.DataFrame:
+    """
+    The per-day loop duplicate_listings replaced: a copy of the frame for
+    every target day, keeping the listings active on it.
+    """
+
+    if as_of_dates is None:
+        days = pd.date_range(start=df["listing_date"].min(), end=date.today())
+    else:
+        days = pd.to_datetime(sorted(set(as_of_dates)))
+
+    dfs: List[pd.DataFrame] = []
+
+    for day in days:
+        _tmp_df = df.copy()
+        _tmp_df["as_of_date"] = day
+        _tmp_df = _tmp_df[pd.to_datetime(_tmp_df["listing_date"]) <= day]
+        dfs.append(_tmp_df)
+
+    return pd.concat(dfs)
+
+
+def synthetic_listings(count: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days_on_market = rng.integers(0, 60, count)
+
+    df = pd.DataFrame(
+        {
+            "zpid": np.arange(count),
+            "price": rng.integers(50_000, 500_000, count),
+            "listing_date": [
+                date.today() - timedelta(days=int(days)) for days in days_on_market
+            ],
+        }
+    )
+
+    # A shuffled, non-default index, like a frame filtered out of a bigger one
+    return df.set_index(rng.permutation(np.arange(100, 100 + 3 * count, 3)))
+
+
+def assert_same_expansion(actual: pd.DataFrame, expected: pd.DataFrame) -> None:
+    pd.testing.assert_frame_equal(
+        actual.assign(as_of_date=pd.to_datetime(actual["as_of_date"])),
+        expected.assign(as_of_date=pd.to_datetime(expected["as_of_date"])),
+        check_dtype=False,
+    )
+
+
+def test_matches_per_day_loop_through_today():
+    df = synthetic_listings(500)
+
+    assert_same_expansion(duplicate_listings(df), per_day_listings(df))
+
+
+def test_matches_per_day_loop_for_target_days():
+    df = synthetic_listings(500, seed=1)
+    # Unsorted with a duplicate, and most listings start after the last one
+    as_of_dates = [date.today() - timedelta(days=days) for days in (30, 45, 40, 45)]
+
+    expected = per_day_listings(df, as_of_dates)
+
+    assert (pd.to_datetime(df["listing_date"]) > pd.Timestamp(max(as_of_dates))).any()
+    assert_same_expansion(duplicate_listings(df, as_of_dates), expected)
+
+
+def test_listings_after_every_target_day_are_dropped():
+    df = synthetic_listings(50, seed=2).assign(listing_date=date.today())
+
+    expanded = duplicate_listings(df, [date.today() - timedelta(days=1)])
+
+    assert expanded.empty
+    assert "as_of_date" in expanded.columns
+
+
+@pytest.mark.parametrize("as_of_dates", [None, [date.today()]])
+def test_empty_input(as_of_dates):
+    df = synthetic_listings(10).iloc[0:0]
+
+    expanded = duplicate_listings(df, as_of_dates)
+
+    assert expanded.empty
+    assert list(expanded.columns) == list(df.columns) + ["as_of_date"]
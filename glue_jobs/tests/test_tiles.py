@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from utils.local_client import LocalAWSClient
+from utils.tiles import (
+    quadkey_filter,
+    quadkey_sql,
+    quadkey_strings,
+    quadkeys,
+    tiles_in_radius,
+)
+
+
+def test_quadkey_digits():
+    # The example from Bing's tile system docs
+    assert quadkey_strings(np.array([3]), np.array([5]), 3).tolist() == ["213"]
+
+
+def test_quadkeys_match_bing_tile_at(tmp_path):
+    client = LocalAWSClient(root=str(tmp_path))
+    rng = np.random.default_rng(0)
+    points = pd.DataFrame(
+        {
+            "latitude": np.concatenate(
+                [rng.uniform(40.9, 41.3, 200), [85.05, -85.05, 0.0]]
+            ),
+            "longitude": np.concatenate(
+                [rng.uniform(-80.9, -80.5, 200), [179.99, -180.0, 0.0]]
+            ),
+        }
+    )
+
+    client.connection.register("points", points.reset_index())
+    sql_keys = client.connection.execute(
+        f"SELECT {quadkey_sql()} AS quadkey FROM points ORDER BY index"
+    ).fetchdf()["quadkey"]
+
+    assert quadkeys(points["latitude"], points["longitude"]).equals(sql_keys)
+
+
+def test_missing_and_off_map_points_have_no_quadkey():
+    latitude = pd.Series([41.1, None, 89.0, 41.1])
+    longitude = pd.Series([-80.6, -80.6, -80.6, 181.0])
+
+    keys = quadkeys(latitude, longitude)
+
+    assert len(keys[0]) == 18
+    assert keys[1:].isna().all()
+
+
+def test_radius_tiles_cover_the_circle():
+    latitude, longitude = 41.1, -80.65
+    keys = tiles_in_radius(latitude, longitude, radius_miles=1, zoom=14)
+
+    # Points half a mile out in every direction land in the tiles
+    offset = 0.5 / 69
+    around = quadkeys(
+        pd.Series([latitude, latitude + offset, latitude - offset, latitude]),
+        pd.Series([longitude, longitude, longitude, longitude + offset]),
+        zoom=14,
+    ).tolist()
+    assert set(around) <= set(keys)
+
+    # And a point 5 miles away doesn't
+    far = quadkeys(pd.Series([latitude + 5 / 69]), pd.Series([longitude]), 14)
+    assert far[0] not in keys
+
+
+def test_quadkey_filter():
+    assert quadkey_filter(["0231"], "q") == "((q >= '0231' AND q < '02314'))"
+    assert quadkey_filter([]) == "(FALSE)"
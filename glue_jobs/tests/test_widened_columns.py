@@ -0,0 +1,81 @@
+import awswrangler as wr
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+from datetime import date
+from utils.listings_schema import WIDENED_COLUMNS, listings_to_table
+from utils.local_client import LocalAWSClient
+from utils.staged_listings import raw_listings_query
+from utils.synthetic_listings import generate_listings
+
+
+def test_upload_widens_integer_columns(fake_aws):
+    glue = fake_aws.clients["glue"]
+    glue.columns = {"zpid": "bigint", "bathrooms": "bigint", "city": "string"}
+    df = pd.DataFrame(
+        {
+            "zpid": [1],
+            "bathrooms": [2.5],
+            "city": ["Youngstown"],
+            "as_of_date": [date(2026, 10, 12)],
+        }
+    )
+
+    fake_aws.upload_dataframe(
+        df=df, database="raw", table="listings", dtype={"bathrooms": "double"}
+    )
+
+    assert glue.columns["bathrooms"] == "double"
+    assert fake_aws.read_partition(["2026-10-12"])["bathrooms"].tolist() == [2.5]
+
+    # Any other type change still fails
+    with pytest.raises(wr.exceptions.InvalidArgumentValue):
+        fake_aws.upload_dataframe(
+            df=df.assign(city=[1]), database="raw", table="listings"
+        )
+
+
+def test_stream_widens_integer_columns(fake_aws):
+    glue = fake_aws.clients["glue"]
+    glue.columns = {"bathrooms": "bigint"}
+
+    partition = fake_aws.stream_partition(
+        database="raw", table="listings", as_of_date=date(2026, 10, 12)
+    )
+    partition.append(listings_to_table(generate_listings(3)))
+    partition.commit()
+
+    assert glue.columns["bathrooms"] == "double"
+
+
+def test_staged_reads_raw_days_written_as_integers(tmp_path):
+    client = LocalAWSClient(root=str(tmp_path))
+    table = listings_to_table(generate_listings(4), region_id="r1")
+    old_table = table
+
+    for column in WIDENED_COLUMNS:
+        old_table = old_table.set_column(
+            old_table.schema.get_field_index(column),
+            column,
+            pc.cast(pc.round(old_table[column]), pa.int64()),
+        )
+
+    for day, raw_table in (
+        (date(2026, 10, 11), old_table),
+        (date(2026, 10, 12), table),
+    ):
+        client.upload_dataframe(
+            df=raw_table.to_pandas().assign(as_of_date=day),
+            database="raw",
+            table="listings",
+        )
+
+    raw_df = client.read_query(
+        sql=raw_listings_query([date(2026, 10, 11), date(2026, 10, 12)]),
+        database="raw",
+    )
+
+    assert len(raw_df) == 8
+    for column in ("bathrooms", "lot_area_value", "tax_assessed_value"):
+        assert pd.api.types.is_float_dtype(raw_df[column])
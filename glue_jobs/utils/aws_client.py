@@ -1,26 +1,47 @@
 import awswrangler as wr
 import boto3
+import io
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import uuid
 from awswrangler import _utils
+from awswrangler.catalog._definitions import _update_table_definition
 from awswrangler.typing import _S3WriteDataReturnValue
-from typing import List, Literal, Union
-
-
-DATABASE = Union[Literal["raw"], Literal["staged"], Literal["curated"]]
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
+from utils.base_client import (
+    DATABASE,
+    RESULT_MODE,
+    WRITE_MODE,
+    BaseClient,
+    PartitionFiles,
+    PartitionWriter,
+)
+from utils.compaction import concat_tables_by_name, frame_partition_paths
+from utils.iceberg import ICEBERG_PARTITIONING, iceberg_dates_query
+from utils.listings_schema import athena_types
+from utils.metrics import instrument, record
+from utils.projection import projection_parameters
 
 
 REGION = os.environ.get("REGION")
 
 
-class AWSClient:
+class AWSClient(BaseClient):
     def __init__(self) -> None:
+        super().__init__()
         self.session = boto3.Session(region_name=REGION)
         self.account_id = wr.sts.get_account_id(boto3_session=self.session)
         self.clients = {
             "glue": _utils.client(service_name="glue", session=self.session)
         }
 
+    def get_dataset_path(self, database: DATABASE, table: str) -> str:
+        return f"s3://{self.account_id}-ytown-listings-{database}/{table}"
+
+    @instrument("list_partitions", rows_out=len)
     def get_partitions(self, database: DATABASE, table: str) -> List[str]:
         try:
             partitions_dict = wr.catalog.get_parquet_partitions(
@@ -42,30 +63,706 @@ class AWSClient:
     def get_secret(self, secret_name: str) -> Union[str, bytes]:
         return wr.secretsmanager.get_secret(secret_name, self.session)
 
-    def read_query(self, sql: str, database: DATABASE) -> pd.DataFrame:
-        return wr.athena.read_sql_query(
+    @instrument("read_query")
+    def read_query(
+        self,
+        sql: str,
+        database: DATABASE,
+        result_mode: RESULT_MODE = "ctas",
+        chunksize: Optional[int] = None,
+    ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        Runs a query in the project workgroup, reading the CSV result, a temporary
+        CTAS table or an UNLOAD. With a chunksize, returns an iterator of frames.
+        """
+
+        result = wr.athena.read_sql_query(
+            sql=sql,
+            database=f"ytown_listings_{database}_db",
+            ctas_approach=result_mode == "ctas",
+            unload_approach=result_mode == "unload",
+            s3_output=(
+                None
+                if result_mode == "csv"
+                else f"s3://{self.account_id}-ytown-listings-athena/listings/temp_tables/"
+            ),
+            chunksize=chunksize,
+            keep_files=False,
+            workgroup="ytown_listings_workgroup",
+            boto3_session=self.session,
+        )
+
+        # Only whole frames carry the query's metadata
+        query_metadata = getattr(result, "query_metadata", None)
+
+        if query_metadata is not None:
+            statistics = query_metadata.get("Statistics", {})
+            record(bytes_scanned=statistics.get("DataScannedInBytes", 0))
+
+        return result
+
+    @instrument("execute_query")
+    def execute_query(self, sql: str, database: DATABASE) -> Dict[str, Any]:
+        """
+        Runs a statement that doesn't return rows (e.g. INSERT INTO) and waits
+        for it to finish. Raises if the query fails.
+        """
+
+        query_execution = wr.athena.start_query_execution(
             sql=sql,
             database=f"ytown_listings_{database}_db",
             workgroup="ytown_listings_workgroup",
+            wait=True,
             boto3_session=self.session,
         )
 
+        statistics = query_execution.get("Statistics", {})
+        record(bytes_scanned=statistics.get("DataScannedInBytes", 0))
+
+        return query_execution
+
+    @instrument("write")
     def upload_dataframe(
         self,
         df: pd.DataFrame,
         database: DATABASE,
         table: str,
+        concurrent_partitioning: bool = False,
+        dtype: Optional[Dict[str, str]] = None,
+        mode: WRITE_MODE = "overwrite_partitions",
+        partition_cols: Optional[List[str]] = None,
     ) -> _S3WriteDataReturnValue:
-        return wr.s3.to_parquet(
-            df=df,
-            path=f"s3://{self.account_id}-ytown-listings-{database}/{table}",
+        """
+        Writes the frame's partitions in one dataset operation, sorted and laid out
+        per utils.layouts. `dtype` pins Athena column types.
+        """
+
+        self.invalidate_partitions(database=database, table=table)
+
+        partition_cols = partition_cols or ["as_of_date"]
+
+        # awswrangler writes to the key=value paths, so partitions compaction
+        # moved under versions/ are moved back before they're written to
+        if (database, table) not in self.projected_tables:
+            self.restore_partition_locations(
+                database=database,
+                table=table,
+                partition_paths=frame_partition_paths(df, partition_cols),
+            )
+
+        self.widen_columns(
+            database=database,
+            table=table,
+            columns_types=wr.catalog.extract_athena_types(
+                df=df, index=False, partition_cols=partition_cols, dtype=dtype
+            )[0],
+        )
+
+        layout = self.get_layout(database=database, table=table)
+
+        result = wr.s3.to_parquet(
+            df=layout.sort_frame(df),
+            path=self.get_dataset_path(database=database, table=table),
             index=False,
-            compression="snappy",
+            compression=layout.compression,
+            max_rows_by_file=layout.target_file_rows or None,
+            pyarrow_additional_kwargs=layout.wrangler_options(),
             dataset=True,
-            mode="overwrite_partitions",
+            mode=mode,
+            schema_evolution=True,
+            database=f"ytown_listings_{database}_db",
+            table=table,
+            partition_cols=partition_cols,
+            dtype=dtype,
+            concurrent_partitioning=concurrent_partitioning,
+            use_threads=True,
+            glue_table_settings={
+                "regular_partitions": (database, table) not in self.projected_tables
+            },
+            boto3_session=self.session,
+        )
+
+        if (database, table) in self.projected_tables:
+            self.apply_partition_projection(database=database, table=table)
+
+        record(
+            bytes_written=sum(
+                size or 0
+                for size in wr.s3.size_objects(
+                    path=result["paths"], use_threads=True, boto3_session=self.session
+                ).values()
+            )
+        )
+
+        return result
+
+    @instrument("merge")
+    def merge_dataframe(
+        self,
+        df: pd.DataFrame,
+        database: DATABASE,
+        table: str,
+        merge_cols: List[str],
+        dtype: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        One MERGE INTO from a temporary Parquet table, under a {table}_iceberg/
+        prefix.
+        """
+
+        self.invalidate_partitions(database=database, table=table)
+        self.widen_columns(
+            database=database,
+            table=table,
+            columns_types=wr.catalog.extract_athena_types(df=df, dtype=dtype)[0],
+        )
+
+        wr.athena.to_iceberg(
+            df=df,
+            database=f"ytown_listings_{database}_db",
+            table=table,
+            temp_path=f"s3://{self.account_id}-ytown-listings-athena/listings/temp_tables/{table}_{uuid.uuid4().hex}/",
+            table_location=f"{self.get_dataset_path(database, table)}_iceberg/",
+            partition_cols=ICEBERG_PARTITIONING,
+            merge_cols=merge_cols,
+            keep_files=False,
+            workgroup="ytown_listings_workgroup",
+            dtype=dtype,
             schema_evolution=True,
+            boto3_session=self.session,
+        )
+
+    @instrument("list_partitions", rows_out=len)
+    def get_iceberg_partitions(self, database: DATABASE, table: str) -> List[str]:
+        if not wr.catalog.does_table_exist(
             database=f"ytown_listings_{database}_db",
             table=table,
-            partition_cols=["as_of_date"],
             boto3_session=self.session,
+        ):
+            return []
+
+        return (
+            self.read_query(
+                sql=iceberg_dates_query(table), database=database, result_mode="csv"
+            )["as_of_date"]
+            .astype(str)
+            .tolist()
+        )
+
+    @instrument("list_partitions", rows_out=len)
+    def get_projected_partitions(self, database: DATABASE, table: str) -> List[str]:
+        """
+        The as_of_date values with a folder under the dataset, found with one
+        delimited S3 listing instead of paging through catalog partitions.
+        """
+
+        bucket, prefix = self.get_dataset_path(database, table)[5:].split("/", 1)
+        paginator = self.session.client("s3").get_paginator("list_objects_v2")
+        partition_values: List[str] = []
+
+        for page in paginator.paginate(
+            Bucket=bucket, Prefix=f"{prefix}/as_of_date=", Delimiter="/"
+        ):
+            for common_prefix in page.get("CommonPrefixes", []):
+                folder = common_prefix["Prefix"].rstrip("/").rsplit("/", 1)[1]
+                partition_values.append(folder.split("=", 1)[1])
+
+        return partition_values
+
+    def apply_partition_projection(self, database: DATABASE, table: str) -> None:
+        """
+        Runs after every write, since awswrangler resets projection.enabled when it
+        updates a table.
+        """
+
+        glue = self.clients["glue"]
+        glue_database = f"ytown_listings_{database}_db"
+        dataset_path = self.get_dataset_path(database, table)
+
+        catalog_table = glue.get_table(DatabaseName=glue_database, Name=table)["Table"]
+        current_parameters = catalog_table.get("Parameters", {})
+        parameters = {
+            **current_parameters,
+            **projection_parameters(database, dataset_path, self.projection_start),
+        }
+
+        if parameters == current_parameters:
+            return
+
+        if current_parameters.get("projection.enabled") != "true":
+            self.restore_partition_locations(database=database, table=table)
+
+        glue.update_table(
+            DatabaseName=glue_database,
+            TableInput={
+                **{
+                    key: catalog_table[key]
+                    for key in (
+                        "Name",
+                        "Description",
+                        "Owner",
+                        "Retention",
+                        "StorageDescriptor",
+                        "PartitionKeys",
+                        "TableType",
+                    )
+                    if key in catalog_table
+                },
+                "Parameters": parameters,
+            },
+        )
+
+    def restore_partition_locations(
+        self,
+        database: DATABASE,
+        table: str,
+        partition_paths: Optional[Set[str]] = None,
+    ) -> None:
+        """
+        Moves compacted partitions from versions/ back to their key=value paths, all
+        of them or only `partition_paths`.
+        """
+
+        glue = self.clients["glue"]
+        glue_database = f"ytown_listings_{database}_db"
+        dataset_path = self.get_dataset_path(database, table)
+
+        try:
+            catalog_table = glue.get_table(DatabaseName=glue_database, Name=table)[
+                "Table"
+            ]
+        except glue.exceptions.EntityNotFoundException:
+            return
+
+        partition_keys = [key["Name"] for key in catalog_table["PartitionKeys"]]
+        locations = wr.catalog.get_partitions(
+            database=glue_database, table=table, boto3_session=self.session
+        )
+
+        for location, values in locations.items():
+            partition_path = "/".join(
+                f"{key}={value}" for key, value in zip(partition_keys, values)
+            )
+            template_location = f"{dataset_path}/{partition_path}/"
+
+            if location.rstrip("/") == template_location.rstrip("/"):
+                continue
+
+            if partition_paths is not None and partition_path not in partition_paths:
+                continue
+
+            paths = wr.s3.list_objects(path=location, boto3_session=self.session)
+            wr.s3.delete_objects(path=template_location, boto3_session=self.session)
+            wr.s3.copy_objects(
+                paths=paths,
+                source_path=location,
+                target_path=template_location,
+                boto3_session=self.session,
+            )
+            self.set_partition_location(
+                database=database,
+                table=table,
+                values=values,
+                location=template_location,
+            )
+            wr.s3.delete_objects(path=paths, boto3_session=self.session)
+
+    def set_partition_location(
+        self, database: DATABASE, table: str, values: List[str], location: str
+    ) -> Optional[str]:
+        """
+        Points an existing catalog partition at another location in one
+        UpdatePartition call. Returns the old location, or None if there's no
+        such partition.
+        """
+
+        glue = self.clients["glue"]
+        glue_database = f"ytown_listings_{database}_db"
+
+        try:
+            partition = glue.get_partition(
+                DatabaseName=glue_database, TableName=table, PartitionValues=values
+            )["Partition"]
+        except glue.exceptions.EntityNotFoundException:
+            return None
+
+        glue.update_partition(
+            DatabaseName=glue_database,
+            TableName=table,
+            PartitionValueList=values,
+            PartitionInput={
+                "Values": partition["Values"],
+                "StorageDescriptor": {
+                    **partition["StorageDescriptor"],
+                    "Location": location,
+                },
+                "Parameters": partition.get("Parameters", {}),
+            },
+        )
+        self.invalidate_partitions(database=database, table=table)
+
+        return partition["StorageDescriptor"]["Location"]
+
+    def stream_partition(
+        self, database: DATABASE, table: str, as_of_date: date
+    ) -> "PartitionStream":
+        return PartitionStream(
+            aws_client=self, database=database, table=table, as_of_date=as_of_date
+        )
+
+    def list_dataset_files(
+        self, database: DATABASE, table: str
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        One listing of the whole dataset, as folder -> {path: size} for the
+        Parquet files in each folder.
+        """
+
+        bucket, prefix = self.get_dataset_path(database, table)[5:].split("/", 1)
+        folders: Dict[str, Dict[str, int]] = {}
+        paginator = self.session.client("s3").get_paginator("list_objects_v2")
+
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/"):
+            for item in page.get("Contents", []):
+                path = f"s3://{bucket}/{item['Key']}"
+
+                if path.endswith(".parquet"):
+                    folder = path.rsplit("/", 1)[0]
+                    folders.setdefault(folder, {})[path] = item["Size"]
+
+        return folders
+
+    @instrument("list_files", rows_out=len)
+    def list_partition_files(
+        self, database: DATABASE, table: str
+    ) -> List[PartitionFiles]:
+        folders = self.list_dataset_files(database=database, table=table)
+
+        # Projected partitions only exist as the folders the template points to
+        if (database, table) in self.projected_tables:
+            dataset_path = self.get_dataset_path(database, table)
+
+            return [
+                PartitionFiles(
+                    values={"as_of_date": folder.rsplit("=", 1)[1]},
+                    location=f"{folder}/",
+                    files=files,
+                )
+                for folder, files in sorted(folders.items())
+                if folder.startswith(f"{dataset_path}/as_of_date=")
+                and "/" not in folder[len(dataset_path) + 1 :]
+            ]
+
+        glue = self.clients["glue"]
+        glue_database = f"ytown_listings_{database}_db"
+
+        partition_keys = [
+            key["Name"]
+            for key in glue.get_table(DatabaseName=glue_database, Name=table)["Table"][
+                "PartitionKeys"
+            ]
+        ]
+        locations = wr.catalog.get_partitions(
+            database=glue_database, table=table, boto3_session=self.session
+        )
+
+        return [
+            PartitionFiles(
+                values=dict(zip(partition_keys, values)),
+                location=location,
+                files=folders.get(location.rstrip("/"), {}),
+            )
+            for location, values in locations.items()
+        ]
+
+    @instrument("read_files")
+    def read_files(self, paths: List[str]) -> pa.Table:
+        tables: List[pa.Table] = []
+
+        for path in paths:
+            buffer = io.BytesIO()
+            wr.s3.download(path=path, local_file=buffer, boto3_session=self.session)
+            buffer.seek(0)
+            tables.append(pq.read_table(buffer))
+
+        return concat_tables_by_name(tables)
+
+    @instrument("replace_partition")
+    def replace_partition(
+        self,
+        database: DATABASE,
+        table: str,
+        values: Dict[str, str],
+        tables: List[pa.Table],
+        columns_types: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Writes to a fresh versions/ prefix and points the catalog partition at it.
+        Projected tables are replaced in place, so a query in between can see both.
+        """
+
+        glue_database = f"ytown_listings_{database}_db"
+        layout = self.get_layout(database=database, table=table)
+        version = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        partition_path = "/".join(f"{key}={value}" for key, value in values.items())
+        dataset_path = self.get_dataset_path(database, table)
+        projected = (database, table) in self.projected_tables
+
+        if projected:
+            location = f"{dataset_path}/{partition_path}/"
+            old_paths = wr.s3.list_objects(path=location, boto3_session=self.session)
+        else:
+            location = f"{dataset_path}/versions/{partition_path}/{version}/"
+
+        for i, part in enumerate(tables):
+            buffer = io.BytesIO()
+            pq.write_table(
+                part,
+                buffer,
+                compression=layout.compression,
+                row_group_size=layout.row_group_rows or None,
+                **layout.writer_options(),
+            )
+            record(rows_in=part.num_rows, bytes_written=buffer.getbuffer().nbytes)
+            buffer.seek(0)
+
+            wr.s3.upload(
+                local_file=buffer,
+                path=f"{location}part-{version}-{i:05d}{layout.extension}",
+                boto3_session=self.session,
+            )
+
+        self.invalidate_partitions(database=database, table=table)
+
+        if projected:
+            wr.s3.delete_objects(path=old_paths, boto3_session=self.session)
+            return
+
+        old_location = self.set_partition_location(
+            database=database,
+            table=table,
+            values=list(values.values()),
+            location=location,
+        )
+
+        if old_location is not None:
+            wr.s3.delete_objects(
+                path=f"{old_location.rstrip('/')}/", boto3_session=self.session
+            )
+            return
+
+        if columns_types is not None:
+            wr.catalog.create_parquet_table(
+                database=glue_database,
+                table=table,
+                path=self.get_dataset_path(database, table),
+                columns_types=columns_types,
+                partitions_types={key: "string" for key in values},
+                compression=layout.compression,
+                mode="append",
+                boto3_session=self.session,
+            )
+
+        wr.catalog.add_parquet_partitions(
+            database=glue_database,
+            table=table,
+            partitions_values={location: list(values.values())},
+            compression=layout.compression,
+            columns_types=columns_types,
+            boto3_session=self.session,
+        )
+
+    def add_columns(
+        self, database: DATABASE, table: str, columns_types: Dict[str, str]
+    ) -> None:
+        glue_database = f"ytown_listings_{database}_db"
+        table_types = wr.catalog.get_table_types(
+            database=glue_database,
+            table=table,
+            filter_iceberg_current=(database, table) in self.iceberg_tables,
+            boto3_session=self.session,
+        )
+
+        if table_types is None:
+            return
+
+        missing_columns = {
+            column: column_type
+            for column, column_type in columns_types.items()
+            if column not in table_types
+        }
+
+        # Iceberg keeps its schema in the table metadata, so Athena has to
+        # change it rather than the catalog
+        if missing_columns and (database, table) in self.iceberg_tables:
+            columns = ", ".join(
+                f"{column} {column_type}"
+                for column, column_type in missing_columns.items()
+            )
+            self.execute_query(
+                sql=f"ALTER TABLE {table} ADD COLUMNS ({columns})", database=database
+            )
+            return
+
+        for column, column_type in missing_columns.items():
+            wr.catalog.add_column(
+                database=glue_database,
+                table=table,
+                column_name=column,
+                column_type=column_type,
+                boto3_session=self.session,
+            )
+
+    def widen_columns(
+        self, database: DATABASE, table: str, columns_types: Dict[str, str]
+    ) -> None:
+        glue = self.clients["glue"]
+        glue_database = f"ytown_listings_{database}_db"
+
+        try:
+            table_input = _update_table_definition(
+                glue.get_table(DatabaseName=glue_database, Name=table)
+            )
+        except glue.exceptions.EntityNotFoundException:
+            return
+
+        # Partitions keep the types their files were written with, so Athena
+        # still reads older files as integers
+        widened_columns = [
+            column
+            for column in table_input["StorageDescriptor"]["Columns"]
+            if columns_types.get(column["Name"]) == "double"
+            and column["Type"] in ("tinyint", "smallint", "int", "bigint")
+        ]
+
+        if not widened_columns:
+            return
+
+        # Iceberg can't promote a bigint to a double
+        if (database, table) in self.iceberg_tables:
+            raise ValueError(
+                f"{database}.{table} has {[c['Name'] for c in widened_columns]} as "
+                "integers, rebuild the Iceberg table to store them as doubles"
+            )
+
+        for column in widened_columns:
+            column["Type"] = "double"
+
+        glue.update_table(DatabaseName=glue_database, TableInput=table_input)
+
+
+class PartitionStream(PartitionWriter):
+    """
+    Parts go to a fresh versions/ prefix and commit() swaps the catalog
+    partition to it. Projected tables get the parts copied in place instead.
+    """
+
+    def __init__(
+        self, aws_client: AWSClient, database: DATABASE, table: str, as_of_date: date
+    ) -> None:
+        dataset_path = aws_client.get_dataset_path(database=database, table=table)
+        self.layout = aws_client.get_layout(database=database, table=table)
+
+        super().__init__(
+            partition_path=f"{dataset_path}/as_of_date={as_of_date}/",
+            part_rows=self.layout.target_file_rows,
+        )
+
+        self.aws_client = aws_client
+        self.database = database
+        self.table = table
+        self.as_of_date = as_of_date
+        self.dataset_path = dataset_path
+        self.version = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.projected = (database, table) in aws_client.projected_tables
+        # Athena skips prefixes that start with an underscore
+        self.location = (
+            f"{dataset_path}/_staging/as_of_date={as_of_date}/{self.version}/"
+            if self.projected
+            else f"{dataset_path}/versions/as_of_date={as_of_date}/{self.version}/"
+        )
+
+        self.columns_types: Dict[str, str] = {}
+        self.paths: List[str] = []
+
+    @instrument("write")
+    def write_part(self, table: pa.Table, index: int) -> None:
+        for column, column_type in athena_types(table.schema).items():
+            self.columns_types.setdefault(column, column_type)
+
+        buffer = io.BytesIO()
+        pq.write_table(
+            self.layout.sort_table(table),
+            buffer,
+            compression=self.layout.compression,
+            row_group_size=self.layout.row_group_rows or None,
+            **self.layout.writer_options(),
+        )
+        buffer.seek(0)
+        record(bytes_written=buffer.getbuffer().nbytes)
+
+        path = f"{self.location}part-{self.version}-{index:05d}{self.layout.extension}"
+        wr.s3.upload(
+            local_file=buffer, path=path, boto3_session=self.aws_client.session
+        )
+        self.paths.append(path)
+
+    def swap_in(self) -> None:
+        session = self.aws_client.session
+        database = f"ytown_listings_{self.database}_db"
+
+        self.aws_client.widen_columns(
+            database=self.database, table=self.table, columns_types=self.columns_types
+        )
+
+        # Adds any new columns to the table, creating it on the first run
+        wr.catalog.create_parquet_table(
+            database=database,
+            table=self.table,
+            path=self.dataset_path,
+            columns_types=self.columns_types,
+            partitions_types={"as_of_date": "date"},
+            compression=self.layout.compression,
+            mode="append",
+            boto3_session=session,
+        )
+
+        self.aws_client.invalidate_partitions(database=self.database, table=self.table)
+
+        if self.projected:
+            old_paths = wr.s3.list_objects(
+                path=self.partition_path, boto3_session=session
+            )
+            wr.s3.copy_objects(
+                paths=self.paths,
+                source_path=self.location,
+                target_path=self.partition_path,
+                boto3_session=session,
+            )
+            wr.s3.delete_objects(path=old_paths + self.paths, boto3_session=session)
+            self.aws_client.apply_partition_projection(
+                database=self.database, table=self.table
+            )
+            return
+
+        old_location = self.aws_client.set_partition_location(
+            database=self.database,
+            table=self.table,
+            values=[str(self.as_of_date)],
+            location=self.location,
+        )
+
+        if old_location is not None:
+            wr.s3.delete_objects(
+                path=f"{old_location.rstrip('/')}/", boto3_session=session
+            )
+            return
+
+        wr.catalog.add_parquet_partitions(
+            database=database,
+            table=self.table,
+            partitions_values={self.location: [str(self.as_of_date)]},
+            compression=self.layout.compression,
+            columns_types=self.columns_types,
+            boto3_session=session,
         )
@@ -0,0 +1,276 @@
+import pandas as pd
+import pyarrow as pa
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterator, List, Literal, Optional, Set, Tuple, Union
+from utils.iceberg import MERGE_COLS
+from utils.layouts import DEFAULT_LAYOUT, LAYOUTS, Layout
+from utils.metrics import instrument
+from utils.projection import PROJECTED_TABLES, PROJECTION_START
+
+
+DATABASE = Union[Literal["raw"], Literal["staged"], Literal["curated"]]
+RESULT_MODE = Union[Literal["csv"], Literal["ctas"], Literal["unload"]]
+WRITE_MODE = Union[Literal["append"], Literal["overwrite_partitions"]]
+
+
+@dataclass
+class PartitionFiles:
+    """
+    The data files behind one catalog partition.
+    """
+
+    # Partition key -> value
+    values: Dict[str, str]
+    location: str
+    # Path -> size in bytes
+    files: Dict[str, int]
+
+    @property
+    def size(self) -> int:
+        return sum(self.files.values())
+
+
+class PartitionWriter(ABC):
+    """
+    Builds one partition a table at a time, in parts of at least part_rows rows.
+    Nothing is visible to readers until commit().
+    """
+
+    def __init__(self, partition_path: str, part_rows: int) -> None:
+        self.partition_path = partition_path
+        self.part_rows = part_rows
+        self.buffered: List[pa.Table] = []
+        self.part_count = 0
+
+    def append(self, table: pa.Table) -> None:
+        if table.num_rows == 0:
+            return
+
+        self.buffered.append(table)
+
+        if self.part_rows and sum(t.num_rows for t in self.buffered) >= self.part_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffered:
+            return
+
+        table = pa.concat_tables(self.buffered, promote_options="default")
+        self.buffered = []
+        self.write_part(table, index=self.part_count)
+        self.part_count += 1
+
+    @instrument("commit")
+    def commit(self) -> None:
+        self.flush()
+
+        if not self.part_count:
+            raise ValueError(f"No data was appended to {self.partition_path}")
+
+        self.swap_in()
+
+    @abstractmethod
+    def write_part(self, table: pa.Table, index: int) -> None:
+        ...
+
+    @abstractmethod
+    def swap_in(self) -> None:
+        """
+        Replaces the partition's files with the written parts in one step and
+        registers the partition.
+        """
+
+
+class BaseClient(ABC):
+    """
+    Everything the Glue jobs need from the data lake. AWSClient talks to S3,
+    Glue, Athena and Secrets Manager, and LocalAWSClient keeps the same
+    behaviour on the local filesystem so the pipeline can run offline.
+    """
+
+    def __init__(self) -> None:
+        # Partition dates per (database, table), cached for the life of the job run
+        self.partition_cache: Dict[Tuple[str, str], Set[date]] = {}
+        # (database, table) pairs stored as Iceberg tables, see utils.iceberg
+        self.iceberg_tables: Set[Tuple[str, str]] = set()
+        # (database, table) pairs using partition projection, see utils.projection
+        self.projected_tables: Set[Tuple[str, str]] = set()
+        self.projection_start = PROJECTION_START
+        # Parquet layout per (database, table), see utils.layouts
+        self.layouts: Dict[Tuple[str, str], Layout] = dict(LAYOUTS)
+
+    @abstractmethod
+    def get_partitions(self, database: DATABASE, table: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get_secret(self, secret_name: str) -> Union[str, bytes]:
+        ...
+
+    @abstractmethod
+    def read_query(
+        self,
+        sql: str,
+        database: DATABASE,
+        result_mode: RESULT_MODE = "ctas",
+        chunksize: Optional[int] = None,
+    ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        ...
+
+    @abstractmethod
+    def execute_query(self, sql: str, database: DATABASE) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def upload_dataframe(
+        self,
+        df: pd.DataFrame,
+        database: DATABASE,
+        table: str,
+        concurrent_partitioning: bool = False,
+        dtype: Optional[Dict[str, str]] = None,
+        mode: WRITE_MODE = "overwrite_partitions",
+        partition_cols: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def merge_dataframe(
+        self,
+        df: pd.DataFrame,
+        database: DATABASE,
+        table: str,
+        merge_cols: List[str],
+        dtype: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Upserts the frame into an Iceberg table on merge_cols in a single commit,
+        creating the table if needed.
+        """
+
+    @abstractmethod
+    def get_iceberg_partitions(self, database: DATABASE, table: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get_projected_partitions(self, database: DATABASE, table: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def stream_partition(
+        self, database: DATABASE, table: str, as_of_date: date
+    ) -> PartitionWriter:
+        ...
+
+    @abstractmethod
+    def list_partition_files(
+        self, database: DATABASE, table: str
+    ) -> List[PartitionFiles]:
+        ...
+
+    @abstractmethod
+    def read_files(self, paths: List[str]) -> pa.Table:
+        ...
+
+    @abstractmethod
+    def replace_partition(
+        self,
+        database: DATABASE,
+        table: str,
+        values: Dict[str, str],
+        tables: List[pa.Table],
+        columns_types: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Swaps `tables` in as the partition's files in a single step.
+        """
+
+    @abstractmethod
+    def add_columns(
+        self, database: DATABASE, table: str, columns_types: Dict[str, str]
+    ) -> None:
+        """
+        Adds the columns in columns_types that the table doesn't have yet. Does
+        nothing if the table doesn't exist.
+        """
+
+    @abstractmethod
+    def widen_columns(
+        self, database: DATABASE, table: str, columns_types: Dict[str, str]
+    ) -> None:
+        """
+        Changes the integer columns that columns_types declares double to
+        double in the catalog, since awswrangler refuses to change a column's
+        type. Does nothing if the table doesn't exist.
+        """
+
+    def get_partition_dates(self, database: DATABASE, table: str) -> Set[date]:
+        """
+        The table's as_of_date partitions as dates, cached until the table is
+        written to or invalidated.
+        """
+
+        key = (database, table)
+
+        if key not in self.partition_cache:
+            if key in self.iceberg_tables:
+                partitions = self.get_iceberg_partitions(database=database, table=table)
+            elif key in self.projected_tables:
+                partitions = self.get_projected_partitions(
+                    database=database, table=table
+                )
+            else:
+                partitions = self.get_partitions(database=database, table=table)
+
+            self.partition_cache[key] = {
+                date.fromisoformat(partition[:10]) for partition in partitions
+            }
+
+        return set(self.partition_cache[key])
+
+    def get_unprocessed_dates(
+        self, source: DATABASE, target: DATABASE, table: str
+    ) -> List[date]:
+        """
+        Returns the dates partitioned in the source layer but not yet in the
+        target layer, oldest first.
+        """
+
+        return sorted(
+            self.get_partition_dates(database=source, table=table)
+            - self.get_partition_dates(database=target, table=table)
+        )
+
+    def write_listings(self, df: pd.DataFrame, database: DATABASE) -> None:
+        """
+        Writes staged or curated listings the way the table is stored: one
+        MERGE commit for Iceberg, otherwise one dataset operation that
+        overwrites the frame's partitions.
+        """
+
+        if (database, "listings") in self.iceberg_tables:
+            self.merge_dataframe(
+                df=df,
+                database=database,
+                table="listings",
+                merge_cols=MERGE_COLS[(database, "listings")],
+            )
+        else:
+            self.upload_dataframe(
+                df=df,
+                database=database,
+                table="listings",
+                concurrent_partitioning=True,
+            )
+
+    def get_layout(self, database: DATABASE, table: str) -> Layout:
+        return self.layouts.get((database, table), DEFAULT_LAYOUT)
+
+    def use_partition_projection(self, start: date) -> None:
+        self.projected_tables.update(PROJECTED_TABLES)
+        self.projection_start = start
+
+    def invalidate_partitions(self, database: DATABASE, table: str) -> None:
+        self.partition_cache.pop((database, table), None)
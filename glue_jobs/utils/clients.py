@@ -0,0 +1,63 @@
+import argparse
+import os
+from datetime import date
+from utils.base_client import BaseClient
+from utils.iceberg import ICEBERG_TABLES
+from utils.projection import PROJECTION_START
+
+
+def get_client() -> BaseClient:
+    """
+    Picks the backend from YTOWN_BACKEND: "aws" (default) or "local".
+    """
+
+    backend = os.environ.get("YTOWN_BACKEND", "aws")
+
+    if backend == "local":
+        from utils.local_client import LocalAWSClient
+
+        return LocalAWSClient()
+
+    if backend == "aws":
+        from utils.aws_client import AWSClient
+
+        return AWSClient()
+
+    raise ValueError(f"Unknown YTOWN_BACKEND {backend!r}, expected 'aws' or 'local'")
+
+
+def add_table_arguments(
+    parser: argparse.ArgumentParser, table_format: bool = True
+) -> None:
+    # The raw job only writes raw.listings, which is never Iceberg
+    if table_format:
+        parser.add_argument(
+            "--table-format", choices=["hive", "iceberg"], default="hive"
+        )
+
+    parser.add_argument(
+        "--partition-projection", choices=["true", "false"], default="false"
+    )
+    parser.add_argument(
+        "--projection-start", type=date.fromisoformat, default=PROJECTION_START
+    )
+
+
+def add_model_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--model", choices=["daily", "intervals"], default="daily")
+
+
+def get_table_client(args: argparse.Namespace) -> BaseClient:
+    """
+    get_client() set up for the add_table_arguments flags.
+    """
+
+    client = get_client()
+
+    if args.partition_projection == "true":
+        client.use_partition_projection(start=args.projection_start)
+
+    if getattr(args, "table_format", "hive") == "iceberg":
+        client.iceberg_tables.update(ICEBERG_TABLES)
+
+    return client
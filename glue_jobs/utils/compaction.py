@@ -0,0 +1,90 @@
+import math
+import pandas as pd
+import pyarrow as pa
+from datetime import date
+from typing import Dict, List, Set
+from utils.base_client import PartitionFiles
+
+
+# Athena reads files of roughly this size most efficiently
+TARGET_FILE_BYTES = 128 * 1024 * 1024
+
+
+def concat_tables_by_name(tables: List[pa.Table]) -> pa.Table:
+    """
+    Concatenates tables whose columns drifted over time (schema_evolution),
+    matching columns by name and filling missing ones with nulls.
+    """
+
+    schema = pa.unify_schemas([table.schema for table in tables])
+
+    return pa.concat_tables(
+        [
+            pa.Table.from_arrays(
+                [
+                    table.column(field.name).cast(field.type)
+                    if field.name in table.column_names
+                    else pa.nulls(table.num_rows, type=field.type)
+                    for field in schema
+                ],
+                schema=schema,
+            )
+            for table in tables
+        ]
+    )
+
+
+def needs_compaction(partition: PartitionFiles, target_file_bytes: int) -> bool:
+    """
+    True if the partition's data would fit in fewer files than it has now.
+    """
+
+    return len(partition.files) > max(1, math.ceil(partition.size / target_file_bytes))
+
+
+def split_table(
+    table: pa.Table, source_bytes: int, target_file_bytes: int
+) -> List[pa.Table]:
+    """
+    Slices the table into pieces that should each compress to about
+    target_file_bytes, estimated from the size of the files it was read from.
+    """
+
+    file_count = max(1, math.ceil(source_bytes / target_file_bytes))
+    rows_per_file = math.ceil(table.num_rows / file_count) or 1
+
+    return [
+        table.slice(offset, rows_per_file)
+        for offset in range(0, max(table.num_rows, 1), rows_per_file)
+    ]
+
+
+def frame_partition_paths(df: pd.DataFrame, partition_cols: List[str]) -> Set[str]:
+    """
+    The key=value paths, relative to the dataset, that awswrangler writes the
+    frame's rows to. Values are formatted with str() the way it does.
+    """
+
+    return {
+        "/".join(f"{column}={value}" for column, value in zip(partition_cols, keys))
+        for keys in df[partition_cols].drop_duplicates().itertuples(index=False)
+    }
+
+
+def partition_date(value: str) -> date:
+    # Staged and curated values carry a time, e.g. "2024-06-10 00:00:00"
+    return date.fromisoformat(value[:10])
+
+
+def month_of(day: date) -> str:
+    return f"{day:%Y-%m}"
+
+
+def group_by_month(partitions: List[PartitionFiles]) -> Dict[str, List[PartitionFiles]]:
+    months: Dict[str, List[PartitionFiles]] = {}
+
+    for partition in partitions:
+        day = partition_date(partition.values["as_of_date"])
+        months.setdefault(month_of(day), []).append(partition)
+
+    return months
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import List
+
+
+def content_hash(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    Signed 64-bit hash of each row's values in `columns`, the same whatever
+    dtypes a reader returned them as.
+    """
+
+    normalized = pd.DataFrame(
+        {
+            column: (
+                df[column].astype("float64")
+                if pd.api.types.is_numeric_dtype(df[column])
+                and not pd.api.types.is_bool_dtype(df[column])
+                else df[column].astype("string")
+            )
+            for column in columns
+        },
+        index=df.index,
+    )
+
+    hashes = pd.util.hash_pandas_object(normalized, index=False)
+    return pd.Series(hashes.to_numpy().view("int64"), index=df.index)
+
+
+def _array_hash(array: pa.Array) -> np.ndarray:
+    # The same values content_hash hashes for the column
+    if pa.types.is_boolean(array.type):
+        array = pc.if_else(array, "True", "False")
+    elif pa.types.is_nested(array.type):
+        # pandas prints lists as numpy arrays, they're rare and short so the
+        # column just goes through pandas
+        return pd.util.hash_pandas_object(
+            array.to_pandas().astype("string"), index=False
+        ).to_numpy()
+
+    if pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+        values = pc.cast(array, pa.float64()).to_numpy(zero_copy_only=False)
+    else:
+        values = pc.cast(array, pa.string()).to_numpy(zero_copy_only=False)
+
+    return pd.util.hash_array(values)
+
+
+def arrow_content_hash(arrays: List[pa.Array]) -> pa.Array:
+    """
+    content_hash for Arrow columns of equal length, without building a
+    frame. Gives the same hashes as content_hash for the same values.
+    """
+
+    # hash_pandas_object's fold of the column hashes, uint64 arithmetic wraps
+    hashes = np.full(len(arrays[0]) if arrays else 0, 0x345678, dtype=np.uint64)
+    mult = np.uint64(1000003)
+
+    for i, array in enumerate(arrays):
+        hashes = (hashes ^ _array_hash(array)) * mult
+        mult += np.uint64(82520 + 2 * (len(arrays) - i))
+
+    hashes += np.uint64(97531)
+
+    return pa.array(hashes.view(np.int64), type=pa.int64())
@@ -0,0 +1,78 @@
+from datetime import date
+from typing import List
+from utils.staged_listings import date_list
+from utils.tiles import CELL_ZOOMS, quadkey_sql
+
+
+def curated_listings_query(as_of_dates: List[date], source: str = "listings") -> str:
+    """
+    Daily listing counts and medians per city and zip code for the given
+    staged partitions. `source` can be any relation in the daily shape, e.g.
+    the expanded listings_history subquery.
+    """
+
+    return f"""
+        SELECT
+            as_of_date,
+            city,
+            zip_code,
+            COUNT(*) AS total_listings,
+            APPROX_PERCENTILE(price, 0.5) AS median_listing_price,
+            APPROX_PERCENTILE(DATE_DIFF('day', listing_date, as_of_date), 0.5) AS median_days_on_market,
+            APPROX_PERCENTILE(price / living_area, 0.5) AS median_price_per_square_ft,
+            APPROX_PERCENTILE(lot_area_value / 43560, 0.5) AS avg_lot_size
+        FROM {source}
+        WHERE as_of_date IN ({date_list(as_of_dates)})
+        GROUP BY
+            as_of_date,
+            city,
+            zip_code
+    """
+
+
+def curated_tiles_query(as_of_dates: List[date], source: str = "listings") -> str:
+    """
+    Listing counts and medians per day and map cell at each of the CELL_ZOOMS.
+    """
+
+    cells = ",\n".join(
+        f"SUBSTR(quadkey, 1, {zoom}) AS quadkey_{zoom}" for zoom in CELL_ZOOMS
+    )
+    grouping_sets = ", ".join(f"(as_of_date, quadkey_{zoom})" for zoom in CELL_ZOOMS)
+    zoom_case = " ".join(
+        f"WHEN GROUPING(quadkey_{zoom}) = 0 THEN {zoom}" for zoom in CELL_ZOOMS
+    )
+
+    return f"""
+        SELECT
+            as_of_date,
+            CASE {zoom_case} END AS zoom,
+            COALESCE({", ".join(f"quadkey_{zoom}" for zoom in CELL_ZOOMS)}) AS quadkey,
+            COUNT(*) AS total_listings,
+            APPROX_PERCENTILE(price, 0.5) AS median_listing_price,
+            APPROX_PERCENTILE(price / living_area, 0.5) AS median_price_per_square_ft,
+            AVG(latitude) AS latitude,
+            AVG(longitude) AS longitude
+        FROM (
+            SELECT
+                as_of_date,
+                price,
+                living_area,
+                latitude,
+                longitude,
+                {cells}
+            FROM (
+                SELECT
+                    as_of_date,
+                    price,
+                    living_area,
+                    latitude,
+                    longitude,
+                    COALESCE(quadkey, {quadkey_sql()}) AS quadkey
+                FROM {source}
+                WHERE as_of_date IN ({date_list(as_of_dates)})
+            )
+            WHERE quadkey IS NOT NULL
+        )
+        GROUP BY GROUPING SETS ({grouping_sets})
+    """
@@ -0,0 +1,39 @@
+"""
+Optional Iceberg format for the staged and curated listings tables,
+partitioned by day(as_of_date) and written with MERGE INTO.
+"""
+
+from typing import Dict, List, Tuple
+
+
+ICEBERG_TABLES: List[Tuple[str, str]] = [
+    ("staged", "listings"),
+    ("curated", "listings"),
+]
+
+
+# Hidden partitioning: queries filter on as_of_date and Iceberg prunes files
+ICEBERG_PARTITIONING = ["day(as_of_date)"]
+
+
+# A row with the same values in these columns is updated instead of duplicated
+MERGE_COLS: Dict[Tuple[str, str], List[str]] = {
+    ("staged", "listings"): ["zpid", "as_of_date"],
+    ("curated", "listings"): ["as_of_date", "city", "zip_code"],
+}
+
+
+def iceberg_dates_query(table: str) -> str:
+    # $partitions is answered from the manifests, no data files are read
+    return f"""
+        SELECT DISTINCT CAST(partition.as_of_date_day AS VARCHAR) AS as_of_date
+        FROM "{table}$partitions"
+    """
+
+
+def optimize_query(table: str) -> str:
+    return f"OPTIMIZE {table} REWRITE DATA USING BIN_PACK"
+
+
+def vacuum_query(table: str) -> str:
+    return f"VACUUM {table}"
@@ -0,0 +1,178 @@
+"""
+Parquet layouts sorted on the dashboard filter columns, so Athena can skip row
+groups on their min/max statistics.
+"""
+
+import pandas as pd
+import pyarrow as pa
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+from utils.staged_listings import STAGED_COLUMNS
+
+
+@dataclass(frozen=True)
+class Layout:
+    # Rows are sorted by these before they're written, absent columns are skipped
+    sort_by: Tuple[str, ...] = ()
+    # 0 leaves it to pyarrow, which at our sizes means one row group per file
+    row_group_rows: int = 0
+    # 0 writes each partition of an upload as a single file
+    target_file_rows: int = 0
+    compression: str = "snappy"
+    compression_level: Optional[int] = None
+    # None dictionary encodes, or writes statistics for, every column
+    dictionary_columns: Optional[Tuple[str, ...]] = None
+    statistics_columns: Optional[Tuple[str, ...]] = None
+
+    def _sort_columns(self, columns: List[str]) -> List[str]:
+        return [column for column in self.sort_by if column in columns]
+
+    def sort_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        sort_columns = self._sort_columns(list(df.columns))
+
+        if not sort_columns:
+            return df
+
+        # Stable, so rows that tie keep their arrival order
+        return df.sort_values(sort_columns, kind="stable", ignore_index=True)
+
+    def sort_table(self, table: pa.Table) -> pa.Table:
+        sort_columns = self._sort_columns(table.column_names)
+
+        if not sort_columns:
+            return table
+
+        return table.sort_by([(column, "ascending") for column in sort_columns])
+
+    def writer_options(self) -> Dict[str, Any]:
+        """
+        Keyword arguments for pyarrow's Parquet writers, besides the codec and
+        the row group size which every writer takes differently.
+        """
+
+        return {
+            "compression_level": self.compression_level,
+            "use_dictionary": (
+                True
+                if self.dictionary_columns is None
+                else list(self.dictionary_columns)
+            ),
+            "write_statistics": (
+                True
+                if self.statistics_columns is None
+                else list(self.statistics_columns)
+            ),
+        }
+
+    def wrangler_options(self) -> "WranglerOptions":
+        # pyarrow_additional_kwargs for awswrangler's to_parquet
+        return WranglerOptions(
+            self.writer_options(), row_group_size=self.row_group_rows or None
+        )
+
+    @property
+    def extension(self) -> str:
+        return f".{self.compression}.parquet"
+
+
+class WranglerOptions(dict):
+    """
+    awswrangler pops write_table_args out of the kwargs before each file it
+    writes and hands the rest to ParquetWriter, so in a plain dict the row
+    group size only reaches the first file. Here it's kept for every file.
+    """
+
+    def __init__(self, options: Dict[str, Any], row_group_size: Optional[int]):
+        super().__init__(options)
+        self.write_table_args = {"row_group_size": row_group_size}
+
+    def __contains__(self, key: object) -> bool:
+        return key == "write_table_args" or super().__contains__(key)
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        if key == "write_table_args":
+            return dict(self.write_table_args)
+
+        return super().pop(key, *default)
+
+
+DEFAULT_LAYOUT = Layout()
+
+
+# Min/max of free text never excludes a row group, it only makes footers bigger
+FREE_TEXT_COLUMNS = {"street_address", "unit", "price_reduction", "open_house"}
+
+
+# Strings with a handful of distinct values a day, everything else is mostly
+# unique per listing and would fall back to plain encoding anyway
+DICTIONARY_COLUMNS = (
+    "city",
+    "zip_code",
+    "state",
+    "country",
+    "currency",
+    "home_type",
+    "home_status",
+    "home_status_for_hdp",
+    "new_construction_type",
+    "region_id",
+)
+
+
+STAGED_LAYOUT = Layout(
+    sort_by=("city", "zip_code", "zpid"),
+    # Small enough that one zip code of a day spans a row group or two
+    row_group_rows=16_384,
+    # Roughly compaction's 128 MB target, so a day is a file or two
+    target_file_rows=1_048_576,
+    compression="zstd",
+    compression_level=3,
+    dictionary_columns=DICTIONARY_COLUMNS,
+    statistics_columns=tuple(
+        column
+        for column in list(STAGED_COLUMNS.values())
+        + ["listing_date", "quadkey", "as_of_date"]
+        if column not in FREE_TEXT_COLUMNS
+    ),
+)
+
+
+LAYOUTS: Dict[Tuple[str, str], Layout] = {
+    # Only ever read whole days, sorting just helps compression
+    ("raw", "listings"): Layout(
+        sort_by=("city", "zipcode", "zpid"),
+        compression="zstd",
+        compression_level=3,
+        # Also what a streamed day is buffered up to between files
+        target_file_rows=100_000,
+    ),
+    ("staged", "listings"): STAGED_LAYOUT,
+    # A month is one partition, so the day comes first
+    ("staged", "listings_monthly"): replace(
+        STAGED_LAYOUT,
+        sort_by=("as_of_date",) + STAGED_LAYOUT.sort_by,
+        row_group_rows=65_536,
+    ),
+    # A few hundred rows a day, one row group is already the whole day
+    ("curated", "listings"): Layout(
+        sort_by=("city", "zip_code"), compression="zstd", compression_level=3
+    ),
+    # Sketches are unique blobs, not worth a dictionary or min/max
+    ("curated", "listings_sketches"): Layout(
+        sort_by=("city", "zip_code"),
+        compression="zstd",
+        compression_level=3,
+        dictionary_columns=("city", "zip_code"),
+        statistics_columns=("as_of_date", "city", "zip_code", "listing_days"),
+    ),
+    # Map tiles read one zoom level of a day, see utils.tiles
+    ("curated", "listings_tiles"): Layout(
+        sort_by=("zoom", "quadkey"), compression="zstd", compression_level=3
+    ),
+    # Dashboard tiles filter on the level first, see utils.rollup
+    ("curated", "listings_rollup"): Layout(
+        sort_by=("geography", "breakdown", "city", "zip_code"),
+        compression="zstd",
+        compression_level=3,
+    ),
+}
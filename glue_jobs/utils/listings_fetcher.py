@@ -0,0 +1,444 @@
+import aiohttp
+import asyncio
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+from utils.metrics import stage
+from utils.page_cache import PageCache
+from utils.regions import Region
+
+
+logger = logging.getLogger(__name__)
+
+
+RAPID_API_HOST = "zillow-com1.p.rapidapi.com"
+# Overridable so the raw job can run against utils.rapid_api_stub
+RAPID_API_URL = os.environ.get("RAPID_API_URL", f"https://{RAPID_API_HOST}/searchByUrl")
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+# Free tier limit for the Zillow API on RapidAPI
+REQUESTS_PER_SECOND = 1.0
+
+
+# Requests open at once, across every region
+MAX_CONCURRENCY = 4
+
+
+# Pages fetched ahead of the caller before the fetcher waits for it
+PREFETCH_PAGES = 2 * MAX_CONCURRENCY
+
+
+class TokenBucket:
+    """
+    Classic token bucket. Tokens refill continuously at `rate` per second up to
+    `capacity`, and every request spends one.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be greater than zero")
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def _take(self) -> float:
+        """
+        Spends a token and returns 0, or returns how long until one is available.
+        """
+
+        with self.lock:
+            self._refill()
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """
+        Blocks until a token is available and then spends it.
+        """
+
+        wait = self._take()
+
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._take()
+
+    async def acquire_async(self) -> None:
+        """
+        acquire() for coroutines, waits without blocking the event loop.
+        """
+
+        wait = self._take()
+
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+
+class ListingsFetcher:
+    """
+    Fetches search pages for many regions through one session, sharing the rate
+    limit and concurrency. 429/5xx responses are retried with jittered backoff.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+        timeout: float = 30.0,
+        url: str = RAPID_API_URL,
+    ) -> None:
+        self.api_key = api_key
+        self.url = url
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+
+    async def __aenter__(self) -> "ListingsFetcher":
+        # Created here so they belong to the running event loop
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        # Waiters get the lock in arrival order, so tokens go out first come,
+        # first served instead of to whichever sleeper wakes first
+        self.token_queue = asyncio.Lock()
+        self.session = aiohttp.ClientSession(
+            headers={
+                "x-rapidapi-key": self.api_key,
+                "x-rapidapi-host": RAPID_API_HOST,
+            },
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.session.close()
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2**attempt)
+        )
+
+    async def _request(
+        self, region: Region, page_num: int, attempt: int
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        One attempt. Returns (results, None), or (None, Retry-After header) when
+        the response should be retried.
+        """
+
+        params = {"url": region.url, "page": page_num}
+
+        async with self.slots:
+            async with self.token_queue:
+                await self.rate_limiter.acquire_async()
+
+            started_at = time.perf_counter()
+            async with self.session.get(self.url, params=params) as response:
+                logger.info(
+                    "region=%s page=%s attempt=%s status=%s latency=%.3fs",
+                    region.region_id,
+                    page_num,
+                    attempt + 1,
+                    response.status,
+                    time.perf_counter() - started_at,
+                )
+
+                if response.status in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    return None, response.headers.get("Retry-After")
+
+                response.raise_for_status()
+                return await response.json(content_type=None), None
+
+    async def get_listing_results(
+        self, region: Region, page_num: int = 1
+    ) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                listing_results, retry_after = await self._request(
+                    region=region, page_num=page_num, attempt=attempt
+                )
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if attempt == self.max_retries:
+                    raise
+
+                delay = self._backoff(attempt)
+                logger.warning(
+                    "region=%s page=%s attempt=%s error=%r retrying in %.2fs",
+                    region.region_id,
+                    page_num,
+                    attempt + 1,
+                    error,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            if listing_results is not None:
+                return listing_results
+
+            # Backing off outside the slot lets other regions use it meanwhile
+            delay = self._backoff(attempt, retry_after)
+            logger.warning(
+                "region=%s page=%s retrying in %.2fs", region.region_id, page_num, delay
+            )
+            await asyncio.sleep(delay)
+
+    async def iter_regions(
+        self, regions: List[Region], caches: Dict[str, PageCache]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yields (region_id, page) for every page of every region as they arrive,
+        taking regions in turn. Cached pages are read instead of requested.
+        """
+
+        cached_pages = {
+            region_id: set(await asyncio.to_thread(cache.pages))
+            for region_id, cache in caches.items()
+        }
+        pending: Dict[str, Deque[int]] = {
+            region.region_id: deque([1]) for region in regions
+        }
+        turns = deque(regions)
+        # Bounded so pages wait here, not in memory, while the caller catches up
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency)
+        changed = asyncio.Condition()
+        in_flight = 0
+
+        def next_page() -> Optional[Tuple[Region, int]]:
+            for _ in range(len(turns)):
+                region = turns[0]
+                turns.rotate(-1)
+
+                if pending[region.region_id]:
+                    return region, pending[region.region_id].popleft()
+
+            return None
+
+        async def get_page(region: Region, page: int) -> Dict[str, Any]:
+            cache = caches.get(region.region_id)
+
+            if page in cached_pages.get(region.region_id, set()):
+                logger.info(
+                    "region=%s page=%s loaded from cache", region.region_id, page
+                )
+                return await asyncio.to_thread(cache.get, page)
+
+            listing_results = await self.get_listing_results(
+                region=region, page_num=page
+            )
+
+            if cache is not None:
+                await asyncio.to_thread(cache.put, page, listing_results)
+
+            return listing_results
+
+        async def worker() -> None:
+            nonlocal in_flight
+
+            while True:
+                async with changed:
+                    job = next_page()
+
+                    # Pages still in flight can queue more, a first page its
+                    # whole region
+                    while job is None and in_flight:
+                        await changed.wait()
+                        job = next_page()
+
+                    if job is None:
+                        return
+
+                    in_flight += 1
+
+                region, page = job
+
+                try:
+                    listing_results = await get_page(region, page)
+
+                    if page == 1:
+                        async with changed:
+                            pending[region.region_id].extend(
+                                range(2, listing_results["totalPages"] + 1)
+                            )
+                            changed.notify_all()
+
+                    await results.put((region.region_id, listing_results))
+                finally:
+                    async with changed:
+                        in_flight -= 1
+                        changed.notify_all()
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.max_concurrency)]
+        done = asyncio.gather(*workers)
+
+        try:
+            while True:
+                getter = asyncio.ensure_future(results.get())
+                await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+
+                if getter.done():
+                    yield getter.result()
+                    continue
+
+                getter.cancel()
+                # Raises the first worker error, if any
+                done.result()
+
+                while not results.empty():
+                    yield results.get_nowait()
+
+                return
+        finally:
+            for task in workers:
+                task.cancel()
+
+            await asyncio.gather(done, return_exceptions=True)
+
+
+async def fetch_regions(
+    api_key: str, regions: List[Region], caches: Dict[str, PageCache]
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    async with ListingsFetcher(
+        api_key=api_key, requests_per_second=REQUESTS_PER_SECOND
+    ) as fetcher:
+        region_pages = fetcher.iter_regions(regions=regions, caches=caches)
+
+        # Closed explicitly so its workers are cancelled before the session
+        # closes, even when the caller stops early
+        try:
+            async for region_page in region_pages:
+                yield region_page
+        finally:
+            await region_pages.aclose()
+
+
+def iter_async(
+    region_pages: AsyncIterator[Tuple[str, Dict[str, Any]]],
+    prefetch: int = PREFETCH_PAGES,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Runs the async iterator on a background event loop and hands its pages over
+    through a bounded queue. Stopping early cancels the fetch.
+    """
+
+    pages: queue.Queue = queue.Queue(maxsize=prefetch)
+    loop = asyncio.new_event_loop()
+
+    async def hand_over(item: Tuple[str, Any]) -> None:
+        while True:
+            try:
+                pages.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.05)
+
+    async def produce() -> None:
+        try:
+            async for region_page in region_pages:
+                await hand_over(("page", region_page))
+        except Exception as error:
+            await hand_over(("error", error))
+            return
+        finally:
+            await region_pages.aclose()
+
+        await hand_over(("done", None))
+
+    task = loop.create_task(produce())
+
+    def run() -> None:
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, name="fetch", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            # Time the caller spends waiting on the fetcher
+            with stage("fetch") as metrics:
+                kind, value = pages.get()
+
+                if kind == "done":
+                    return
+
+                if kind == "error":
+                    raise value
+
+                region_id, listing_results = value
+                metrics.rows_out = len(listing_results.get("props") or [])
+                metrics.properties["Region"] = region_id
+
+            yield region_id, listing_results
+    finally:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def iter_responses(
+    api_key: Optional[str],
+    mode: str,
+    regions: List[Region],
+    cache: Optional[PageCache],
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (region_id, page) for every page of every region's listings search, either
+    fetched from the API or, in replay mode, read back from the cache of an
+    earlier run.
+    """
+
+    if mode == "replay":
+        if cache is None:
+            raise ValueError("--response-cache is required in replay mode")
+
+        for region in regions:
+            for listing_results in cache.for_region(region.region_id).iter_responses():
+                yield region.region_id, listing_results
+
+        return
+
+    caches = (
+        {}
+        if cache is None
+        else {
+            region.region_id: cache.for_region(region.region_id) for region in regions
+        }
+    )
+
+    yield from iter_async(
+        fetch_regions(api_key=api_key, regions=regions, caches=caches)
+    )
@@ -0,0 +1,271 @@
+"""
+Interval (SCD2) model for staged: one row per distinct state of a listing,
+valid from valid_from through valid_to, partitioned by is_current.
+"""
+
+import pandas as pd
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from utils.content_hash import content_hash
+from utils.staged_listings import STAGED_COLUMNS, STAGED_TYPES, date_list
+from utils.tiles import quadkey_sql
+
+
+HISTORY_TABLE = "listings_history"
+HISTORY_VIEW = "listings_history_daily"
+
+
+# Change with every snapshot, or with the search that found the listing,
+# without the listing itself changing
+VOLATILE_COLUMNS = ["days_on_zillow", "time_on_zillow", "region_id"]
+
+
+# Pinned so columns that happen to be all null still get their declared type
+HISTORY_DTYPES: Dict[str, str] = {
+    **STAGED_TYPES,
+    "listing_date": "date",
+    "content_hash": "bigint",
+    "valid_from": "date",
+    "valid_to": "date",
+    "is_current": "string",
+}
+
+
+TRACKED_COLUMNS = [
+    column
+    for column in STAGED_COLUMNS.values()
+    if column not in VOLATILE_COLUMNS + ["zpid"]
+]
+
+
+def prepare_snapshot(df: pd.DataFrame, snapshot_date: date) -> pd.DataFrame:
+    """
+    One row per zpid from a raw snapshot, with its listing date and the hash
+    of its tracked columns.
+    """
+
+    snapshot = df.drop_duplicates(subset=["zpid"]).drop(columns=["as_of_date"])
+    listing_dates = pd.Timestamp(snapshot_date) - pd.to_timedelta(
+        snapshot["days_on_zillow"], unit="d"
+    )
+
+    return snapshot.assign(
+        listing_date=listing_dates.dt.date,
+        content_hash=content_hash(snapshot, TRACKED_COLUMNS),
+    )
+
+
+def apply_snapshot(
+    current: pd.DataFrame,
+    snapshot: pd.DataFrame,
+    snapshot_date: date,
+    previous_date: Optional[date],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Moves the current states forward to `snapshot_date` and returns
+    (current, closed), crediting the days since previous_date to the snapshot.
+    """
+
+    first_day = None if previous_date is None else previous_date + timedelta(days=1)
+
+    merged = current[["zpid", "content_hash", "valid_from"]].merge(
+        snapshot[["zpid", "content_hash"]],
+        on="zpid",
+        how="outer",
+        suffixes=("_current", "_snapshot"),
+        indicator=True,
+    )
+
+    closed_zpids = merged.loc[
+        (merged["_merge"] == "left_only")
+        | (
+            (merged["_merge"] == "both")
+            & (merged["content_hash_current"] != merged["content_hash_snapshot"])
+        ),
+        "zpid",
+    ]
+    kept = merged.loc[
+        (merged["_merge"] == "both")
+        & (merged["content_hash_current"] == merged["content_hash_snapshot"]),
+        ["zpid", "valid_from"],
+    ]
+
+    closed = current[current["zpid"].isin(closed_zpids)].assign(is_current="false")
+
+    # Every listing in the snapshot is current, with its latest values
+    next_current = snapshot.merge(kept, on="zpid", how="left")
+    new_valid_from = next_current["listing_date"]
+
+    if first_day is not None:
+        new_valid_from = new_valid_from.where(
+            new_valid_from > first_day, first_day
+        ).where(~next_current["zpid"].isin(current["zpid"]), first_day)
+
+    next_current["valid_from"] = (
+        next_current["valid_from"]
+        .where(next_current["valid_from"].notna(), new_valid_from)
+        .where(lambda valid_from: valid_from <= snapshot_date, snapshot_date)
+    )
+    next_current["valid_to"] = snapshot_date
+    next_current["is_current"] = "true"
+
+    return next_current, closed
+
+
+def build_history(
+    raw_df: pd.DataFrame,
+    current: pd.DataFrame,
+    snapshot_dates: List[date],
+    previous_date: Optional[date],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Applies each raw snapshot in date order and returns the final current
+    states and every state closed along the way.
+    """
+
+    # Dates come back as datetime64 or date objects depending on the reader
+    current = current.assign(
+        **{
+            column: pd.to_datetime(current[column]).dt.date
+            for column in ["listing_date", "valid_from", "valid_to"]
+        }
+    )
+
+    closed_frames: List[pd.DataFrame] = []
+    raw_dates = pd.to_datetime(raw_df["as_of_date"]).dt.date
+
+    for snapshot_date in sorted(snapshot_dates):
+        snapshot = prepare_snapshot(raw_df[raw_dates == snapshot_date], snapshot_date)
+        current, closed = apply_snapshot(
+            current=current,
+            snapshot=snapshot,
+            snapshot_date=snapshot_date,
+            previous_date=previous_date,
+        )
+        closed_frames.append(closed)
+        previous_date = snapshot_date
+
+    closed = (
+        pd.concat(closed_frames, ignore_index=True)
+        if closed_frames
+        else current.iloc[0:0]
+    )
+
+    return current, closed
+
+
+def history_columns() -> List[str]:
+    return list(STAGED_COLUMNS.values()) + [
+        "listing_date",
+        "content_hash",
+        "valid_from",
+        "valid_to",
+    ]
+
+
+def empty_history() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            **{column: pd.Series(dtype="object") for column in history_columns()},
+            "zpid": pd.Series(dtype="int64"),
+            "content_hash": pd.Series(dtype="int64"),
+        }
+    )[history_columns()]
+
+
+def last_snapshot_query() -> str:
+    return f"SELECT MAX(valid_to) AS last_snapshot_date FROM {HISTORY_TABLE}"
+
+
+def closed_since_query(first_valid_to: date) -> str:
+    """
+    Keys of the closed states a run starting after first_valid_to could have
+    written already, see unwritten_states.
+    """
+
+    return f"""
+        SELECT zpid, valid_from
+        FROM {HISTORY_TABLE}
+        WHERE is_current = 'false'
+        AND valid_to >= DATE('{first_valid_to}')
+    """
+
+
+def unwritten_states(closed: pd.DataFrame, written: pd.DataFrame) -> pd.DataFrame:
+    """
+    The closed states not in `written` yet, by (zpid, valid_from), so a retried
+    run doesn't append them twice.
+    """
+
+    def keys(df: pd.DataFrame) -> pd.MultiIndex:
+        return pd.MultiIndex.from_arrays(
+            [
+                pd.to_numeric(df["zpid"]).astype("int64"),
+                pd.to_datetime(df["valid_from"]).dt.date,
+            ]
+        )
+
+    return closed[~keys(closed).isin(keys(written))]
+
+
+def current_history_query() -> str:
+    return f"""
+        SELECT {", ".join(history_columns())}
+        FROM {HISTORY_TABLE}
+        WHERE is_current = 'true'
+    """
+
+
+def history_bounds_query() -> str:
+    return f"""
+        SELECT MIN(valid_from) AS first_day, MAX(valid_to) AS last_day
+        FROM {HISTORY_TABLE}
+    """
+
+
+def history_view_query() -> str:
+    """
+    The history in the daily model's shape, one row per listing per day, for
+    anything that still expects it (e.g. Metabase).
+    """
+
+    return f"""
+        CREATE OR REPLACE VIEW ytown_listings_staged_db.{HISTORY_VIEW} AS
+        SELECT
+            {", ".join(f"history.{column}" for column in STAGED_COLUMNS.values())},
+            history.listing_date,
+            {quadkey_sql("history.latitude", "history.longitude")} AS quadkey,
+            CAST(days.as_of_date AS TIMESTAMP) AS as_of_date
+        FROM ytown_listings_staged_db.{HISTORY_TABLE} AS history
+        CROSS JOIN UNNEST(
+            SEQUENCE(history.valid_from, history.valid_to, INTERVAL '1' DAY)
+        ) AS days (as_of_date)
+    """
+
+
+def expanded_history_query(as_of_dates: List[date]) -> str:
+    """
+    The daily shape for the given days only. Only states overlapping the
+    days are expanded, and only over the overlap.
+    """
+
+    first_day, last_day = min(as_of_dates), max(as_of_dates)
+
+    return f"""
+        SELECT
+            {", ".join(f"history.{column}" for column in STAGED_COLUMNS.values())},
+            history.listing_date,
+            {quadkey_sql("history.latitude", "history.longitude")} AS quadkey,
+            days.as_of_date
+        FROM {HISTORY_TABLE} AS history
+        CROSS JOIN UNNEST(
+            SEQUENCE(
+                GREATEST(history.valid_from, DATE('{first_day}')),
+                LEAST(history.valid_to, DATE('{last_day}')),
+                INTERVAL '1' DAY
+            )
+        ) AS days (as_of_date)
+        WHERE history.valid_to >= DATE('{first_day}')
+        AND history.valid_from <= DATE('{last_day}')
+        AND days.as_of_date IN ({date_list(as_of_dates)})
+    """
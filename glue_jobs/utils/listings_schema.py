@@ -0,0 +1,234 @@
+import pyarrow as pa
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    TypedDict,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+from utils.content_hash import arrow_content_hash
+from utils.metrics import instrument
+
+
+class ListingSubType(TypedDict):
+    is_FSBA: bool
+    is_openHouse: bool
+    is_forAuction: bool
+    is_bankOwned: bool
+    is_newHome: bool
+
+
+class OpenHouseShowing(TypedDict):
+    open_house_start: int
+    open_house_end: int
+
+
+class OpenHouseInfo(TypedDict):
+    open_house_showing: List[OpenHouseShowing]
+
+
+class Listing(TypedDict):
+    bathrooms: float
+    state: str
+    isFeatured: bool
+    isPremierBuilder: bool
+    isShowcaseListing: bool
+    lotAreaUnit: str
+    isPreforeclosureAuction: bool
+    longitude: float
+    isNonOwnerOccupied: bool
+    lotAreaValue: float
+    taxAssessedValue: float
+    country: str
+    livingArea: int
+    homeStatus: str
+    daysOnZillow: int
+    timeOnZillow: int
+    latitude: float
+    isUnmappable: bool
+    bedrooms: int
+    streetAddress: str
+    unit: str
+    homeStatusForHDP: str
+    isZillowOwned: bool
+    shouldHighlight: bool
+    zpid: int
+    listing_sub_type: ListingSubType
+    rentZestimate: int
+    zestimate: int
+    city: str
+    price: int
+    homeType: str
+    newConstructionType: str
+    currency: str
+    zipcode: str
+    priceForHDP: int
+    open_house_info: OpenHouseInfo
+    isRentalWithBasePrice: bool
+    openHouse: str
+    priceChange: int
+    datePriceChanged: int
+    priceReduction: str
+
+
+class ListingsResponse(TypedDict):
+    props: List[Listing]
+    resultsPerPage: int
+    totalPages: int
+    totalResultCount: int
+    currentPage: int
+
+
+ARROW_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+}
+
+
+ATHENA_TYPES = {
+    pa.bool_(): "boolean",
+    pa.int64(): "bigint",
+    pa.float64(): "double",
+    pa.string(): "string",
+}
+
+
+def _is_typed_dict(hint: Any) -> bool:
+    return isinstance(hint, type) and issubclass(hint, dict)
+
+
+def _arrow_type(hint: Any) -> pa.DataType:
+    if get_origin(hint) in (list, List):
+        return pa.list_(_arrow_type(get_args(hint)[0]))
+
+    if _is_typed_dict(hint):
+        return pa.struct(
+            [
+                pa.field(name, _arrow_type(field_hint))
+                for name, field_hint in get_type_hints(hint).items()
+            ]
+        )
+
+    return ARROW_TYPES[hint]
+
+
+def _flatten_hints(typed_dict: type, prefix: str = "") -> Dict[str, Any]:
+    """
+    Mirrors pd.json_normalize: nested dicts become `parent.child` columns while
+    lists are kept whole. Keys keep the API's spelling.
+    """
+
+    hints: Dict[str, Any] = {}
+
+    for name, hint in get_type_hints(typed_dict).items():
+        if _is_typed_dict(hint):
+            hints.update(_flatten_hints(hint, prefix=f"{prefix}{name}."))
+        else:
+            hints[f"{prefix}{name}"] = hint
+
+    return hints
+
+
+def column_name(key: str) -> str:
+    """
+    Same column names awswrangler has always written to the catalog, e.g.
+    `listing_sub_type.is_FSBA` -> `listing_sub_type_is_fsba`.
+    """
+
+    return key.replace(".", "_").lower()
+
+
+LISTING_FIELDS = _flatten_hints(Listing)
+
+
+# Not part of the API response: the search region a listing was fetched for,
+# and a 64-bit hash of everything the API returned for it
+REGION_COLUMN = "region_id"
+HASH_COLUMN = "content_hash"
+
+
+LISTING_SCHEMA = pa.schema(
+    [
+        pa.field(column_name(key), _arrow_type(hint))
+        for key, hint in LISTING_FIELDS.items()
+    ]
+    + [pa.field(REGION_COLUMN, pa.string()), pa.field(HASH_COLUMN, pa.int64())]
+)
+
+
+# Declared double because the API returns fractions for them. Tables created
+# while they were int keep them as bigint until a job widens them, see
+# BaseClient.widen_columns
+WIDENED_COLUMNS = {"bathrooms", "lotareavalue", "taxassessedvalue"}
+
+
+def athena_type(data_type: pa.DataType) -> str:
+    if pa.types.is_list(data_type):
+        return f"array<{athena_type(data_type.value_type)}>"
+
+    if pa.types.is_struct(data_type):
+        fields = ",".join(
+            f"{field.name}:{athena_type(field.type)}" for field in data_type
+        )
+        return f"struct<{fields}>"
+
+    if pa.types.is_date32(data_type):
+        return "date"
+
+    return ATHENA_TYPES[data_type]
+
+
+def athena_types(schema: pa.Schema) -> Dict[str, str]:
+    return {field.name: athena_type(field.type) for field in schema}
+
+
+def _get_path(listing: Dict[str, Any], key: str) -> Optional[Any]:
+    value: Any = listing
+
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+
+        value = value.get(part)
+
+    return value
+
+
+@instrument("normalize")
+def listings_to_table(
+    listings: List[Listing], region_id: Optional[str] = None
+) -> pa.Table:
+    """
+    Converts API props into an Arrow table with the declared schema, tagged with
+    `region_id` and hashed for deduplication.
+    """
+
+    columns: List[pa.Array] = []
+
+    for key, field in zip(LISTING_FIELDS, LISTING_SCHEMA):
+        values = [_get_path(listing, key) for listing in listings]
+
+        if pa.types.is_nested(field.type):
+            columns.append(pa.array(values, type=field.type))
+            continue
+
+        # Let Arrow infer first and then cast safely, so that e.g. 1.5 in an
+        # integer column fails instead of being truncated
+        array = pa.array(values)
+        columns.append(
+            pa.nulls(len(values), type=field.type)
+            if pa.types.is_null(array.type)
+            else array.cast(field.type, safe=True)
+        )
+
+    content_hashes = arrow_content_hash(columns)
+
+    columns.append(pa.array([region_id] * len(listings), type=pa.string()))
+    columns.append(content_hashes)
+
+    return pa.Table.from_arrays(columns, schema=LISTING_SCHEMA)
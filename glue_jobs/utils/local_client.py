@@ -0,0 +1,482 @@
+import duckdb
+import glob
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import re
+import shutil
+import uuid
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Union
+from utils.base_client import (
+    DATABASE,
+    RESULT_MODE,
+    WRITE_MODE,
+    BaseClient,
+    PartitionFiles,
+    PartitionWriter,
+)
+from utils.compaction import concat_tables_by_name
+from utils.metrics import instrument, record
+from utils.staged_listings import date_list
+
+
+LOCAL_ROOT = os.environ.get("YTOWN_LOCAL_ROOT", ".local_lake")
+
+
+# Athena functions the job SQL uses that DuckDB spells differently
+ATHENA_MACROS = [
+    "CREATE OR REPLACE MACRO approx_percentile(x, p) AS quantile_cont(x, p)",
+    "CREATE OR REPLACE MACRO date_add(unit, n, d) AS CAST(d + to_days(n) AS DATE)",
+    """
+    CREATE OR REPLACE MACRO sequence(start_date, stop_date, step) AS
+        list_transform(
+            generate_series(start_date, stop_date, step), d -> CAST(d AS DATE)
+        )
+    """,
+    # Same math as Athena's, see utils.tiles
+    """
+    CREATE OR REPLACE MACRO bing_tile_at(latitude, longitude, zoom) AS
+        struct_pack(
+            x := CAST(floor(least(greatest(
+                (longitude + 180) / 360 * (256 << zoom), 0), (256 << zoom) - 1
+            )) AS BIGINT) // 256,
+            y := CAST(floor(least(greatest(
+                (0.5 - ln(
+                    (1 + sin(radians(latitude))) / (1 - sin(radians(latitude)))
+                ) / (4 * pi())) * (256 << zoom), 0), (256 << zoom) - 1
+            )) AS BIGINT) // 256,
+            zoom := zoom
+        )
+    """,
+    """
+    CREATE OR REPLACE MACRO bing_tile_quadkey(tile) AS
+        array_to_string(
+            list_transform(
+                range(tile.zoom - 1, -1, -1),
+                i -> CAST(((tile.x >> i) & 1) + 2 * ((tile.y >> i) & 1) AS VARCHAR)
+            ),
+            ''
+        )
+    """,
+    # Sketches (utils.sketches) are the lists of their values, merged by
+    # concatenating them, so the answers are exact
+    "CREATE OR REPLACE MACRO approx_set(x) AS list(DISTINCT x) FILTER (WHERE x IS NOT NULL)",
+    "CREATE OR REPLACE MACRO qdigest_agg(x) AS list(x) FILTER (WHERE x IS NOT NULL)",
+    "CREATE OR REPLACE MACRO tdigest_agg(x) AS list(x) FILTER (WHERE x IS NOT NULL)",
+    "CREATE OR REPLACE MACRO merge(sketch) AS flatten(list(sketch))",
+    "CREATE OR REPLACE MACRO cardinality(sketch) AS len(list_distinct(sketch))",
+    """
+    CREATE OR REPLACE MACRO value_at_quantile(sketch, q) AS
+        list_aggregate(sketch, 'quantile_cont', q)
+    """,
+]
+
+
+# Casts between sketches and varbinary, which the value lists don't need
+SKETCH_CAST_PATTERN = re.compile(
+    r"CAST\(([^()]*(?:\([^()]*\))?[^()]*) AS "
+    r"(?:varbinary|HyperLogLog|tdigest|qdigest\(\w+\))\)",
+    re.IGNORECASE,
+)
+
+
+INSERT_PATTERN = re.compile(
+    r"^\s*INSERT\s+INTO\s+ytown_listings_(\w+)_db\.(\w+)\s*\(([^)]*)\)\s*(SELECT.*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+MAINTENANCE_PATTERN = re.compile(r"^\s*(OPTIMIZE|VACUUM)\s", re.IGNORECASE)
+
+
+class LocalAWSClient(BaseClient):
+    """
+    Offline stand-in for AWSClient: Hive-partitioned Parquet under `root`,
+    queried with DuckDB.
+    """
+
+    def __init__(self, root: str = LOCAL_ROOT) -> None:
+        super().__init__()
+        self.root = root
+        self.secrets_file = os.environ.get(
+            "YTOWN_SECRETS_FILE", os.path.join(root, "secrets.json")
+        )
+        self.connection = duckdb.connect()
+        # No AWS session, so the response cache has to be a local directory
+        self.session = None
+
+        for macro in ATHENA_MACROS:
+            self.connection.execute(macro)
+
+    def get_dataset_path(self, database: DATABASE, table: str) -> str:
+        return os.path.join(self.root, database, table)
+
+    @instrument("list_partitions", rows_out=len)
+    def get_partitions(self, database: DATABASE, table: str) -> List[str]:
+        dataset_path = self.get_dataset_path(database=database, table=table)
+
+        if not os.path.isdir(dataset_path):
+            return []
+
+        # Staging directories start with an underscore
+        return [
+            name.split("=", 1)[1]
+            for name in sorted(os.listdir(dataset_path))
+            if "=" in name and not name.startswith("_")
+        ]
+
+    def get_secret(self, secret_name: str) -> Union[str, bytes]:
+        with open(self.secrets_file) as file:
+            return json.load(file)[secret_name]
+
+    @staticmethod
+    def _files_glob(dataset_path: str) -> Optional[str]:
+        """
+        Glob of a table's data files, one key=value level per partition
+        column (e.g. two for listings_rollup). Staging directories don't have
+        a "=" in their name, so their files never match.
+        """
+
+        levels: List[str] = []
+        path = dataset_path
+
+        while True:
+            partitions = [
+                name
+                for name in sorted(os.listdir(path))
+                if "=" in name and not name.startswith("_")
+            ]
+
+            if not partitions:
+                break
+
+            levels.append("*=*")
+            path = os.path.join(path, partitions[0])
+
+        if not levels:
+            return None
+
+        return os.path.join(dataset_path, *levels, "*.parquet")
+
+    def _refresh_views(self) -> None:
+        # Recreated before every query so partitions written since are picked up
+        for layer in ("raw", "staged", "curated"):
+            schema = f"ytown_listings_{layer}_db"
+            self.connection.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+
+            for dataset_path in glob.glob(os.path.join(self.root, layer, "*")):
+                files = self._files_glob(dataset_path)
+
+                if files is None or not glob.glob(files):
+                    continue
+
+                self.connection.execute(
+                    f"""
+                    CREATE OR REPLACE VIEW {schema}.{os.path.basename(dataset_path)} AS
+                    SELECT * FROM read_parquet(
+                        '{files}', hive_partitioning = true, union_by_name = true
+                    )
+                    """
+                )
+
+    @instrument("read_query")
+    def read_query(
+        self,
+        sql: str,
+        database: DATABASE,
+        result_mode: RESULT_MODE = "ctas",
+        chunksize: Optional[int] = None,
+    ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        Runs Athena SQL in DuckDB. result_mode has no meaning locally and is
+        ignored. A chunksize returns an iterator of frames like AWSClient.
+        """
+
+        self._refresh_views()
+        self.connection.execute(
+            f"SET search_path = 'ytown_listings_{database}_db,main'"
+        )
+        result = self.connection.execute(SKETCH_CAST_PATTERN.sub(r"\1", sql))
+
+        if chunksize is None:
+            return result.df()
+
+        reader = result.fetch_record_batch(chunksize)
+        return (batch.to_pandas() for batch in reader)
+
+    @instrument("execute_query")
+    def execute_query(self, sql: str, database: DATABASE) -> Dict[str, Any]:
+        """
+        INSERT INTO runs as a SELECT written with upload_dataframe, and OPTIMIZE and
+        VACUUM do nothing.
+        """
+
+        if MAINTENANCE_PATTERN.match(sql):
+            return {"Status": {"State": "SUCCEEDED"}}
+
+        insert = INSERT_PATTERN.match(sql)
+
+        if insert is None:
+            self._refresh_views()
+            self.connection.execute(
+                f"SET search_path = 'ytown_listings_{database}_db,main'"
+            )
+            self.connection.execute(sql)
+            return {"Status": {"State": "SUCCEEDED"}}
+
+        layer, table, columns, select = insert.groups()
+        df = self.read_query(sql=select, database=database)
+        df.columns = [column.strip() for column in columns.split(",")]
+
+        if not df.empty:
+            self.upload_dataframe(df=df, database=layer, table=table)
+
+        return {"Status": {"State": "SUCCEEDED"}, "Statistics": {"Rows": len(df)}}
+
+    @instrument("write")
+    def upload_dataframe(
+        self,
+        df: pd.DataFrame,
+        database: DATABASE,
+        table: str,
+        concurrent_partitioning: bool = False,
+        dtype: Optional[Dict[str, str]] = None,
+        mode: WRITE_MODE = "overwrite_partitions",
+        partition_cols: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Overwrites (or with mode="append", adds to) every partition in the
+        frame. as_of_date partition values are always written as plain dates
+        so directory names stay portable. Files get the same layout as on AWS.
+        """
+
+        self.invalidate_partitions(database=database, table=table)
+
+        layout = self.get_layout(database=database, table=table)
+        partition_cols = partition_cols or ["as_of_date"]
+
+        if "as_of_date" in partition_cols:
+            df = df.assign(as_of_date=pd.to_datetime(df["as_of_date"]).dt.date)
+
+        paths: List[str] = []
+
+        pq.write_to_dataset(
+            pa.Table.from_pandas(layout.sort_frame(df), preserve_index=False),
+            root_path=self.get_dataset_path(database=database, table=table),
+            partition_cols=partition_cols,
+            basename_template=f"{uuid.uuid4().hex}-{{i}}{layout.extension}",
+            compression=layout.compression,
+            max_rows_per_file=layout.target_file_rows,
+            # A row group can't be bigger than its file
+            row_group_size=layout.row_group_rows or layout.target_file_rows or None,
+            # Threads would otherwise write the sorted rows out of order
+            preserve_order=True,
+            **layout.writer_options(),
+            existing_data_behavior=(
+                "overwrite_or_ignore" if mode == "append" else "delete_matching"
+            ),
+            file_visitor=lambda written_file: paths.append(written_file.path),
+        )
+
+        record(bytes_written=sum(os.path.getsize(path) for path in paths))
+
+        return {"paths": paths, "partitions_values": {}}
+
+    def stream_partition(
+        self, database: DATABASE, table: str, as_of_date: date
+    ) -> "LocalPartitionStream":
+        return LocalPartitionStream(
+            client=self, database=database, table=table, as_of_date=as_of_date
+        )
+
+    @instrument("merge")
+    def merge_dataframe(
+        self,
+        df: pd.DataFrame,
+        database: DATABASE,
+        table: str,
+        merge_cols: List[str],
+        dtype: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        There's no Iceberg locally, so the days in the frame are rewritten
+        with the frame's rows taking the place of any rows with the same
+        merge_cols.
+        """
+
+        days = sorted(set(pd.to_datetime(df["as_of_date"]).dt.date))
+        existing_days = set(days) & self.get_partition_dates(database, table)
+
+        if existing_days:
+            existing_df = self.read_query(
+                sql=f"""
+                    SELECT * FROM {table}
+                    WHERE as_of_date IN ({date_list(sorted(existing_days))})
+                """,
+                database=database,
+            )
+            df = pd.concat(
+                [
+                    df.assign(as_of_date=pd.to_datetime(df["as_of_date"])),
+                    existing_df.assign(
+                        as_of_date=pd.to_datetime(existing_df["as_of_date"])
+                    ),
+                ],
+                ignore_index=True,
+            ).drop_duplicates(subset=merge_cols, keep="first")
+
+        self.upload_dataframe(df=df, database=database, table=table, dtype=dtype)
+
+    def get_iceberg_partitions(self, database: DATABASE, table: str) -> List[str]:
+        return self.get_partitions(database=database, table=table)
+
+    def get_projected_partitions(self, database: DATABASE, table: str) -> List[str]:
+        # Local partitions are only ever found by listing directories
+        return self.get_partitions(database=database, table=table)
+
+    @instrument("list_files", rows_out=len)
+    def list_partition_files(
+        self, database: DATABASE, table: str
+    ) -> List[PartitionFiles]:
+        dataset_path = self.get_dataset_path(database=database, table=table)
+        partitions: List[PartitionFiles] = []
+
+        for location in sorted(glob.glob(os.path.join(dataset_path, "*=*"))):
+            key, value = os.path.basename(location).split("=", 1)
+            partitions.append(
+                PartitionFiles(
+                    values={key: value},
+                    location=location,
+                    files={
+                        path: os.path.getsize(path)
+                        for path in sorted(
+                            glob.glob(os.path.join(location, "*.parquet"))
+                        )
+                    },
+                )
+            )
+
+        return partitions
+
+    @instrument("read_files")
+    def read_files(self, paths: List[str]) -> pa.Table:
+        return concat_tables_by_name([pq.read_table(path) for path in paths])
+
+    @instrument("replace_partition")
+    def replace_partition(
+        self,
+        database: DATABASE,
+        table: str,
+        values: Dict[str, str],
+        tables: List[pa.Table],
+        columns_types: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Same swap as LocalPartitionStream: the files are written to a staging
+        directory that then replaces the partition directory.
+        """
+
+        dataset_path = self.get_dataset_path(database=database, table=table)
+        partition_path = os.path.join(
+            dataset_path, *(f"{key}={value}" for key, value in values.items())
+        )
+        staging_path = os.path.join(dataset_path, "_staging", uuid.uuid4().hex)
+        layout = self.get_layout(database=database, table=table)
+        os.makedirs(staging_path)
+
+        for i, part in enumerate(tables):
+            path = os.path.join(staging_path, f"part-{i:05d}{layout.extension}")
+            pq.write_table(
+                part,
+                path,
+                compression=layout.compression,
+                row_group_size=layout.row_group_rows or None,
+                **layout.writer_options(),
+            )
+            record(rows_in=part.num_rows, bytes_written=os.path.getsize(path))
+
+        replace_directory(staging_path, partition_path)
+
+        self.invalidate_partitions(database=database, table=table)
+
+    def add_columns(
+        self, database: DATABASE, table: str, columns_types: Dict[str, str]
+    ) -> None:
+        # The views union Parquet files by name, so older files that don't have
+        # a column read it as null as soon as any newer file does
+        pass
+
+    def widen_columns(
+        self, database: DATABASE, table: str, columns_types: Dict[str, str]
+    ) -> None:
+        # The union also reads older integer files of a double column as doubles
+        pass
+
+
+class LocalPartitionStream(PartitionWriter):
+    """
+    Same contract as PartitionStream: parts go to a staging directory that
+    commit() swaps in as the partition.
+    """
+
+    def __init__(
+        self,
+        client: LocalAWSClient,
+        database: DATABASE,
+        table: str,
+        as_of_date: date,
+    ) -> None:
+        dataset_path = client.get_dataset_path(database=database, table=table)
+        self.layout = client.get_layout(database=database, table=table)
+
+        super().__init__(
+            partition_path=os.path.join(dataset_path, f"as_of_date={as_of_date}"),
+            part_rows=self.layout.target_file_rows,
+        )
+
+        self.client = client
+        self.database = database
+        self.table = table
+        self.staging_path = os.path.join(dataset_path, "_staging", uuid.uuid4().hex)
+
+    @instrument("write")
+    def write_part(self, table: pa.Table, index: int) -> None:
+        os.makedirs(self.staging_path, exist_ok=True)
+
+        path = os.path.join(
+            self.staging_path, f"part-{index:05d}{self.layout.extension}"
+        )
+        pq.write_table(
+            self.layout.sort_table(table),
+            path,
+            compression=self.layout.compression,
+            row_group_size=self.layout.row_group_rows or None,
+            **self.layout.writer_options(),
+        )
+        record(bytes_written=os.path.getsize(path))
+
+    def swap_in(self) -> None:
+        replace_directory(self.staging_path, self.partition_path)
+
+        self.client.invalidate_partitions(database=self.database, table=self.table)
+
+
+def replace_directory(staging_path: str, partition_path: str) -> None:
+    # The old partition is renamed aside rather than deleted file by file, and
+    # the emptied _staging directory is removed
+    old_path = f"{staging_path}-old"
+
+    if os.path.exists(partition_path):
+        os.replace(partition_path, old_path)
+
+    os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+    os.replace(staging_path, partition_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    try:
+        os.rmdir(os.path.dirname(staging_path))
+    except OSError:
+        pass
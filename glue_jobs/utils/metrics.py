@@ -0,0 +1,349 @@
+"""
+Per-stage metrics printed as CloudWatch Embedded Metric Format lines. Set
+YTOWN_PROFILE_STAGE to profile a stage, YTOWN_METRICS=0 turns it all off.
+"""
+
+import atexit
+import cProfile
+import functools
+import io
+import json
+import marshal
+import os
+import pandas as pd
+import pstats
+import pyarrow as pa
+import resource
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+
+NAMESPACE = os.environ.get("YTOWN_METRICS_NAMESPACE", "YtownListings")
+METRICS_ENABLED = os.environ.get("YTOWN_METRICS", "1") != "0"
+
+
+PROFILE_STAGE = os.environ.get("YTOWN_PROFILE_STAGE")
+PROFILER = os.environ.get("YTOWN_PROFILER", "cprofile")
+# A local directory or an s3:// prefix
+PROFILE_LOCATION = os.environ.get("YTOWN_PROFILE_LOCATION", "profiles")
+
+
+# Unit of every metric a stage can emit
+METRIC_UNITS = {
+    "WallTime": "Seconds",
+    "CpuTime": "Seconds",
+    "PeakMemory": "Megabytes",
+    "RowsIn": "Count",
+    "RowsOut": "Count",
+    "BytesScanned": "Bytes",
+    "BytesWritten": "Bytes",
+}
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    bytes_scanned: int = 0
+    bytes_written: int = 0
+    peak_memory_mb: float = 0.0
+    properties: Dict[str, Any] = field(default_factory=dict)
+
+
+_active_stages: ContextVar[Tuple[StageMetrics, ...]] = ContextVar(
+    "active_stages", default=()
+)
+
+
+def job_name() -> str:
+    return os.environ.get(
+        "YTOWN_JOB_NAME", os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    )
+
+
+def _high_water_mark_mb() -> Optional[float]:
+    # Linux only, VmHWM can be reset per stage through clear_refs
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return None
+
+
+def _reset_high_water_mark() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _peak_memory_mb() -> float:
+    high_water_mark = _high_water_mark_mb()
+    return _max_rss_mb() if high_water_mark is None else high_water_mark
+
+
+def count_rows(value: Any) -> Optional[int]:
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+
+    if isinstance(value, pa.Table):
+        return value.num_rows
+
+    if isinstance(value, list):
+        return len(value)
+
+    return None
+
+
+def record(
+    rows_in: Optional[int] = None,
+    rows_out: Optional[int] = None,
+    bytes_scanned: int = 0,
+    bytes_written: int = 0,
+) -> None:
+    """
+    Adds to the innermost active stage. Does nothing outside of a stage.
+    """
+
+    stages = _active_stages.get()
+
+    if not stages:
+        return
+
+    metrics = stages[-1]
+
+    if rows_in is not None:
+        metrics.rows_in = (metrics.rows_in or 0) + rows_in
+
+    if rows_out is not None:
+        metrics.rows_out = (metrics.rows_out or 0) + rows_out
+
+    metrics.bytes_scanned += bytes_scanned
+    metrics.bytes_written += bytes_written
+
+
+def emit(metrics: StageMetrics, wall_time: float, cpu_time: float) -> None:
+    values: Dict[str, Any] = {
+        "WallTime": round(wall_time, 4),
+        "CpuTime": round(cpu_time, 4),
+        "PeakMemory": round(metrics.peak_memory_mb, 1),
+        "RowsIn": metrics.rows_in,
+        "RowsOut": metrics.rows_out,
+        "BytesScanned": metrics.bytes_scanned or None,
+        "BytesWritten": metrics.bytes_written or None,
+    }
+    values = {name: value for name, value in values.items() if value is not None}
+
+    line = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Job", "Stage"]],
+                    "Metrics": [
+                        {"Name": name, "Unit": METRIC_UNITS[name]} for name in values
+                    ],
+                }
+            ],
+        },
+        "Job": job_name(),
+        "Stage": metrics.name,
+        **metrics.properties,
+        **values,
+    }
+
+    print(json.dumps(line, default=str), flush=True)
+
+
+def _save_profile(name: str, extension: str, content: bytes) -> None:
+    filename = f"{job_name()}-{name}-{uuid.uuid4().hex[:8]}.{extension}"
+
+    if PROFILE_LOCATION.startswith("s3://"):
+        import awswrangler as wr
+
+        path = f"{PROFILE_LOCATION.rstrip('/')}/{filename}"
+        wr.s3.upload(local_file=io.BytesIO(content), path=path)
+    else:
+        os.makedirs(PROFILE_LOCATION, exist_ok=True)
+        path = os.path.join(PROFILE_LOCATION, filename)
+
+        with open(path, "wb") as file:
+            file.write(content)
+
+    print(f"stage={name} profile written to {path}", file=sys.stderr)
+
+
+class StageProfiler:
+    """
+    Profiles every run of one stage into a single profile, which is printed
+    and saved when the process exits. Stages like fetch run once per page, so
+    one profile per call would mostly be noise.
+    """
+
+    def __init__(self, name: str, profiler: str) -> None:
+        self.name = name
+        self.profiler = profiler
+
+        if profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            # Each start/stop is combined with the previous session
+            self.pyinstrument = Profiler()
+        else:
+            self.cprofile = cProfile.Profile()
+
+        atexit.register(self.save)
+
+    def start(self) -> None:
+        if self.profiler == "pyinstrument":
+            self.pyinstrument.start()
+        else:
+            self.cprofile.enable()
+
+    def stop(self) -> None:
+        if self.profiler == "pyinstrument":
+            self.pyinstrument.stop()
+        else:
+            self.cprofile.disable()
+
+    def save(self) -> None:
+        if self.profiler == "pyinstrument":
+            if self.pyinstrument.last_session is None:
+                return
+
+            print(self.pyinstrument.output_text(), file=sys.stderr)
+            html = self.pyinstrument.output_html().encode("utf-8")
+            _save_profile(self.name, "html", html)
+            return
+
+        self.cprofile.create_stats()
+
+        if not self.cprofile.stats:
+            return
+
+        # Serialized first, pstats.Stats takes the stats out of the profile
+        content = marshal.dumps(self.cprofile.stats)
+
+        summary = io.StringIO()
+        stats = pstats.Stats(self.cprofile, stream=summary)
+        stats.sort_stats("cumulative").print_stats(25)
+        print(summary.getvalue(), file=sys.stderr)
+        _save_profile(self.name, "prof", content)
+
+
+_profiler: Optional[StageProfiler] = None
+
+
+def _get_profiler() -> StageProfiler:
+    global _profiler
+
+    if _profiler is None:
+        _profiler = StageProfiler(name=str(PROFILE_STAGE), profiler=PROFILER)
+
+    return _profiler
+
+
+@contextmanager
+def stage(name: str, **properties: Any) -> Iterator[StageMetrics]:
+    """
+    Measures the block as one stage and prints its EMF line on the way out,
+    whether or not it raised. Stages can be nested, bytes reported inside an
+    inner stage also count towards the outer ones.
+    """
+
+    metrics = StageMetrics(name=name, properties=properties)
+
+    if not METRICS_ENABLED:
+        yield metrics
+        return
+
+    parents = _active_stages.get()
+
+    # The kernel's high water mark is reset so it covers this stage only,
+    # so fold the peak so far into the outer stages first
+    for parent in parents:
+        parent.peak_memory_mb = max(parent.peak_memory_mb, _peak_memory_mb())
+    _reset_high_water_mark()
+
+    token = _active_stages.set(parents + (metrics,))
+    profiling = name == PROFILE_STAGE and all(parent.name != name for parent in parents)
+
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+
+    if profiling:
+        _get_profiler().start()
+
+    try:
+        yield metrics
+    finally:
+        if profiling:
+            _get_profiler().stop()
+
+        wall_time = time.perf_counter() - start_wall
+        cpu_time = time.process_time() - start_cpu
+        _active_stages.reset(token)
+
+        metrics.peak_memory_mb = max(metrics.peak_memory_mb, _peak_memory_mb())
+
+        # Only the direct parent, which passes the totals on when it exits
+        if parents:
+            parent = parents[-1]
+            parent.peak_memory_mb = max(parent.peak_memory_mb, metrics.peak_memory_mb)
+            parent.bytes_scanned += metrics.bytes_scanned
+            parent.bytes_written += metrics.bytes_written
+
+        emit(metrics, wall_time=wall_time, cpu_time=cpu_time)
+
+
+def instrument(
+    name: str, rows_out: Callable[[Any], Optional[int]] = count_rows
+) -> Callable[[F], F]:
+    """
+    Decorator form of stage(). Rows in are counted from the first DataFrame,
+    Arrow table or list argument, and rows out from the return value with
+    `rows_out` (unless the function recorded them itself).
+    """
+
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name, Function=function.__qualname__) as metrics:
+                for value in (*args, *kwargs.values()):
+                    rows_in = count_rows(value)
+
+                    if rows_in is not None:
+                        metrics.rows_in = rows_in
+                        break
+
+                result = function(*args, **kwargs)
+
+                if metrics.rows_out is None:
+                    metrics.rows_out = rows_out(result)
+
+                return result
+
+        return wrapper  # type: ignore
+
+    return decorator
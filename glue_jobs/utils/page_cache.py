@@ -0,0 +1,120 @@
+import boto3
+import gzip
+import json
+import os
+import re
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional
+
+
+PAGE_FILE_PATTERN = re.compile(r"page=(\d+)\.ndjson\.gz$")
+
+
+class PageCache:
+    """
+    Raw API responses as gzipped NDJSON under an s3:// URI or local directory:
+
+        {location}/run_date=2024-06-10/region_id=summit/page=0001.ndjson.gz
+    """
+
+    def __init__(
+        self,
+        location: str,
+        run_date: date,
+        boto3_session: Optional[boto3.Session] = None,
+        region_id: Optional[str] = None,
+    ) -> None:
+        self.location = location
+        self.run_date = run_date
+        self.boto3_session = boto3_session
+        self.prefix = f"{location.rstrip('/')}/run_date={run_date.isoformat()}"
+
+        if region_id is not None:
+            self.prefix = f"{self.prefix}/region_id={region_id}"
+
+        self.is_s3 = self.prefix.startswith("s3://")
+
+        if self.is_s3:
+            self.bucket, _, self.key_prefix = self.prefix[len("s3://") :].partition("/")
+            self.s3 = (boto3_session or boto3.Session()).client("s3")
+
+    def for_region(self, region_id: str) -> "PageCache":
+        return PageCache(
+            location=self.location,
+            run_date=self.run_date,
+            boto3_session=self.boto3_session,
+            region_id=region_id,
+        )
+
+    def _name(self, page: int) -> str:
+        return f"page={page:04d}.ndjson.gz"
+
+    def pages(self) -> List[int]:
+        """
+        Returns the page numbers already saved for this run, in order.
+        """
+
+        if self.is_s3:
+            paginator = self.s3.get_paginator("list_objects_v2")
+            names = [
+                obj["Key"]
+                for response in paginator.paginate(
+                    Bucket=self.bucket, Prefix=f"{self.key_prefix}/"
+                )
+                for obj in response.get("Contents", [])
+            ]
+        elif os.path.isdir(self.prefix):
+            names = os.listdir(self.prefix)
+        else:
+            names = []
+
+        return sorted(
+            int(match.group(1))
+            for match in map(PAGE_FILE_PATTERN.search, names)
+            if match
+        )
+
+    def get(self, page: int) -> Optional[Dict[str, Any]]:
+        if self.is_s3:
+            try:
+                body = self.s3.get_object(
+                    Bucket=self.bucket, Key=f"{self.key_prefix}/{self._name(page)}"
+                )["Body"].read()
+            except self.s3.exceptions.NoSuchKey:
+                return None
+        else:
+            path = os.path.join(self.prefix, self._name(page))
+
+            if not os.path.exists(path):
+                return None
+
+            with open(path, "rb") as file:
+                body = file.read()
+
+        return json.loads(gzip.decompress(body).decode("utf-8").splitlines()[0])
+
+    def put(self, page: int, response: Dict[str, Any]) -> None:
+        body = gzip.compress((json.dumps(response) + "\n").encode("utf-8"))
+
+        if self.is_s3:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.key_prefix}/{self._name(page)}",
+                Body=body,
+            )
+        else:
+            os.makedirs(self.prefix, exist_ok=True)
+
+            # Write then rename so a crash never leaves a half-written page behind
+            path = os.path.join(self.prefix, self._name(page))
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(body)
+            os.replace(f"{path}.tmp", path)
+
+    def iter_responses(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every saved response in page order.
+        """
+
+        for page in self.pages():
+            yield self.get(page)
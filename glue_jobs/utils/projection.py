@@ -0,0 +1,48 @@
+"""
+Athena partition projection for the listings tables, so as_of_date partitions
+don't have to be registered in Glue.
+"""
+
+from datetime import date
+from typing import Dict, List, Tuple
+
+
+# Staged days go back to the oldest listing date, well before the first snapshot
+PROJECTION_START = date(2020, 1, 1)
+
+
+PROJECTED_TABLES: List[Tuple[str, str]] = [
+    ("raw", "listings"),
+    ("staged", "listings"),
+    ("curated", "listings"),
+]
+
+
+# Raw partitions are dates, staged and curated ones timestamps at midnight
+PROJECTION_FORMATS = {
+    "raw": "yyyy-MM-dd",
+    "staged": "yyyy-MM-dd HH:mm:ss",
+    "curated": "yyyy-MM-dd HH:mm:ss",
+}
+
+
+def projection_parameters(
+    database: str, dataset_path: str, start: date
+) -> Dict[str, str]:
+    """
+    Table parameters projecting one as_of_date partition per day from `start`
+    through today, at the same paths the jobs write to. Days before `start`
+    are invisible to Athena.
+    """
+
+    first_day = str(start) if database == "raw" else f"{start} 00:00:00"
+
+    return {
+        "projection.enabled": "true",
+        "projection.as_of_date.type": "date",
+        "projection.as_of_date.format": PROJECTION_FORMATS[database],
+        "projection.as_of_date.range": f"{first_day},NOW",
+        "projection.as_of_date.interval": "1",
+        "projection.as_of_date.interval.unit": "DAYS",
+        "storage.location.template": f"{dataset_path}/as_of_date=${{as_of_date}}/",
+    }
@@ -0,0 +1,66 @@
+"""
+Zillow API stand-in serving synthetic listings, for RAPID_API_URL:
+
+    python -m utils.rapid_api_stub --port 8000 --listings 500
+"""
+
+import argparse
+import json
+import math
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from utils.synthetic_listings import generate_listings
+
+
+# Zillow returns 41 results per page
+RESULTS_PER_PAGE = 41
+
+
+def create_server(
+    port: int, listing_count: int, seed: int = 0, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    listings = generate_listings(count=listing_count, seed=seed)
+    total_pages = max(1, math.ceil(len(listings) / RESULTS_PER_PAGE))
+
+    class RapidAPIHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            query = parse_qs(urlparse(self.path).query)
+            page = int(query.get("page", ["1"])[0])
+            start = (page - 1) * RESULTS_PER_PAGE
+
+            body = json.dumps(
+                {
+                    "props": listings[start : start + RESULTS_PER_PAGE],
+                    "resultsPerPage": RESULTS_PER_PAGE,
+                    "totalPages": total_pages,
+                    "totalResultCount": len(listings),
+                    "currentPage": page,
+                }
+            ).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return ThreadingHTTPServer((host, port), RapidAPIHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--listings", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = create_server(port=args.port, listing_count=args.listings, seed=args.seed)
+    print(f"Serving {args.listings} listings on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
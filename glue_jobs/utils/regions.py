@@ -0,0 +1,118 @@
+"""
+Search regions for the raw job, each one Zillow search tagged with its
+region_id.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+from urllib.parse import quote
+
+
+# Zillow's regionType for counties
+COUNTY_REGION_TYPE = 4
+
+
+@dataclass(frozen=True)
+class Region:
+    region_id: str
+    north: float
+    south: float
+    east: float
+    west: float
+    # Zillow county region ids, without them the search covers the whole box
+    counties: Tuple[int, ...] = ()
+    path: str = "homes"
+    map_zoom: int = 10
+
+    def search_query_state(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = {
+            "pagination": {},
+            "mapBounds": {
+                "north": self.north,
+                "south": self.south,
+                "east": self.east,
+                "west": self.west,
+            },
+        }
+
+        if self.counties:
+            state["regionSelection"] = [
+                {"regionId": county, "regionType": COUNTY_REGION_TYPE}
+                for county in self.counties
+            ]
+
+        return {
+            **state,
+            "isMapVisible": True,
+            "filterState": {
+                "sort": {"value": "globalrelevanceex"},
+                "ah": {"value": True},
+            },
+            "isListVisible": True,
+            "mapZoom": self.map_zoom,
+        }
+
+    @property
+    def url(self) -> str:
+        query_state = json.dumps(self.search_query_state(), separators=(",", ":"))
+        return f"https://www.zillow.com/{self.path}/?searchQueryState={quote(query_state, safe='')}"
+
+
+# County bounding boxes are approximate, neighbouring boxes overlap a little
+REGIONS: Dict[str, Region] = {
+    # Mahoning, Trumbull and Columbiana, the original search
+    "mahoning_valley": Region(
+        region_id="mahoning_valley",
+        north=41.86092787686419,
+        south=40.216172776295814,
+        east=-79.45971688671875,
+        west=-82.14587411328125,
+        counties=(2399, 2905, 2583),
+        path="mahoning-county-oh",
+        map_zoom=9,
+    ),
+    "ashtabula": Region(
+        region_id="ashtabula", north=41.98, south=41.49, east=-80.52, west=-81.01
+    ),
+    "cuyahoga": Region(
+        region_id="cuyahoga", north=41.62, south=41.28, east=-81.39, west=-81.97
+    ),
+    "geauga": Region(
+        region_id="geauga", north=41.72, south=41.28, east=-81.00, west=-81.39
+    ),
+    "lake": Region(
+        region_id="lake", north=41.89, south=41.58, east=-81.00, west=-81.49
+    ),
+    "portage": Region(
+        region_id="portage", north=41.35, south=41.00, east=-81.00, west=-81.40
+    ),
+    "stark": Region(
+        region_id="stark", north=41.00, south=40.65, east=-81.08, west=-81.65
+    ),
+    "summit": Region(
+        region_id="summit", north=41.35, south=40.90, east=-81.39, west=-81.69
+    ),
+}
+
+
+DEFAULT_REGIONS = "mahoning_valley"
+
+
+def get_regions(region_ids: str) -> List[Region]:
+    """
+    Regions for a comma separated list of ids, e.g. "mahoning_valley,summit".
+    """
+
+    ids = [
+        region_id.strip() for region_id in region_ids.split(",") if region_id.strip()
+    ]
+    unknown = [region_id for region_id in ids if region_id not in REGIONS]
+
+    if not ids or unknown:
+        raise ValueError(
+            f"Unknown regions {region_ids!r}, expected some of {sorted(REGIONS)}"
+        )
+
+    # Listed twice would fetch the same search twice
+    return [REGIONS[region_id] for region_id in dict.fromkeys(ids)]
@@ -0,0 +1,212 @@
+"""
+listings_rollup: the curated metrics per grain (day, week, month), geography
+and breakdown, from one GROUPING SETS scan of staged.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+from utils.staged_listings import date_list
+
+
+ROLLUP_TABLE = "listings_rollup"
+ROLLUP_PARTITIONS = ["grain", "period_start"]
+
+
+# Grain -> column holding the first day of the row's period
+GRAINS: Dict[str, str] = {
+    "day": "day_start",
+    "week": "week_start",
+    "month": "month_start",
+}
+
+
+# Each geography is grouped by the ones above it too, so zip code rows still
+# say which city and region they belong to
+GEOGRAPHIES: Dict[str, List[str]] = {
+    "market": [],
+    "region": ["region_id"],
+    "city": ["region_id", "city"],
+    "zip_code": ["region_id", "city", "zip_code"],
+}
+
+
+BREAKDOWNS: Dict[str, List[str]] = {
+    "all": [],
+    "home_type": ["home_type"],
+    "bedrooms": ["bedrooms_bucket"],
+}
+
+
+# Pinned so a column that's all null in a run still gets its type
+ROLLUP_DTYPES: Dict[str, str] = {
+    "grain": "string",
+    "period_start": "date",
+    "geography": "string",
+    "breakdown": "string",
+    "region_id": "string",
+    "city": "string",
+    "zip_code": "string",
+    "home_type": "string",
+    "bedrooms_bucket": "string",
+    "total_listings": "bigint",
+    "listing_days": "bigint",
+    "median_listing_price": "bigint",
+    "median_days_on_market": "bigint",
+    "median_price_per_square_ft": "bigint",
+}
+
+
+def period_start(day: date, grain: str) -> date:
+    if grain == "week":
+        return day - timedelta(days=day.weekday())
+
+    if grain == "month":
+        return day.replace(day=1)
+
+    return day
+
+
+def period_end(day: date, grain: str) -> date:
+    if grain == "week":
+        return period_start(day, grain) + timedelta(days=6)
+
+    if grain == "month":
+        next_month = day.replace(day=28) + timedelta(days=4)
+        return next_month - timedelta(days=next_month.day)
+
+    return day
+
+
+def touched_periods(as_of_dates: Iterable[date]) -> Set[Tuple[str, date]]:
+    """
+    (grain, period_start) of every period the given days fall in.
+    """
+
+    return {
+        (grain, period_start(day, grain)) for day in as_of_dates for grain in GRAINS
+    }
+
+
+def period_days(as_of_dates: List[date], available_dates: Set[date]) -> List[date]:
+    """
+    Every available day in the weeks and months the given days fall in, which
+    is what the rollup has to scan to recompute them.
+    """
+
+    days: Set[date] = set()
+
+    for day in as_of_dates:
+        for grain in GRAINS:
+            first_day, last_day = period_start(day, grain), period_end(day, grain)
+            days.update(
+                available_day
+                for available_day in available_dates
+                if first_day <= available_day <= last_day
+            )
+
+    return sorted(days | set(as_of_dates))
+
+
+def rollup_days_query() -> str:
+    # The table is partitioned by grain first, so the days it has are the
+    # day rows' period_start partitions
+    return f"""
+        SELECT DISTINCT period_start
+        FROM {ROLLUP_TABLE}
+        WHERE grain = 'day'
+    """
+
+
+def grouping_sets() -> str:
+    sets = [
+        "(" + ", ".join([period] + geography + breakdown) + ")"
+        for period in GRAINS.values()
+        for geography in GEOGRAPHIES.values()
+        for breakdown in BREAKDOWNS.values()
+    ]
+
+    return ",\n".join(sets)
+
+
+def level_case(levels: Dict[str, List[str]], default: str) -> str:
+    # The most specific level first, GROUPING(x) = 0 when x is grouped by
+    whens = [
+        f"WHEN GROUPING({columns[-1]}) = 0 THEN '{level}'"
+        for level, columns in reversed(list(levels.items()))
+        if columns
+    ]
+
+    return f"CASE {' '.join(whens)} ELSE '{default}' END"
+
+
+def rollup_query(
+    as_of_dates: List[date], scan_dates: List[date], source: str = "listings"
+) -> str:
+    """
+    The rollup rows of every period the as_of_dates fall in, from a single
+    scan of scan_dates (see period_days) in `source`, any relation in the
+    staged daily shape. Day rows are only returned for the as_of_dates.
+    """
+
+    grain_case = (
+        "CASE "
+        + " ".join(
+            f"WHEN GROUPING({column}) = 0 THEN '{grain}'"
+            for grain, column in GRAINS.items()
+        )
+        + " END"
+    )
+    periods = touched_periods(as_of_dates)
+    period_filter = " OR ".join(
+        f"(grain = '{grain}' AND period_start IN "
+        f"({date_list(sorted(start for kind, start in periods if kind == grain))}))"
+        for grain in GRAINS
+    )
+
+    return f"""
+        SELECT *
+        FROM (
+            SELECT
+                {grain_case} AS grain,
+                COALESCE({", ".join(GRAINS.values())}) AS period_start,
+                {level_case(GEOGRAPHIES, "market")} AS geography,
+                {level_case(BREAKDOWNS, "all")} AS breakdown,
+                region_id,
+                city,
+                zip_code,
+                home_type,
+                bedrooms_bucket,
+                COUNT(DISTINCT zpid) AS total_listings,
+                COUNT(*) AS listing_days,
+                APPROX_PERCENTILE(price, 0.5) AS median_listing_price,
+                APPROX_PERCENTILE(DATE_DIFF('day', listing_date, as_of_date), 0.5) AS median_days_on_market,
+                APPROX_PERCENTILE(price / living_area, 0.5) AS median_price_per_square_ft
+            FROM (
+                SELECT
+                    zpid,
+                    region_id,
+                    city,
+                    zip_code,
+                    home_type,
+                    CASE
+                        WHEN bedrooms IS NULL THEN NULL
+                        WHEN bedrooms <= 1 THEN '0-1'
+                        WHEN bedrooms >= 5 THEN '5+'
+                        ELSE CAST(bedrooms AS VARCHAR)
+                    END AS bedrooms_bucket,
+                    price,
+                    living_area,
+                    listing_date,
+                    as_of_date,
+                    CAST(as_of_date AS DATE) AS day_start,
+                    CAST(DATE_TRUNC('week', as_of_date) AS DATE) AS week_start,
+                    CAST(DATE_TRUNC('month', as_of_date) AS DATE) AS month_start
+                FROM {source}
+                WHERE as_of_date IN ({date_list(scan_dates)})
+            )
+            GROUP BY GROUPING SETS (
+                {grouping_sets()}
+            )
+        )
+        WHERE {period_filter}
+    """
@@ -0,0 +1,165 @@
+"""
+Mergeable Athena sketches of the curated metrics per (as_of_date, city,
+zip_code), so medians over any days and geography come from listings_sketches
+instead of staged. LocalAWSClient stands the sketches in with value lists.
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.staged_listings import date_list
+
+
+SKETCH_TABLE = "listings_sketches"
+
+
+# Sketch column -> (aggregation building it, type Athena reads it back as)
+SKETCHES: Dict[str, Tuple[str, str]] = {
+    "zpids": ("approx_set(zpid)", "HyperLogLog"),
+    "price_digest": ("qdigest_agg(price)", "qdigest(bigint)"),
+    "days_on_market_digest": ("qdigest_agg(days_on_market)", "qdigest(bigint)"),
+    "price_per_square_ft_digest": (
+        "qdigest_agg(price_per_square_ft)",
+        "qdigest(bigint)",
+    ),
+    "lot_size_digest": ("tdigest_agg(lot_size)", "tdigest"),
+}
+
+
+# Merged metric -> (sketch column it's read from, quantile or None for a count)
+METRICS: Dict[str, Tuple[str, Optional[float]]] = {
+    "total_listings": ("zpids", None),
+    "median_listing_price": ("price_digest", 0.5),
+    "median_days_on_market": ("days_on_market_digest", 0.5),
+    "median_price_per_square_ft": ("price_per_square_ft_digest", 0.5),
+    "median_lot_size": ("lot_size_digest", 0.5),
+}
+
+
+# What merged_sketches_query can group by -> expression over the sketches table
+GROUPINGS: Dict[str, str] = {
+    "day": "as_of_date",
+    "week": "CAST(DATE_TRUNC('week', as_of_date) AS DATE)",
+    "month": "CAST(DATE_TRUNC('month', as_of_date) AS DATE)",
+    "city": "city",
+    "zip_code": "zip_code",
+}
+
+
+# What merged_sketches_query can filter on
+FILTER_COLUMNS = ["city", "zip_code"]
+
+
+SKETCH_DTYPES: Dict[str, str] = {
+    "city": "string",
+    "zip_code": "string",
+    "listing_days": "bigint",
+    **{column: "binary" for column in SKETCHES},
+}
+
+
+def sketches_query(as_of_dates: List[date], source: str = "listings") -> str:
+    """
+    One row of sketches per curated cell of the given days, from `source` in
+    the staged daily shape like curated_listings_query.
+    """
+
+    sketches = ",\n".join(
+        f"CAST({aggregation} AS varbinary) AS {column}"
+        for column, (aggregation, _) in SKETCHES.items()
+    )
+
+    return f"""
+        SELECT
+            as_of_date,
+            city,
+            zip_code,
+            COUNT(*) AS listing_days,
+            {sketches}
+        FROM (
+            SELECT
+                as_of_date,
+                city,
+                zip_code,
+                zpid,
+                CAST(price AS BIGINT) AS price,
+                DATE_DIFF('day', listing_date, as_of_date) AS days_on_market,
+                CAST(price / living_area AS BIGINT) AS price_per_square_ft,
+                CAST(lot_area_value / 43560 AS DOUBLE) AS lot_size
+            FROM {source}
+            WHERE as_of_date IN ({date_list(as_of_dates)})
+        )
+        GROUP BY
+            as_of_date,
+            city,
+            zip_code
+    """
+
+
+def merged_metric(metric: str) -> str:
+    column, quantile = METRICS[metric]
+    merged = f"merge(CAST({column} AS {SKETCHES[column][1]}))"
+
+    if quantile is None:
+        return f"cardinality({merged})"
+
+    return f"value_at_quantile({merged}, {quantile})"
+
+
+def value_filter(column: str, values: Iterable[Optional[str]]) -> str:
+    """
+    Matches the rows whose `column` is one of `values`, None matching nulls.
+    The values are quoted here, so they can come straight from a dashboard.
+    """
+
+    if column not in FILTER_COLUMNS:
+        raise ValueError(
+            f"Can't filter on {column!r}, expected one of {FILTER_COLUMNS}"
+        )
+
+    values = list(values)
+    literals = ", ".join(
+        "'" + value.replace("'", "''") + "'" for value in values if value is not None
+    )
+    conditions = ([f"{column} IN ({literals})"] if literals else []) + (
+        [f"{column} IS NULL"] if None in values else []
+    )
+
+    return f"({' OR '.join(conditions) or 'FALSE'})"
+
+
+def merged_sketches_query(
+    group_by: List[str],
+    start: date,
+    end: date,
+    filters: Optional[Dict[str, Iterable[Optional[str]]]] = None,
+) -> str:
+    """
+    listings_sketches from start through end merged per GROUPINGS in `group_by`,
+    optionally keeping rows whose FILTER_COLUMNS match `filters`.
+    """
+
+    unknown = [name for name in group_by if name not in GROUPINGS]
+
+    if unknown:
+        raise ValueError(
+            f"Can't group by {unknown}, expected some of {list(GROUPINGS)}"
+        )
+
+    columns = [f"{GROUPINGS[name]} AS {name}" for name in group_by]
+    metrics = [f"{merged_metric(metric)} AS {metric}" for metric in METRICS]
+    conditions = [f"as_of_date BETWEEN DATE '{start}' AND DATE '{end}'"] + [
+        value_filter(column, values) for column, values in (filters or {}).items()
+    ]
+    group_clause = (
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(group_by)))}"
+        if group_by
+        else ""
+    )
+
+    return f"""
+        SELECT
+            {", ".join(columns + ["SUM(listing_days) AS listing_days"] + metrics)}
+        FROM {SKETCH_TABLE}
+        WHERE {" AND ".join(conditions)}
+        {group_clause}
+    """
@@ -0,0 +1,311 @@
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from utils.listings_schema import LISTING_SCHEMA, WIDENED_COLUMNS, athena_types
+from utils.metrics import instrument
+from utils.tiles import add_quadkeys, quadkey_sql
+
+
+# Raw column -> staged column
+# This is the single source for the staged projection, both the pandas engine
+# query and the Athena INSERT pipeline are built from it
+STAGED_COLUMNS: Dict[str, str] = {
+    "isshowcaselisting": "is_show_case_listing",
+    "longitude": "longitude",
+    "timeonzillow": "time_on_zillow",
+    "daysonzillow": "days_on_zillow",
+    "streetaddress": "street_address",
+    "taxassessedvalue": "tax_assessed_value",
+    "isunmappable": "is_unmappable",
+    "priceforhdp": "price_for_hdp",
+    "bathrooms": "bathrooms",
+    "state": "state",
+    "isfeatured": "is_featured",
+    "ispremierbuilder": "is_premier_builder",
+    "ispreforeclosureauction": "is_pre_foreclosure_auction",
+    "lotareavalue": "lot_area_value",
+    "isnonowneroccupied": "is_non_owner_occupied",
+    "homestatus": "home_status",
+    "latitude": "latitude",
+    "zipcode": "zip_code",
+    "bedrooms": "bedrooms",
+    "homestatusforhdp": "home_status_for_hdp",
+    "hometype": "home_type",
+    "iszillowowned": "is_zillow_owned",
+    "shouldhighlight": "should_highlight",
+    "price": "price",
+    "zpid": "zpid",
+    "openhouse": "open_house",
+    "city": "city",
+    "country": "country",
+    "currency": "currency",
+    "livingarea": "living_area",
+    "listing_sub_type_is_fsba": "listing_sub_type_is_fsba",
+    "listing_sub_type_is_openhouse": "listing_sub_type_is_openhouse",
+    "isrentalwithbaseprice": "is_rental_with_base_price",
+    "listing_sub_type_is_forauction": "listing_sub_type_is_for_auction",
+    "pricechange": "price_change",
+    "datepricechanged": "date_price_changed",
+    "pricereduction": "price_reduction",
+    "listing_sub_type_is_bankowned": "listing_sub_type_is_bankowned",
+    "newconstructiontype": "new_construction_type",
+    "listing_sub_type_is_newhome": "listing_sub_type_is_newhome",
+    "unit": "unit",
+    "zestimate": "zestimate",
+    "rentzestimate": "rentzestimate",
+    "region_id": "region_id",
+}
+
+
+STAGED_TYPES: Dict[str, str] = {
+    staged_column: athena_types(LISTING_SCHEMA)[raw_column]
+    for raw_column, staged_column in STAGED_COLUMNS.items()
+}
+
+
+# A listing can show up more than once in a snapshot, when it moves between
+# pages mid-fetch or two search regions overlap. Each key keeps one row: the
+# most recently observed copy, then the lowest content hash and region id, so
+# the same input always keeps the same row. Raw column names, ascending flags.
+DEDUP_KEYS = ["zpid", "as_of_date"]
+DEDUP_ORDER: List[Tuple[str, bool]] = [
+    ("timeonzillow", False),
+    ("content_hash", True),
+    ("region_id", True),
+]
+
+
+# Athena refuses to write more than 100 partitions in one INSERT
+MAX_PARTITIONS_PER_INSERT = 100
+
+
+def date_list(dates: Iterable[date]) -> str:
+    return ",".join(f"DATE('{day}')" for day in dates)
+
+
+def select_column(raw_column: str, staged_column: str) -> str:
+    # Raw partitions written while these were int keep bigint as their type
+    if raw_column in WIDENED_COLUMNS:
+        return f"CAST({raw_column} AS DOUBLE) AS {staged_column}"
+
+    if raw_column == staged_column:
+        return raw_column
+
+    return f"{raw_column} AS {staged_column}"
+
+
+def select_columns() -> str:
+    return ", ".join(
+        select_column(raw_column, staged_column)
+        for raw_column, staged_column in STAGED_COLUMNS.items()
+    )
+
+
+def dedup_order_by(order: List[Tuple[str, bool]] = DEDUP_ORDER) -> str:
+    return ", ".join(
+        f"{column} {'ASC' if ascending else 'DESC'} NULLS LAST"
+        for column, ascending in order
+    )
+
+
+def raw_listings_query(raw_dates: List[date]) -> str:
+    """
+    One raw listing per (zpid, as_of_date) for the given raw partitions,
+    renamed to staged columns.
+    """
+
+    return f"""
+        SELECT {", ".join(list(STAGED_COLUMNS.values()) + ["as_of_date"])}
+        FROM (
+            SELECT
+                {select_columns()},
+                DATE(as_of_date) AS as_of_date,
+                ROW_NUMBER() OVER (
+                    PARTITION BY zpid, as_of_date
+                    ORDER BY {dedup_order_by()}
+                ) AS row_number
+            FROM listings
+            WHERE as_of_date IN ({date_list(raw_dates)})
+        )
+        WHERE row_number = 1
+    """
+
+
+def min_listing_date_query(raw_dates: List[date]) -> str:
+    return f"""
+        SELECT MIN(DATE_ADD('day', -daysonzillow, CURRENT_DATE)) AS min_listing_date
+        FROM listings
+        WHERE as_of_date IN ({date_list(raw_dates)})
+    """
+
+
+def insert_staged_listings_query(raw_dates: List[date], as_of_dates: List[date]) -> str:
+    """
+    The pandas engine's transform run inside Athena, expanding each listing with
+    SEQUENCE + UNNEST.
+    """
+
+    staged_columns = list(STAGED_COLUMNS.values())
+    insert_columns = ", ".join(
+        staged_columns + ["listing_date", "quadkey", "as_of_date"]
+    )
+
+    return f"""
+        INSERT INTO ytown_listings_staged_db.listings ({insert_columns})
+        SELECT
+            {", ".join(f"raw_listings.{column}" for column in staged_columns)},
+            raw_listings.listing_date,
+            {quadkey_sql("raw_listings.latitude", "raw_listings.longitude")} AS quadkey,
+            CAST(days.as_of_date AS TIMESTAMP) AS as_of_date
+        FROM (
+            SELECT
+                {select_columns()},
+                DATE_ADD('day', -daysonzillow, CURRENT_DATE) AS listing_date,
+                -- One row per zpid, from its latest snapshot, so every
+                -- (zpid, as_of_date) is written once
+                ROW_NUMBER() OVER (
+                    PARTITION BY zpid
+                    ORDER BY as_of_date DESC, {dedup_order_by()}
+                ) AS row_number
+            FROM ytown_listings_raw_db.listings
+            WHERE as_of_date IN ({date_list(raw_dates)})
+            -- SEQUENCE fails outright on a listing date in the future
+            AND daysonzillow >= 0
+        ) AS raw_listings
+        CROSS JOIN UNNEST(
+            SEQUENCE(raw_listings.listing_date, CURRENT_DATE, INTERVAL '1' DAY)
+        ) AS days (as_of_date)
+        WHERE raw_listings.row_number = 1
+        AND days.as_of_date IN ({date_list(as_of_dates)})
+    """
+
+
+def change_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    _tmp_df = df.copy()
+
+    _tmp_df["as_of_date"] = pd.to_datetime(df["as_of_date"], format="%Y-%m-%d").dt.date
+    return _tmp_df
+
+
+def get_listing_date(df: pd.DataFrame) -> pd.DataFrame:
+    _tmp_df = df.copy()
+
+    _tmp_df["current_date"] = datetime.now()
+    _tmp_df["time_delta"] = pd.to_timedelta(_tmp_df["days_on_zillow"], unit="d")
+    _tmp_df["listing_date"] = _tmp_df["current_date"] - _tmp_df["time_delta"]
+    _tmp_df["listing_date"] = _tmp_df["listing_date"].dt.date
+
+    return _tmp_df.drop(columns=["current_date", "time_delta"])
+
+
+def get_target_dates(min_listing_date: date, processed_dates: Set[date]) -> List[date]:
+    """
+    Returns every day from the oldest listing date through today that doesn't
+    already have a staged partition.
+    """
+    days = pd.date_range(start=min_listing_date, end=date.today())
+    return [day for day in days.date if day not in processed_dates]
+
+
+@instrument("expand")
+def duplicate_listings(
+    df: pd.DataFrame, as_of_dates: Optional[List[date]] = None
+) -> pd.DataFrame:
+    """
+    Expands each listing into one row per target day on or after its listing
+    date, by default every day through today.
+    """
+    if as_of_dates is None:
+        as_of_dates = (
+            []
+            if df.empty
+            else get_target_dates(df["listing_date"].min(), processed_dates=set())
+        )
+
+    targets = np.unique(np.array(as_of_dates, dtype="datetime64[D]"))
+
+    if df.empty or targets.size == 0:
+        return df.iloc[0:0].assign(as_of_date=pd.Series(dtype="datetime64[ns]"))
+
+    listing_dates = pd.to_datetime(df["listing_date"]).to_numpy(dtype="datetime64[D]")
+
+    # Index of the first target day each listing is active on
+    # and the number of target days it spans
+    start_indices = np.searchsorted(targets, listing_dates, side="left")
+    spans = targets.size - start_indices
+
+    # Row-major pairs: row i contributes targets[start_indices[i]:]
+    positions = np.repeat(np.arange(len(df)), spans)
+    block_starts = np.repeat(np.cumsum(spans) - spans, spans)
+    target_indices = np.arange(spans.sum()) - block_starts + start_indices[positions]
+
+    # Re-order to day-major, keeping the original row order within each day
+    order = np.argsort(target_indices, kind="stable")
+
+    expanded_df = df.iloc[positions[order]].copy()
+    expanded_df["as_of_date"] = pd.to_datetime(targets[target_indices[order]])
+
+    return expanded_df
+
+
+@instrument("dedup")
+def dedup_listings(
+    df: pd.DataFrame, keys: List[str], order: List[Tuple[str, bool]] = DEDUP_ORDER
+) -> pd.DataFrame:
+    """
+    The pandas side of the ROW_NUMBER() dedup: the first row per `keys` after
+    sorting by `order`, nulls last. Kept rows stay in their original order.
+    """
+
+    columns = [column for column, _ in order]
+    ascending = [True] * len(keys) + [ascending for _, ascending in order]
+
+    return (
+        df.sort_values(
+            keys + columns, ascending=ascending, na_position="last", kind="stable"
+        )
+        .drop_duplicates(subset=keys)
+        .sort_index()
+    )
+
+
+def raw_to_staged(raw_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    raw_listings_query for a raw frame that's already in memory.
+    """
+
+    return (
+        dedup_listings(raw_df, keys=DEDUP_KEYS)[list(STAGED_COLUMNS) + ["as_of_date"]]
+        .rename(columns=STAGED_COLUMNS)
+        .reset_index(drop=True)
+    )
+
+
+def stage_listings(raw_df: pd.DataFrame, staged_dates: Set[date]) -> pd.DataFrame:
+    """
+    The pandas engine's transform: staged listings for every day from the
+    oldest listing date through today that isn't in `staged_dates` yet, with
+    the quadkey of their map tile (see utils.tiles).
+    """
+
+    staged_df = raw_df.pipe(change_dtypes).pipe(get_listing_date).pipe(add_quadkeys)
+
+    # A listing in several snapshots is expanded from its latest one only, so
+    # every (zpid, as_of_date) comes out once
+    staged_df = dedup_listings(staged_df, keys=["zpid"], order=[("as_of_date", False)])
+
+    # Get Unprocessed Staged Partitions
+    # Similar to above, we don't overwrite any partitions that have already been
+    # processed, so only the missing days are generated in the first place
+    unprocessed_staged_partitions = (
+        []
+        if staged_df.empty
+        else get_target_dates(
+            staged_df["listing_date"].min(), processed_dates=staged_dates
+        )
+    )
+
+    # Duplicate individual listings from listing date to current
+    # This simplifies any down stream time series analysis
+    return duplicate_listings(staged_df, as_of_dates=unprocessed_staged_partitions)
@@ -0,0 +1,163 @@
+import numpy as np
+import pyarrow as pa
+from typing import Any, Dict, List, Optional, cast
+from utils.listings_schema import LISTING_FIELDS, LISTING_SCHEMA, Listing, column_name
+
+
+# The three counties the real search covers, by city and zip code
+DEFAULT_CITIES: Dict[str, List[str]] = {
+    "Youngstown": ["44502", "44504", "44505", "44507", "44509", "44510", "44511"],
+    "Boardman": ["44512"],
+    "Austintown": ["44515"],
+    "Canfield": ["44406"],
+    "Poland": ["44514"],
+    "Struthers": ["44471"],
+    "Warren": ["44483", "44484", "44485"],
+    "Niles": ["44446"],
+    "Girard": ["44420"],
+    "Hubbard": ["44425"],
+    "Salem": ["44460"],
+    "East Liverpool": ["44920"],
+    "Columbiana": ["44408"],
+}
+
+
+HOME_TYPES = ["SINGLE_FAMILY", "CONDO", "TOWNHOUSE", "MULTI_FAMILY", "LOT"]
+
+
+def generate_cities(city_count: int, zips_per_city: int = 1) -> Dict[str, List[str]]:
+    """
+    Made up cities with consecutive zip codes, for feeds larger than the
+    three counties, e.g. roughly statewide with generate_cities(900, 2).
+    """
+
+    return {
+        f"City {i:04d}": [
+            f"{43000 + i * zips_per_city + j:05d}" for j in range(zips_per_city)
+        ]
+        for i in range(city_count)
+    }
+
+
+def generate_listing_columns(
+    count: int,
+    seed: int = 0,
+    max_days_on_market: int = 365,
+    cities: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Random values for every field the generator fills, keyed like the raw
+    columns (see listings_schema.column_name). The same seed always produces
+    the same values.
+    """
+
+    cities = cities or DEFAULT_CITIES
+    rng = np.random.default_rng(seed)
+
+    city_names = np.array([city for city, zips in cities.items() for _ in zips])
+    zipcodes = np.array([zipcode for zips in cities.values() for zipcode in zips])
+    locations = rng.integers(0, len(zipcodes), count)
+
+    living_areas = rng.integers(600, 4500, count)
+    prices = (living_areas * rng.uniform(40, 180, count) // 100 * 100).astype(int)
+    zestimates = (prices * rng.uniform(0.9, 1.1, count)).astype(int)
+    days_on_zillow = rng.integers(0, max_days_on_market + 1, count)
+    street_numbers = rng.integers(1, 9999, count).astype(str)
+
+    return {
+        "zpid": np.arange(10_000_000, 10_000_000 + count),
+        "bathrooms": rng.integers(2, 8, count) / 2,
+        "bedrooms": rng.integers(1, 6, count),
+        "livingarea": living_areas,
+        "lotareavalue": rng.uniform(0.1, 2.0, count).round(2),
+        "lotareaunit": np.full(count, "acres"),
+        "taxassessedvalue": prices * 0.8,
+        "price": prices,
+        "priceforhdp": prices,
+        "zestimate": zestimates,
+        "rentzestimate": (zestimates * 0.009).astype(int),
+        "daysonzillow": days_on_zillow,
+        "timeonzillow": days_on_zillow * 86_400_000,
+        "latitude": rng.uniform(40.6, 41.4, count),
+        "longitude": rng.uniform(-81.0, -80.5, count),
+        "streetaddress": np.char.add(street_numbers, " Main St"),
+        "city": city_names[locations],
+        "state": np.full(count, "OH"),
+        "zipcode": zipcodes[locations],
+        "country": np.full(count, "USA"),
+        "currency": np.full(count, "USD"),
+        "hometype": rng.choice(HOME_TYPES, count, p=[0.75, 0.08, 0.05, 0.07, 0.05]),
+        "homestatus": np.full(count, "FOR_SALE"),
+        "homestatusforhdp": np.full(count, "FOR_SALE"),
+        "isfeatured": np.zeros(count, dtype=bool),
+        "ispremierbuilder": np.zeros(count, dtype=bool),
+        "isshowcaselisting": rng.random(count) < 0.1,
+        "ispreforeclosureauction": np.zeros(count, dtype=bool),
+        "isnonowneroccupied": np.ones(count, dtype=bool),
+        "isunmappable": np.zeros(count, dtype=bool),
+        "iszillowowned": np.zeros(count, dtype=bool),
+        "shouldhighlight": np.zeros(count, dtype=bool),
+        "isrentalwithbaseprice": np.zeros(count, dtype=bool),
+        "listing_sub_type_is_fsba": np.ones(count, dtype=bool),
+    }
+
+
+def generate_listings(
+    count: int,
+    seed: int = 0,
+    max_days_on_market: int = 365,
+    cities: Optional[Dict[str, List[str]]] = None,
+) -> List[Listing]:
+    """
+    Generates `count` random listings shaped like the API's props. The same
+    seed always produces the same listings.
+    """
+
+    columns = generate_listing_columns(
+        count=count, seed=seed, max_days_on_market=max_days_on_market, cities=cities
+    )
+    keys = {column_name(key): key for key in LISTING_FIELDS}
+
+    listings: List[Listing] = []
+
+    for i in range(count):
+        listing: Dict[str, Any] = {}
+
+        for column, values in columns.items():
+            *parents, name = keys[column].split(".")
+            parent = listing
+
+            for part in parents:
+                parent = parent.setdefault(part, {})
+
+            parent[name] = values[i].item()
+
+        listings.append(cast(Listing, listing))
+
+    return listings
+
+
+def generate_listings_table(
+    count: int,
+    seed: int = 0,
+    max_days_on_market: int = 365,
+    cities: Optional[Dict[str, List[str]]] = None,
+) -> pa.Table:
+    """
+    Same listings as generate_listings, built column-wise straight into
+    LISTING_SCHEMA so a million rows don't go through Python dicts.
+    """
+
+    columns = generate_listing_columns(
+        count=count, seed=seed, max_days_on_market=max_days_on_market, cities=cities
+    )
+
+    return pa.Table.from_arrays(
+        [
+            pa.array(columns[field.name], type=field.type)
+            if field.name in columns
+            else pa.nulls(count, type=field.type)
+            for field in LISTING_SCHEMA
+        ],
+        schema=LISTING_SCHEMA,
+    )
@@ -0,0 +1,168 @@
+"""
+Bing tile quadkeys for map and radius queries. The first z digits of a
+quadkey are its tile at zoom z, so a cell's tiles share its quadkey as a
+prefix.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Tuple
+
+
+TILE_ZOOM = 18
+# ~7 km, ~1.8 km and ~450 m cells at Youngstown's latitude
+CELL_ZOOMS = (12, 14, 16)
+
+
+TILE_TABLE = "listings_tiles"
+
+
+# bing_tile_at refuses latitudes the Mercator projection can't reach
+MAX_LATITUDE = 85.05112878
+EARTH_RADIUS_MILES = 3958.8
+
+
+TILE_DTYPES: Dict[str, str] = {
+    "zoom": "int",
+    "quadkey": "string",
+    "total_listings": "bigint",
+    "median_listing_price": "bigint",
+    "median_price_per_square_ft": "bigint",
+    "latitude": "double",
+    "longitude": "double",
+}
+
+
+def tile_xy(
+    latitude: np.ndarray, longitude: np.ndarray, zoom: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tile coordinates the way bing_tile_at computes them, clipped to the
+    edges of the map.
+    """
+
+    map_size = 256 << zoom
+    sin_latitude = np.sin(np.radians(latitude))
+    x = (longitude + 180) / 360
+    y = 0.5 - np.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * np.pi)
+
+    def to_tile(axis: np.ndarray) -> np.ndarray:
+        return np.clip(axis * map_size, 0, map_size - 1).astype(np.int64) // 256
+
+    return to_tile(x), to_tile(y)
+
+
+def quadkey_strings(x: np.ndarray, y: np.ndarray, zoom: int) -> np.ndarray:
+    # One digit per zoom level, most significant first: bit i of x plus twice
+    # bit i of y
+    shifts = np.arange(zoom - 1, -1, -1)
+    digits = ((x[:, None] >> shifts) & 1) + 2 * ((y[:, None] >> shifts) & 1)
+
+    return (digits + ord("0")).astype(np.uint8).view(f"S{zoom}").ravel().astype(str)
+
+
+def quadkeys(
+    latitude: pd.Series, longitude: pd.Series, zoom: int = TILE_ZOOM
+) -> pd.Series:
+    """
+    Quadkey of each point's tile, null where the point is missing or off
+    the map.
+    """
+
+    points = np.column_stack(
+        [
+            pd.to_numeric(latitude).to_numpy(dtype="float64", na_value=np.nan),
+            pd.to_numeric(longitude).to_numpy(dtype="float64", na_value=np.nan),
+        ]
+    )
+    valid = (np.abs(points[:, 0]) <= MAX_LATITUDE) & (np.abs(points[:, 1]) <= 180)
+
+    result = np.full(len(points), None, dtype=object)
+    result[valid] = quadkey_strings(
+        *tile_xy(points[valid, 0], points[valid, 1], zoom), zoom
+    )
+
+    return pd.Series(result, index=latitude.index)
+
+
+def add_quadkeys(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(quadkey=quadkeys(df["latitude"], df["longitude"]).to_numpy())
+
+
+def quadkey_sql(latitude: str = "latitude", longitude: str = "longitude") -> str:
+    return f"""
+        CASE
+            WHEN ABS({latitude}) <= {MAX_LATITUDE} AND ABS({longitude}) <= 180
+            THEN BING_TILE_QUADKEY(BING_TILE_AT({latitude}, {longitude}, {TILE_ZOOM}))
+        END
+    """
+
+
+def tile_bounds(x: np.ndarray, y: np.ndarray, zoom: int) -> Tuple[np.ndarray, ...]:
+    """
+    (south, north, west, east) edges of tiles in degrees.
+    """
+
+    tiles = 1 << zoom
+
+    def latitude(edge: np.ndarray) -> np.ndarray:
+        return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * edge / tiles))))
+
+    return (
+        latitude(y + 1),
+        latitude(y),
+        x / tiles * 360 - 180,
+        (x + 1) / tiles * 360 - 180,
+    )
+
+
+def tiles_in_radius(
+    latitude: float, longitude: float, radius_miles: float, zoom: int
+) -> List[str]:
+    """
+    Quadkeys of the zoom level tiles that reach within radius_miles of the
+    point. A superset of the listings in the circle, so rows still need the
+    exact distance check, but everything outside the tiles can be skipped.
+    """
+
+    # The circle's bounding box, then the tiles covering it
+    latitude_delta = np.degrees(radius_miles / EARTH_RADIUS_MILES)
+    longitude_delta = latitude_delta / max(np.cos(np.radians(latitude)), 1e-9)
+    corners_x, corners_y = tile_xy(
+        np.array([latitude + latitude_delta, latitude - latitude_delta]),
+        np.array([longitude - longitude_delta, longitude + longitude_delta]),
+        zoom,
+    )
+    x, y = np.meshgrid(
+        np.arange(corners_x[0], corners_x[1] + 1),
+        np.arange(corners_y[0], corners_y[1] + 1),
+    )
+    x, y = x.ravel(), y.ravel()
+
+    # Distance from the point to the nearest point of each tile
+    south, north, west, east = tile_bounds(x, y, zoom)
+    nearest_latitude = np.radians(np.clip(latitude, south, north))
+    nearest_longitude = np.radians(np.clip(longitude, west, east))
+    point_latitude, point_longitude = np.radians(latitude), np.radians(longitude)
+    haversine = (
+        np.sin((nearest_latitude - point_latitude) / 2) ** 2
+        + np.cos(point_latitude)
+        * np.cos(nearest_latitude)
+        * np.sin((nearest_longitude - point_longitude) / 2) ** 2
+    )
+    distance = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(haversine, 1)))
+    inside = distance <= radius_miles
+
+    return sorted(quadkey_strings(x[inside], y[inside], zoom).tolist())
+
+
+def quadkey_filter(keys: Iterable[str], column: str = "quadkey") -> str:
+    """
+    Matches the given tiles and everything inside them. Written as ranges
+    ('0231' <= quadkey < '02314', digits only go up to 3) so Athena can skip
+    row groups on the column's min/max statistics.
+    """
+
+    ranges = [f"({column} >= '{key}' AND {column} < '{key}4')" for key in keys]
+
+    return f"({' OR '.join(ranges) or 'FALSE'})"
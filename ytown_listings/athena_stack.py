@@ -1,15 +1,25 @@
 from aws_cdk import (
     aws_athena as athena,
     aws_s3 as s3,
+    Duration,
     NestedStack,
 )
 from constructs import Construct
 
 
 class AthenaStack(NestedStack):
-    def __init__(self, scope: Construct, *, athena_bucket: s3.IBucket) -> None:
+    def __init__(self, scope: Construct, *, athena_bucket: s3.Bucket) -> None:
         super().__init__(scope, "ytown-listings-athena")
 
+        # CTAS/UNLOAD results used by the Glue jobs are only read once,
+        # so they're expired rather than kept alongside the query history
+        athena_bucket.add_lifecycle_rule(
+            id="YtownListingsAthenaTempTablesExpiration",
+            prefix="listings/temp_tables/",
+            expiration=Duration.days(1),
+            abort_incomplete_multipart_upload_after=Duration.days(1),
+        )
+
         self.workgroup = athena.CfnWorkGroup(
             self,
             id="YtownListingsWorkGroup",
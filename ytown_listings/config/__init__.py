@@ -1 +1,7 @@
-from .env import ACCOUNT_ID, REGION
+from .env import (
+    ACCOUNT_ID,
+    PARTITION_PROJECTION,
+    REGION,
+    SEARCH_REGIONS,
+    TABLE_FORMAT,
+)
@@ -7,3 +7,15 @@ load_dotenv()
 
 ACCOUNT_ID = os.environ.get("ACCOUNT_ID")
 REGION = os.environ.get("REGION")
+
+
+# "hive" (default) or "iceberg" for the staged and curated listings tables
+TABLE_FORMAT = os.environ.get("TABLE_FORMAT", "hive")
+
+
+# "true" to use Athena partition projection on the listings tables
+PARTITION_PROJECTION = os.environ.get("PARTITION_PROJECTION", "false")
+
+
+# Comma separated search regions for the raw job, see glue_jobs/utils/regions.py
+SEARCH_REGIONS = os.environ.get("SEARCH_REGIONS", "mahoning_valley")
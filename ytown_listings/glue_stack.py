@@ -8,7 +8,17 @@ from aws_cdk import (
     aws_secretsmanager as sm,
     NestedStack,
 )
-from ytown_listings.config import ACCOUNT_ID, REGION
+from ytown_listings.config import (
+    ACCOUNT_ID,
+    PARTITION_PROJECTION,
+    REGION,
+    SEARCH_REGIONS,
+    TABLE_FORMAT,
+)
+
+
+# First as_of_date Athena projects when partition projection is on
+PROJECTION_START = "2020-01-01"
 
 
 class GlueStack(NestedStack):
@@ -21,6 +31,12 @@ class GlueStack(NestedStack):
     ) -> None:
         super().__init__(scope, "ytown-listings-glue")
 
+        # Partition projection settings shared by every job that writes listings
+        projection_arguments = {
+            "--partition-projection": PARTITION_PROJECTION,
+            "--projection-start": PROJECTION_START,
+        }
+
         def create_glue_database(layer: str) -> glue.CfnDatabase:
             return glue.CfnDatabase(
                 self,
@@ -71,10 +87,17 @@ class GlueStack(NestedStack):
                     resources=[
                         f"{buckets.get('raw_bucket').bucket_arn}/listings",
                         f"{buckets.get('raw_bucket').bucket_arn}/listings/*",
+                        f"{buckets.get('raw_bucket').bucket_arn}/responses/*",
                         f"{buckets.get('staged_bucket').bucket_arn}",
                         f"{buckets.get('staged_bucket').bucket_arn}/*",
                         f"{buckets.get('curated_bucket').bucket_arn}/listings",
                         f"{buckets.get('curated_bucket').bucket_arn}/listings/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_tiles",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_tiles/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_sketches",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_sketches/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_rollup",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_rollup/*",
                         f"{buckets.get('scripts_bucket').bucket_arn}/listings",
                         f"{buckets.get('scripts_bucket').bucket_arn}/listings/*",
                         f"{buckets.get('scripts_bucket').bucket_arn}/listings",
@@ -93,10 +116,25 @@ class GlueStack(NestedStack):
                     resources=[
                         f"{buckets.get('raw_bucket').bucket_arn}/listings",
                         f"{buckets.get('raw_bucket').bucket_arn}/listings/*",
+                        f"{buckets.get('raw_bucket').bucket_arn}/responses/*",
                         f"{buckets.get('staged_bucket').bucket_arn}/listings",
                         f"{buckets.get('staged_bucket').bucket_arn}/listings/*",
+                        f"{buckets.get('staged_bucket').bucket_arn}/listings_history",
+                        f"{buckets.get('staged_bucket').bucket_arn}/listings_history/*",
+                        f"{buckets.get('staged_bucket').bucket_arn}/listings_monthly",
+                        f"{buckets.get('staged_bucket').bucket_arn}/listings_monthly/*",
+                        f"{buckets.get('staged_bucket').bucket_arn}/listings_iceberg",
+                        f"{buckets.get('staged_bucket').bucket_arn}/listings_iceberg/*",
                         f"{buckets.get('curated_bucket').bucket_arn}/listings",
                         f"{buckets.get('curated_bucket').bucket_arn}/listings/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_tiles",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_tiles/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_sketches",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_sketches/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_rollup",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_rollup/*",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_iceberg",
+                        f"{buckets.get('curated_bucket').bucket_arn}/listings_iceberg/*",
                         f"{buckets.get('athena_bucket').bucket_arn}/*",
                     ],
                 ),
@@ -157,6 +195,22 @@ class GlueStack(NestedStack):
             destination_key_prefix="listings/curated",
         )
 
+        compaction_script = s3_deployment.BucketDeployment(
+            self,
+            "YtownListingsCompactionScript",
+            sources=[s3_deployment.Source.asset("./glue_jobs/scripts/compaction")],
+            destination_bucket=buckets.get("scripts_bucket"),
+            destination_key_prefix="listings/compaction",
+        )
+
+        pipeline_script = s3_deployment.BucketDeployment(
+            self,
+            "YtownListingsPipelineScript",
+            sources=[s3_deployment.Source.asset("./glue_jobs/scripts/pipeline")],
+            destination_bucket=buckets.get("scripts_bucket"),
+            destination_key_prefix="listings/pipeline",
+        )
+
         utility_scripts = s3_deployment.BucketDeployment(
             self,
             "YtownListingsUtilities",
@@ -187,6 +241,9 @@ class GlueStack(NestedStack):
                 "--enable-job-insights": "true",
                 "--job-language": "python",
                 "--extra-py-files": f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/utils/utils-0.1-py3-none-any.whl",
+                **projection_arguments,
+                "--response-cache": f"s3://{buckets.get('raw_bucket').bucket_name}/responses",
+                "--regions": SEARCH_REGIONS,
             },
             glue_version="4.0",
         )
@@ -206,6 +263,8 @@ class GlueStack(NestedStack):
                 "--enable-job-insights": "true",
                 "--job-language": "python",
                 "--extra-py-files": f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/utils/utils-0.1-py3-none-any.whl",
+                **projection_arguments,
+                "--table-format": TABLE_FORMAT,
             },
             glue_version="4.0",
         )
@@ -225,6 +284,55 @@ class GlueStack(NestedStack):
                 "--enable-job-insights": "true",
                 "--job-language": "python",
                 "--extra-py-files": f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/utils/utils-0.1-py3-none-any.whl",
+                **projection_arguments,
+                "--table-format": TABLE_FORMAT,
+            },
+            glue_version="4.0",
+        )
+
+        compaction_job = glue.CfnJob(
+            self,
+            id="YtownListingsCompactionJob",
+            name="YtownListingsCompactionJob",
+            role=glue_job_role.role_arn,
+            command=glue.CfnJob.JobCommandProperty(
+                name="pythonshell",
+                python_version="3.9",
+                script_location=f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/compaction/compact_listings.py",
+            ),
+            default_arguments={
+                "library-set": "analytics",
+                "--enable-job-insights": "true",
+                "--job-language": "python",
+                "--extra-py-files": f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/utils/utils-0.1-py3-none-any.whl",
+                **projection_arguments,
+                "--target-file-mb": "128",
+                "--table-format": TABLE_FORMAT,
+            },
+            glue_version="4.0",
+        )
+
+        # Runs all three layers in one process. Not on the workflow, it's started
+        # by hand in place of the raw, staged and curated jobs
+        pipeline_job = glue.CfnJob(
+            self,
+            id="YtownListingsPipelineJob",
+            name="YtownListingsPipelineJob",
+            role=glue_job_role.role_arn,
+            command=glue.CfnJob.JobCommandProperty(
+                name="pythonshell",
+                python_version="3.9",
+                script_location=f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/pipeline/run_pipeline.py",
+            ),
+            default_arguments={
+                "library-set": "analytics",
+                "--enable-job-insights": "true",
+                "--job-language": "python",
+                "--extra-py-files": f"s3://{buckets.get('scripts_bucket').bucket_name}/listings/utils/utils-0.1-py3-none-any.whl",
+                **projection_arguments,
+                "--response-cache": f"s3://{buckets.get('raw_bucket').bucket_name}/responses",
+                "--regions": SEARCH_REGIONS,
+                "--table-format": TABLE_FORMAT,
             },
             glue_version="4.0",
         )
@@ -289,3 +397,26 @@ class GlueStack(NestedStack):
             start_on_creation=True,
             workflow_name=glue_workflow.name,
         )
+
+        compaction_trigger = glue.CfnTrigger(
+            self,
+            id="YtownListingsCompactionTrigger",
+            name="YtownListingsCompactionTrigger",
+            type="CONDITIONAL",
+            actions=[
+                glue.CfnTrigger.ActionProperty(
+                    job_name=compaction_job.name,
+                )
+            ],
+            predicate=glue.CfnTrigger.PredicateProperty(
+                conditions=[
+                    glue.CfnTrigger.ConditionProperty(
+                        job_name=curated_listings_upload_job.name,
+                        state="SUCCEEDED",
+                        logical_operator="EQUALS",
+                    )
+                ]
+            ),
+            start_on_creation=True,
+            workflow_name=glue_workflow.name,
+        )